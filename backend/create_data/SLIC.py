@@ -3,6 +3,7 @@ import cv2
 import os
 import base64
 from datetime import datetime
+from superpixel_stats import render_mean_colors
 
 def load_image(image_path):
     """
@@ -48,12 +49,9 @@ def apply_slic(img, region_size, ruler=20.0, iterations=20):
         
         # mask_slic = slic.getLabelContourMask()
         
-        superpixel_result = img.copy()
-        for i in range(n_segments):
-            mask = labels == i
-            superpixel_result[mask] = np.mean(img[mask], axis=0)
+        superpixel_result = render_mean_colors(img, labels)
         
-        # superpixel_result[mask_slic == 255] = [0, 255, 0]
+        # superpixel_result = render_mean_colors(img, labels, boundary_mask=mask_slic)
         
         return superpixel_result, n_segments
         
@@ -0,0 +1,238 @@
+import os
+import sys
+import json
+import queue
+import shutil
+import argparse
+import tempfile
+import contextlib
+import multiprocessing
+import numpy as np
+import cv2
+
+# Measure the real work, not stage cache hits
+os.environ['COLORWEB_CACHE'] = 'off'
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'create_data'))
+from generate_dataset import generate_dataset
+
+# Frame sizes seen among the originals: screenshots, wallpapers and portrait key art
+REALISTIC_SIZES = ((1920, 1080), (1280, 720), (2560, 1440), (1200, 1700), (3840, 2160))
+
+# Seconds between checks that a benchmark child process is still alive
+POLL_INTERVAL = 1.0
+
+
+def make_anime_image(width, height, seed=0):
+    """
+    Create a deterministic flat-shaded, line-art-like image
+
+    Large flat color regions with dark outlines and a few loose strokes,
+    which is what the originals look like to SLIC and the JPEG encoder.
+
+    Args:
+        width (int): Image width
+        height (int): Image height
+        seed (int): Random seed
+
+    Returns:
+        numpy.ndarray: BGR uint8 image
+    """
+    rng = np.random.default_rng(seed)
+    img = np.empty((height, width, 3), dtype=np.uint8)
+    img[:] = rng.integers(150, 256, 3)
+    line_width = max(2, min(width, height) // 300)
+    scale = min(width, height)
+
+    for _ in range(40):
+        color = tuple(int(v) for v in rng.integers(0, 256, 3))
+        if rng.random() < 0.5:
+            center = tuple(int(v) for v in rng.integers(0, (width, height)))
+            axes = tuple(int(v) for v in rng.integers(scale // 30, scale // 4, 2))
+            angle = float(rng.integers(0, 180))
+            cv2.ellipse(img, center, axes, angle, 0, 360, color, -1, cv2.LINE_AA)
+            cv2.ellipse(img, center, axes, angle, 0, 360, (20, 20, 20), line_width, cv2.LINE_AA)
+        else:
+            center = rng.integers(0, (width, height))
+            points = (center + rng.integers(-scale // 5, scale // 5, (int(rng.integers(3, 7)), 2)))
+            points = points.astype(np.int32).reshape(-1, 1, 2)
+            cv2.fillPoly(img, [points], color, cv2.LINE_AA)
+            cv2.polylines(img, [points], True, (20, 20, 20), line_width, cv2.LINE_AA)
+
+    # Hair and cloth strokes
+    for _ in range(30):
+        start = rng.integers(0, (width, height))
+        points = np.cumsum(rng.integers(-scale // 20, scale // 20, (5, 2)), axis=0) + start
+        cv2.polylines(img, [points.astype(np.int32).reshape(-1, 1, 2)], False,
+                      (20, 20, 20), max(1, line_width // 2), cv2.LINE_AA)
+    return img
+
+
+def make_corpus(corpus_dir, n_anime=4, sets_per_anime=5, sizes=REALISTIC_SIZES, seed=0):
+    """
+    Write a synthetic corpus in the dataset/<anime>/<anime>_n/original.jpg layout
+
+    Args:
+        corpus_dir (str): Root of the corpus
+        n_anime (int): Number of anime folders
+        sets_per_anime (int): Question sets per anime
+        sizes (tuple): (width, height) choices, cycled through
+        seed (int): Base random seed
+
+    Returns:
+        int: Number of originals written
+    """
+    count = 0
+    for anime_idx in range(n_anime):
+        anime = f"Synthetic Anime {anime_idx + 1}"
+        for set_idx in range(1, sets_per_anime + 1):
+            set_dir = os.path.join(corpus_dir, anime, f"{anime}_{set_idx}")
+            os.makedirs(set_dir, exist_ok=True)
+            width, height = sizes[count % len(sizes)]
+            img = make_anime_image(width, height, seed=seed + count)
+            cv2.imwrite(os.path.join(set_dir, "original.jpg"), img, [cv2.IMWRITE_JPEG_QUALITY, 92])
+            count += 1
+    return count
+
+
+def _run_config(corpus_dir, output_dir, workers, result_queue):
+    """
+    Generate the dataset once in a fresh process, so the peak RSS belongs to this run
+    """
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        summary = generate_dataset(corpus_dir, output_dir, segment_workers=workers, overwrite=True)
+    result_queue.put(summary)
+
+
+def _wait_for_result(process, result_queue, timeout=None):
+    """
+    Wait for a child's summary without hanging when the child dies
+
+    Args:
+        process (multiprocessing.Process): Started child running _run_config
+        result_queue (multiprocessing.Queue): Queue the child puts its summary on
+        timeout (float): Seconds to wait at most, None for no limit
+
+    Returns:
+        tuple: (summary or None, error message or None)
+    """
+    waited = 0.0
+    while timeout is None or waited < timeout:
+        try:
+            return result_queue.get(timeout=POLL_INTERVAL), None
+        except queue.Empty:
+            waited += POLL_INTERVAL
+        if not process.is_alive():
+            # The summary may have been flushed just before the child exited
+            try:
+                return result_queue.get(timeout=POLL_INTERVAL), None
+            except queue.Empty:
+                return None, f"child process exited with code {process.exitcode} without a result"
+    process.terminate()
+    return None, f"no result after {timeout:.0f}s, child process terminated"
+
+
+def run_benchmark(corpus_dir, worker_counts, timeout=None):
+    """
+    Run the decode -> resize -> SLIC -> render -> encode -> write flow per worker count
+
+    A worker count whose child process crashes (out of memory, a segfault in
+    cv2) or runs past timeout is reported and skipped.
+
+    Args:
+        corpus_dir (str): Corpus in the dataset layout
+        worker_counts (list): Segmentation worker counts to try
+        timeout (float): Seconds one worker count may take, None for no limit
+
+    Returns:
+        list: One result dict per worker count that finished
+    """
+    context = multiprocessing.get_context('spawn')
+    rows = []
+    for workers in worker_counts:
+        with tempfile.TemporaryDirectory() as output_dir:
+            result_queue = context.Queue()
+            process = context.Process(target=_run_config,
+                                      args=(corpus_dir, output_dir, workers, result_queue))
+            process.start()
+            summary, error = _wait_for_result(process, result_queue, timeout)
+            process.join()
+        if summary is None:
+            print(f"{workers} worker(s) failed: {error}")
+            continue
+
+        latencies = summary['latencies'] or [0.0]
+        elapsed = summary['elapsed']
+        rows.append({
+            'workers': workers,
+            'sets': summary['sets'],
+            'images': summary['images'],
+            'failed': summary['failed'],
+            'elapsed': elapsed,
+            'images_per_sec': summary['images'] / elapsed,
+            'sets_per_hour': summary['sets'] / elapsed * 3600,
+            'latency_p50': float(np.percentile(latencies, 50)),
+            'latency_p95': float(np.percentile(latencies, 95)),
+            'stage_times': summary['stage_times'],
+            'peak_rss': summary['peak_rss'],
+        })
+    return rows
+
+
+def print_report(rows):
+    """
+    Print throughput, latency, memory and where the busy time goes
+    """
+    print(f"{'workers':>7} {'sets':>5} {'images/s':>9} {'sets/hour':>10} {'p50 (s)':>8} "
+          f"{'p95 (s)':>8} {'peak RSS (MiB)':>15}")
+    for row in rows:
+        print(f"{row['workers']:>7} {row['sets']:>5} {row['images_per_sec']:>9.2f} "
+              f"{row['sets_per_hour']:>10.0f} {row['latency_p50']:>8.2f} {row['latency_p95']:>8.2f} "
+              f"{row['peak_rss'] / 2 ** 20:>15.0f}")
+
+    print("\nBusy time per stage (share of all stage time)")
+    for row in rows:
+        total = sum(row['stage_times'].values()) or 1.0
+        print(f"{row['workers']:>7} workers: " + ", ".join(
+            f"{name}={seconds:.2f}s ({seconds / total:.0%})" for name, seconds in row['stage_times'].items()))
+
+
+def main():
+    """
+    Measure how many question sets per hour the create_data flow produces
+    """
+    parser = argparse.ArgumentParser(description="End-to-end dataset generation benchmark on a synthetic corpus")
+    parser.add_argument('--corpus-dir', help="Reuse or create the corpus here instead of a temporary directory")
+    parser.add_argument('--anime', type=int, default=4, help="Anime folders in the corpus")
+    parser.add_argument('--sets', type=int, default=5, help="Question sets per anime")
+    parser.add_argument('--workers', type=int, nargs='+',
+                        help="Segmentation worker counts (default: 1 2 4 and the CPU count)")
+    parser.add_argument('--timeout', type=float, help="Seconds one worker count may take (default: no limit)")
+    parser.add_argument('--json', metavar='PATH', help="Also write the results to a JSON file")
+    args = parser.parse_args()
+
+    worker_counts = args.workers or sorted({1, 2, 4, os.cpu_count() or 1})
+
+    corpus_dir = args.corpus_dir or tempfile.mkdtemp(prefix='colorweb_corpus_')
+    try:
+        if not os.path.isdir(corpus_dir) or not os.listdir(corpus_dir):
+            count = make_corpus(corpus_dir, args.anime, args.sets)
+            print(f"Generated a corpus of {count} originals in {corpus_dir}")
+
+        rows = run_benchmark(corpus_dir, worker_counts, args.timeout)
+        if len(rows) < len(worker_counts):
+            print(f"{len(worker_counts) - len(rows)} of {len(worker_counts)} worker counts failed")
+        print_report(rows)
+
+        if args.json:
+            with open(args.json, 'w') as f:
+                json.dump(rows, f, indent=2)
+        if len(rows) < len(worker_counts):
+            sys.exit(1)
+    finally:
+        if args.corpus_dir is None:
+            shutil.rmtree(corpus_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
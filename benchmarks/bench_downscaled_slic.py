@@ -0,0 +1,140 @@
+import os
+import sys
+import json
+import time
+import argparse
+import numpy as np
+import cv2
+
+# Measure the real work, not stage cache hits
+os.environ['COLORWEB_CACHE'] = 'off'
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'create_data'))
+from image_io import find_image_files, load_image
+from SLIC import segment_slic, downscale_factor
+from superpixel_refine import boundary_agreement
+from superpixel_stats import render_mean_colors
+from bench_dataset import make_anime_image
+
+REGION_SIZES = (20, 40, 60, 80, 100, 120, 150)
+
+
+def color_error(img, labels):
+    """
+    Mean absolute difference between an image and its superpixel mean-color rendering
+    """
+    return float(np.abs(render_mean_colors(img, labels).astype(np.int16) - img).mean())
+
+
+def compare_level(img, region_size, factor, ruler=20.0, iterations=20, tolerance=2):
+    """
+    Segment one image at full resolution and downscaled, and compare the two
+
+    Args:
+        img (numpy.ndarray): BGR image
+        region_size (int): Full resolution region size
+        factor (int or str): Downscale factor or 'auto'
+        ruler (float): SLIC smoothness factor
+        iterations (int): SLIC iterations
+        tolerance (int): Boundary displacement in pixels still counted as agreeing
+
+    Returns:
+        dict: Factor, both times, speedup, boundary precision/recall/F-score
+              against the full resolution labels and the color error ratio
+    """
+    start = time.perf_counter()
+    full_labels, _ = segment_slic(img, region_size, ruler, iterations)
+    full_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    labels, _, info = segment_slic(img, region_size, ruler, iterations, return_info=True, downscale=factor)
+    downscaled_time = time.perf_counter() - start
+
+    agreement = boundary_agreement(labels, full_labels, tolerance)
+    return {
+        'region_size': region_size,
+        'factor': info['downscale'],
+        'full_time': full_time,
+        'downscaled_time': downscaled_time,
+        'speedup': full_time / downscaled_time,
+        'precision': agreement['precision'],
+        'recall': agreement['recall'],
+        'f1': agreement['f1'],
+        'color_error_ratio': color_error(img, labels) / max(color_error(img, full_labels), 1e-9),
+    }
+
+
+def run_benchmark(images, region_sizes, factor='auto', tolerance=2):
+    """
+    Compare every region size on every image
+
+    Returns:
+        list: One result dict per (image, region size)
+    """
+    rows = []
+    for name, img in images:
+        for region_size in region_sizes:
+            row = compare_level(img, region_size, factor, tolerance=tolerance)
+            row['image'] = name
+            rows.append(row)
+            print(f"{name}: region {region_size} at 1/{row['factor']}, {row['speedup']:.1f}x, "
+                  f"boundary F {row['f1']:.3f}")
+    return rows
+
+
+def print_report(rows):
+    """
+    Print the speedup and agreement per region size, to pick a threshold per level
+    """
+    print(f"\n{'region':>6} {'factor':>6} {'full (s)':>9} {'down (s)':>9} {'speedup':>8} "
+          f"{'F mean':>7} {'F min':>6} {'color err':>10}")
+    for region_size in sorted({row['region_size'] for row in rows}):
+        level = [row for row in rows if row['region_size'] == region_size]
+        print(f"{region_size:>6} {level[0]['factor']:>6} "
+              f"{np.median([row['full_time'] for row in level]):>9.3f} "
+              f"{np.median([row['downscaled_time'] for row in level]):>9.3f} "
+              f"{np.median([row['speedup'] for row in level]):>7.1f}x "
+              f"{np.mean([row['f1'] for row in level]):>7.3f} {min(row['f1'] for row in level):>6.3f} "
+              f"{np.mean([row['color_error_ratio'] for row in level]):>9.2f}x")
+    print("\nF is the boundary F-score against full resolution SLIC; color err is the mean-color "
+          "rendering error relative to full resolution (below 1x fits the image better)")
+
+
+def main():
+    """
+    Measure what downscaled SLIC saves and how far its boundaries move per region size
+    """
+    parser = argparse.ArgumentParser(description="Downscaled SLIC versus full resolution SLIC")
+    parser.add_argument('--images', metavar='DIR',
+                        help="Images to segment, e.g. dataset_resized (default: synthetic frames)")
+    parser.add_argument('--names', nargs='+', default=['original.jpg'],
+                        help="With --images, only use files with these names")
+    parser.add_argument('--limit', type=int, default=5, help="Number of images")
+    parser.add_argument('--region-sizes', type=int, nargs='+', default=list(REGION_SIZES))
+    parser.add_argument('--factor', default='auto', help="Downscale factor, or auto to pick it per region size")
+    parser.add_argument('--tolerance', type=int, default=2, help="Boundary tolerance in pixels")
+    parser.add_argument('--json', metavar='PATH', help="Also write the results to a JSON file")
+    args = parser.parse_args()
+
+    if args.images:
+        paths = find_image_files(args.images, args.names)[:args.limit]
+        images = [(os.path.relpath(path, args.images), load_image(path, (1024, 1024))) for path in paths]
+    else:
+        images = [(f"synthetic_{seed}", cv2.resize(make_anime_image(1920, 1080, seed), (1024, 576),
+                                                   interpolation=cv2.INTER_AREA))
+                  for seed in range(args.limit)]
+
+    factor = args.factor if args.factor == 'auto' else int(args.factor)
+    if factor == 'auto':
+        print("Downscale factors: " + ", ".join(f"{region_size}->1/{downscale_factor(region_size)}"
+                                                for region_size in args.region_sizes))
+    rows = run_benchmark(images, args.region_sizes, factor, args.tolerance)
+    print_report(rows)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+import os
+import sys
+import time
+import numpy as np
+import cv2
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'create_data'))
+from superpixel_stats import render_mean_colors
+
+
+def make_test_image(size, seed=0):
+    """
+    Create a deterministic flat-shaded test image
+
+    Args:
+        size (int): Width and height of the image
+        seed (int): Random seed
+
+    Returns:
+        numpy.ndarray: BGR uint8 image
+    """
+    rng = np.random.default_rng(seed)
+    img = np.full((size, size, 3), 255, dtype=np.uint8)
+    for _ in range(60):
+        center = tuple(int(v) for v in rng.integers(0, size, 2))
+        axes = tuple(int(v) for v in rng.integers(size // 20, size // 4, 2))
+        color = tuple(int(v) for v in rng.integers(0, 256, 3))
+        cv2.ellipse(img, center, axes, float(rng.integers(0, 180)), 0, 360, color, -1)
+    return img
+
+
+def render_mask_loop(img, labels, n_segments):
+    """
+    Reference implementation: one full-image mask per label
+    """
+    superpixel_result = img.copy()
+    for i in range(n_segments):
+        mask = labels == i
+        superpixel_result[mask] = np.mean(img[mask], axis=0)
+    return superpixel_result
+
+
+def time_call(func, *args, repeat=3):
+    """
+    Return the best wall time of several calls in seconds
+    """
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    """
+    Compare the per-label mask loop with the single-pass statistics renderer
+    """
+    img = make_test_image(1024)
+
+    print(f"{'region_size':>11} {'segments':>8} {'mask loop (s)':>14} {'single pass (s)':>16} {'speedup':>8}")
+    for region_size in [20, 40, 80, 150]:
+        slic = cv2.ximgproc.createSuperpixelSLIC(img, algorithm=cv2.ximgproc.SLICO,
+                                                region_size=region_size, ruler=20.0)
+        slic.iterate(5)
+        labels = slic.getLabels()
+        n_segments = slic.getNumberOfSuperpixels()
+
+        expected = render_mask_loop(img, labels, n_segments)
+        if not np.array_equal(expected, render_mean_colors(img, labels)):
+            raise AssertionError(f"Renderers disagree at region_size={region_size}")
+
+        loop_time = time_call(render_mask_loop, img, labels, n_segments, repeat=1)
+        fast_time = time_call(render_mean_colors, img, labels)
+        print(f"{region_size:>11} {n_segments:>8} {loop_time:>14.3f} {fast_time:>16.4f} {loop_time / fast_time:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+import os
+import sys
+import time
+import numpy as np
+import cv2
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'experiment'))
+from color_quantize import QUANTIZE_METHODS, quantize
+from bench_label_stats import make_test_image
+
+
+def quantization_psnr(image, palette, index_map):
+    """
+    PSNR of the quantized image against the source, in dB
+    """
+    quantized = palette.astype(np.uint8)[index_map]
+    mse = np.mean((image.astype(np.float64) - quantized) ** 2)
+    return float('inf') if mse == 0 else 10 * np.log10(255.0 ** 2 / mse)
+
+
+def palette_distance(palette, reference):
+    """
+    Mean distance from each reference color to its closest palette color
+    """
+    diff = reference[:, None, :].astype(np.float64) - palette[None, :, :]
+    return float(np.sqrt((diff ** 2).sum(axis=2)).min(axis=1).mean())
+
+
+def main():
+    """
+    Compare speed and accuracy of the palette engines against exact K-means
+    """
+    rng = np.random.default_rng(1)
+    img = make_test_image(1024)
+    # Soft shading and noise so the histogram is not trivially small
+    gradient = np.linspace(0, 40, 1024, dtype=np.float32)[None, :, None]
+    img = np.clip(img * 0.85 + gradient + rng.normal(0, 4, img.shape), 0, 255).astype(np.uint8)
+    img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+
+    print(f"{'method':>10} {'colors':>6} {'time (s)':>9} {'speedup':>8} {'PSNR (dB)':>10} {'palette dist':>13}")
+    for n_colors in [5, 10, 16]:
+        reference = None
+        reference_time = None
+        for method in QUANTIZE_METHODS:
+            start = time.perf_counter()
+            palette, index_map = quantize(img, n_colors, method=method)
+            elapsed = time.perf_counter() - start
+
+            if method == 'kmeans':
+                reference, reference_time = palette, elapsed
+
+            print(f"{method:>10} {n_colors:>6} {elapsed:>9.3f} {reference_time / elapsed:>7.1f}x "
+                  f"{quantization_psnr(img, palette, index_map):>10.2f} "
+                  f"{palette_distance(palette, reference):>13.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+import os
+import sys
+import json
+import time
+import argparse
+import numpy as np
+import cv2
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'create_data'))
+from image_io import find_image_files, load_image
+from numpy_slic import ALGORITHMS, create_superpixel_slic
+from superpixel_refine import boundary_agreement
+from superpixel_stats import render_mean_colors
+from bench_dataset import make_anime_image
+
+SIZES = ((640, 360), (1280, 720), (1920, 1080))
+REGION_SIZES = (20, 40, 80)
+
+
+def color_error(img, labels):
+    """
+    Mean absolute difference between an image and its superpixel mean-color rendering
+    """
+    return float(np.abs(render_mean_colors(img, labels).astype(np.int16) - img).mean())
+
+
+def segment(create, img, algorithm, region_size, ruler, iterations):
+    """
+    Construct and iterate one engine
+
+    Returns:
+        tuple: (label map, seconds)
+    """
+    start = time.perf_counter()
+    slic = create(img, algorithm, region_size, ruler)
+    slic.iterate(iterations)
+    labels = slic.getLabels()
+    return labels, time.perf_counter() - start
+
+
+def compare_engines(img, alg_name, region_size, ruler=20.0, iterations=10, tolerance=2):
+    """
+    Segment one image with both engines on the same input and compare them
+
+    Without cv2.ximgproc only the NumPy engine is timed.
+
+    Args:
+        img (numpy.ndarray): BGR image
+        alg_name (str): 'SLIC' or 'SLICO'
+        region_size (int): Region size
+        ruler (float): SLIC smoothness factor
+        iterations (int): SLIC iterations
+        tolerance (int): Boundary displacement in pixels still counted as agreeing
+
+    Returns:
+        dict: Times, segment counts and color errors of both engines and the
+              boundary F-score of the NumPy labels against OpenCV's
+    """
+    algorithm = ALGORITHMS[alg_name]
+    labels, numpy_time = segment(create_superpixel_slic, img, algorithm, region_size, ruler, iterations)
+    row = {
+        'algorithm': alg_name,
+        'region_size': region_size,
+        'numpy_time': numpy_time,
+        'numpy_segments': int(np.unique(labels).size),
+        'numpy_color_error': color_error(img, labels),
+    }
+    if hasattr(cv2, 'ximgproc'):
+        create = lambda *args: cv2.ximgproc.createSuperpixelSLIC(*args)
+        reference, opencv_time = segment(create, img, algorithm, region_size, ruler, iterations)
+        row.update(opencv_time=opencv_time,
+                   opencv_segments=int(np.unique(reference).size),
+                   opencv_color_error=color_error(img, reference),
+                   ratio=numpy_time / opencv_time,
+                   f1=boundary_agreement(labels, reference, tolerance)['f1'])
+    return row
+
+
+def run_benchmark(images, algorithms, region_sizes, iterations=10):
+    """
+    Compare the engines for every algorithm and region size on every image
+
+    Returns:
+        list: One result dict per (image, algorithm, region size)
+    """
+    rows = []
+    for name, img in images:
+        for alg_name in algorithms:
+            for region_size in region_sizes:
+                row = compare_engines(img, alg_name, region_size, iterations=iterations)
+                row.update(image=name, size=f"{img.shape[1]}x{img.shape[0]}")
+                rows.append(row)
+                line = f"{name} {row['size']}: {alg_name} region {region_size}, numpy {row['numpy_time']:.3f}s"
+                if 'opencv_time' in row:
+                    line += f", opencv {row['opencv_time']:.3f}s, boundary F {row['f1']:.3f}"
+                print(line)
+    return rows
+
+
+def print_report(rows):
+    """
+    Print the timing ratio and agreement per image size, algorithm and region size
+    """
+    with_opencv = all('opencv_time' in row for row in rows)
+    header = f"\n{'size':>10} {'alg':>6} {'region':>6} {'numpy (s)':>10} {'segments':>8} {'color err':>9}"
+    if with_opencv:
+        header += f" {'opencv (s)':>10} {'segments':>8} {'color err':>9} {'ratio':>6} {'F':>6}"
+    print(header)
+    keys = sorted({(row['size'], row['algorithm'], row['region_size']) for row in rows},
+                  key=lambda key: (int(key[0].split('x')[0]), key[1], key[2]))
+    for size, alg_name, region_size in keys:
+        group = [row for row in rows
+                 if (row['size'], row['algorithm'], row['region_size']) == (size, alg_name, region_size)]
+        line = (f"{size:>10} {alg_name:>6} {region_size:>6} "
+                f"{np.median([row['numpy_time'] for row in group]):>10.3f} "
+                f"{np.mean([row['numpy_segments'] for row in group]):>8.0f} "
+                f"{np.mean([row['numpy_color_error'] for row in group]):>9.2f}")
+        if with_opencv:
+            line += (f" {np.median([row['opencv_time'] for row in group]):>10.3f} "
+                     f"{np.mean([row['opencv_segments'] for row in group]):>8.0f} "
+                     f"{np.mean([row['opencv_color_error'] for row in group]):>9.2f} "
+                     f"{np.median([row['ratio'] for row in group]):>5.2f}x "
+                     f"{np.mean([row['f1'] for row in group]):>6.3f}")
+        print(line)
+    if with_opencv:
+        print("\nratio is NumPy time over OpenCV time (below 1x is faster); F is the boundary F-score "
+              "of the NumPy labels against OpenCV's; color err is the mean-color rendering error")
+    else:
+        print("\ncv2.ximgproc is not installed, only the NumPy engine was timed")
+
+
+def main():
+    """
+    Time the NumPy SLIC engine against cv2.ximgproc on the same inputs
+    """
+    parser = argparse.ArgumentParser(description="NumPy SLIC engine versus cv2.ximgproc")
+    parser.add_argument('--images', metavar='DIR',
+                        help="Images to segment, e.g. dataset_resized (default: synthetic frames)")
+    parser.add_argument('--names', nargs='+', default=['original.jpg'],
+                        help="With --images, only use files with these names")
+    parser.add_argument('--limit', type=int, default=3, help="Number of images per size")
+    parser.add_argument('--sizes', nargs='+', default=[f"{w}x{h}" for w, h in SIZES],
+                        help="Image sizes as WIDTHxHEIGHT")
+    parser.add_argument('--algorithms', nargs='+', choices=['SLIC', 'SLICO'], default=['SLIC', 'SLICO'])
+    parser.add_argument('--region-sizes', type=int, nargs='+', default=list(REGION_SIZES))
+    parser.add_argument('--iterations', type=int, default=10)
+    parser.add_argument('--json', metavar='PATH', help="Also write the results to a JSON file")
+    args = parser.parse_args()
+
+    sizes = [tuple(int(value) for value in size.split('x')) for size in args.sizes]
+    if args.images:
+        paths = find_image_files(args.images, args.names)[:args.limit]
+        images = [(os.path.relpath(path, args.images), load_image(path, size))
+                  for size in sizes for path in paths]
+    else:
+        images = [(f"synthetic_{seed}", make_anime_image(width, height, seed))
+                  for width, height in sizes for seed in range(args.limit)]
+
+    rows = run_benchmark(images, args.algorithms, args.region_sizes, args.iterations)
+    print_report(rows)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
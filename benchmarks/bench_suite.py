@@ -0,0 +1,262 @@
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import tracemalloc
+from datetime import datetime
+import numpy as np
+import cv2
+
+# Measure the real work, not stage cache hits
+os.environ['COLORWEB_CACHE'] = 'off'
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, '..', 'create_data'))
+sys.path.insert(0, os.path.join(BENCH_DIR, '..', 'experiment'))
+from image_io import resize_with_pad
+from SLIC import apply_slic, create_comparison_grid
+import pipe_1
+from pipe_1 import color_extract, get_color_distribution, edge_detection
+from pipe_2 import improve_edges
+from bench_label_stats import make_test_image
+
+BASELINE_VERSION = 1
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, 'baseline.json')
+
+SIZES = (256, 512, 1024, 2048)
+REGION_SIZES = (20, 60, 150)
+CLUSTER_COUNTS = (5, 10, 16)
+EDGE_MODES = ('normal', 'abstract', 'blur', 'sketch')
+
+
+def build_cases(sizes=SIZES, region_sizes=REGION_SIZES, cluster_counts=CLUSTER_COUNTS):
+    """
+    List the benchmark cases
+
+    Every case is (case id, image size, callable). The input images are
+    synthetic and seeded, so the cases run offline and identically every time.
+
+    Args:
+        sizes (tuple): Image sizes in pixels
+        region_sizes (tuple): SLIC region sizes
+        cluster_counts (tuple): Palette sizes for color_extract
+
+    Returns:
+        list: (case id, size, func) tuples
+    """
+    cases = []
+    for size in sizes:
+        img = make_test_image(size)
+        rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+        # Sources are 4:3 like most originals and go to the dataset's 1024x1024
+        source = cv2.resize(img, (size, size * 3 // 4), interpolation=cv2.INTER_AREA)
+        canny = cv2.Canny(cv2.cvtColor(img, cv2.COLOR_BGR2GRAY), 30, 100)
+
+        cases.append((f"resize_with_pad/{size}", size,
+                      lambda source=source: resize_with_pad(source, (1024, 1024))))
+
+        for region_size in region_sizes:
+            cases.append((f"apply_slic/{size}/r{region_size}", size,
+                          lambda img=img, region_size=region_size: apply_slic(img, region_size)))
+
+        for n_colors in cluster_counts:
+            cases.append((f"color_extract/{size}/k{n_colors}", size,
+                          lambda rgb=rgb, n_colors=n_colors: color_extract(rgb, n_colors)))
+
+            colors, _ = color_extract(rgb, n_colors)
+            cases.append((f"get_color_distribution/{size}/k{n_colors}", size,
+                          lambda rgb=rgb, colors=colors: get_color_distribution(rgb, colors)))
+
+        for mode in EDGE_MODES:
+            cases.append((f"edge_detection/{size}/{mode}", size,
+                          lambda rgb=rgb, mode=mode: edge_detection(rgb, mode=mode)))
+
+        cases.append((f"improve_edges/{size}", size, lambda canny=canny: improve_edges(canny)))
+
+        # Seven difficulty levels side by side, like run_focused_experiment
+        results = [{'image': img, 'region_size': region_size, 'segments': 0}
+                   for region_size in range(20, 160, 20)]
+        cases.append((f"create_comparison_grid/{size}", size,
+                      lambda results=results: _grid_to_tempdir(results)))
+    return cases
+
+
+def _grid_to_tempdir(results):
+    with tempfile.TemporaryDirectory() as output_dir:
+        create_comparison_grid(results, output_dir)
+
+
+def measure(func, size, repeat=5, min_time=0.5):
+    """
+    Time a case and measure its peak traced memory
+
+    The case runs once to warm up, then at least repeat times and for at
+    least min_time seconds. Peak memory comes from one extra run under
+    tracemalloc, which sees NumPy buffers but not OpenCV's internal ones.
+
+    Args:
+        func (callable): Case to run
+        size (int): Image size, for the throughput
+        repeat (int): Minimum number of timed runs
+        min_time (float): Minimum total timed seconds
+
+    Returns:
+        dict: median, best and worst time in seconds, peak bytes, megapixels/sec and runs
+    """
+    func()
+
+    times = []
+    total = 0.0
+    while len(times) < repeat or total < min_time:
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        times.append(elapsed)
+        total += elapsed
+
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    median = float(np.median(times))
+    return {
+        'time': median,
+        'best': min(times),
+        'worst': max(times),
+        'peak_bytes': peak,
+        'megapixels_per_sec': size * size / 1e6 / median,
+        'runs': len(times),
+    }
+
+
+def run_suite(cases, repeat=5, min_time=0.5):
+    """
+    Run every case and print one line per case
+
+    Returns:
+        dict: Case id -> measurement
+    """
+    results = {}
+    print(f"{'case':<40} {'median (s)':>11} {'best (s)':>10} {'peak (MiB)':>11} {'MP/s':>9}")
+    for case_id, size, func in cases:
+        result = measure(func, size, repeat, min_time)
+        results[case_id] = result
+        print(f"{case_id:<40} {result['time']:>11.4f} {result['best']:>10.4f} "
+              f"{result['peak_bytes'] / 2 ** 20:>11.1f} {result['megapixels_per_sec']:>9.2f}")
+    return results
+
+
+def save_baseline(path, results):
+    """
+    Write the measurements and the machine they ran on to a JSON baseline
+    """
+    baseline = {
+        'version': BASELINE_VERSION,
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'machine': {
+            'platform': platform.platform(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'opencv': cv2.__version__,
+            'cpus': os.cpu_count(),
+        },
+        'results': results,
+    }
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(baseline, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+    print(f"Saved baseline of {len(results)} cases to {path}")
+
+
+def compare_to_baseline(path, results, threshold=0.15, memory_threshold=0.25):
+    """
+    Flag cases that got slower or use more memory than in a stored baseline
+
+    Args:
+        path (str): Baseline JSON
+        results (dict): Current measurements
+        threshold (float): Allowed fractional slowdown of the median time
+        memory_threshold (float): Allowed fractional growth of the peak memory
+
+    Returns:
+        list: Ids of the regressed cases
+    """
+    with open(path) as f:
+        baseline = json.load(f)
+    if baseline.get('version') != BASELINE_VERSION:
+        raise ValueError(f"Unsupported baseline version in {path}: {baseline.get('version')}")
+    if baseline['machine'].get('platform') != platform.platform():
+        print(f"Warning: baseline was recorded on {baseline['machine'].get('platform')}")
+
+    regressions = []
+    print(f"\n{'case':<40} {'baseline (s)':>13} {'now (s)':>10} {'time':>8} {'memory':>8}")
+    for case_id, result in results.items():
+        reference = baseline['results'].get(case_id)
+        if reference is None:
+            print(f"{case_id:<40} {'new':>13}")
+            continue
+
+        time_ratio = result['time'] / reference['time']
+        memory_ratio = (result['peak_bytes'] / reference['peak_bytes']
+                        if reference['peak_bytes'] else 1.0)
+        regressed = time_ratio > 1 + threshold or memory_ratio > 1 + memory_threshold
+        if regressed:
+            regressions.append(case_id)
+        print(f"{case_id:<40} {reference['time']:>13.4f} {result['time']:>10.4f} "
+              f"{time_ratio:>7.2f}x {memory_ratio:>7.2f}x{'  REGRESSION' if regressed else ''}")
+
+    print(f"\n{len(regressions)} regression(s) against {path}")
+    return regressions
+
+
+def main():
+    """
+    Benchmark the image hot paths and store or check a baseline
+    """
+    parser = argparse.ArgumentParser(description="Micro-benchmarks of the image hot paths")
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(SIZES), help="Image sizes in pixels")
+    parser.add_argument('--region-sizes', type=int, nargs='+', default=list(REGION_SIZES),
+                        help="SLIC region sizes")
+    parser.add_argument('--clusters', type=int, nargs='+', default=list(CLUSTER_COUNTS),
+                        help="Palette sizes for color_extract")
+    parser.add_argument('--filter', default='', help="Only run cases whose id contains this text")
+    parser.add_argument('--repeat', type=int, default=5, help="Minimum timed runs per case")
+    parser.add_argument('--min-time', type=float, default=0.5, help="Minimum timed seconds per case")
+    parser.add_argument('--save-baseline', nargs='?', const=DEFAULT_BASELINE, metavar='PATH',
+                        help="Write the results as the new baseline")
+    parser.add_argument('--compare', nargs='?', const=DEFAULT_BASELINE, metavar='PATH',
+                        help="Compare against a baseline and exit with 1 on regressions")
+    parser.add_argument('--threshold', type=float, default=0.15, help="Allowed fractional slowdown")
+    parser.add_argument('--memory-threshold', type=float, default=0.25,
+                        help="Allowed fractional growth of peak memory")
+    args = parser.parse_args()
+
+    # Baselines are per machine, so none is committed; fail before spending minutes measuring
+    compare = args.compare
+    if compare and not os.path.exists(compare):
+        if not args.save_baseline:
+            parser.error(f"No baseline at {compare}; run with --save-baseline first")
+        print(f"No baseline at {compare} yet, only saving one")
+        compare = None
+
+    pipe_1.set_headless(True)
+    cases = [case for case in build_cases(args.sizes, args.region_sizes, args.clusters)
+             if args.filter in case[0]]
+    results = run_suite(cases, args.repeat, args.min_time)
+
+    regressions = []
+    if compare:
+        regressions = compare_to_baseline(compare, results, args.threshold, args.memory_threshold)
+    if args.save_baseline:
+        save_baseline(args.save_baseline, results)
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
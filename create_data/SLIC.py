@@ -3,73 +3,465 @@ import cv2
 import os
 import base64
 from datetime import datetime
+from image_store import load_decoded
+from stage_cache import get_cache
+from async_writer import AsyncImageWriter, ensure_writer
+from tracing import span, traced
+from superpixel_stats import render_mean_colors
+from superpixel_hierarchy import estimate_segment_count, merge_ladder, region_size_for_count
+from superpixel_refine import label_boundaries, refine_boundaries, upsample_labels
+from superpixel_tiles import TILE_MARGIN_REGIONS, tile_grid, stitch_tile, fill_unassigned
+from numpy_slic import SLICO, create_superpixel_slic
 
-def load_image(image_path):
+# Iterations between convergence checks in adaptive mode; SLICO loses its
+# segmentation when iterated one step per call, so chunks need at least 2
+ADAPTIVE_CHUNK = 3
+
+# Boundary pixels of flat regions keep flipping for about 4-5% of the image
+# per chunk, so a tolerance just above that stops once the superpixels settle
+DEFAULT_TOLERANCE = 0.06
+
+# Smallest region size SLIC gets on a downscaled image, and the width of the
+# band refined at full resolution after upsampling its labels
+DOWNSCALE_MIN_REGION = 25
+REFINE_BAND = 2
+
+# Width of a comparison grid cell when tiling, full size results of very
+# large images would make the grid many times the image itself
+TILED_GRID_CELL_WIDTH = 1024
+
+# The segment count solver measures on a thumbnail this many pixels on its
+# longest side, at region sizes of at least SOLVER_MIN_REGION pixels there
+SOLVER_THUMBNAIL_SIDE = 512
+SOLVER_MIN_REGION = 8
+SOLVER_ITERATIONS = 5
+
+# SLIC engine: 'opencv' needs opencv-contrib's ximgproc, 'numpy' is the
+# built-in engine, 'auto' uses OpenCV when it is installed
+SLIC_ENGINE = os.environ.get('COLORWEB_SLIC_ENGINE', 'auto').lower()
+
+def load_image(image_path, target_size=None):
     """
     Load image
     
     Args:
         image_path (str): Path to the image file
+        target_size (tuple): Optional (width, height) to resize with padding to,
+                             large JPEGs are then decoded at a reduced scale
         
     Returns:
         image (numpy.ndarray): The loaded image
     """
-    if not os.path.exists(image_path):
-        raise FileNotFoundError(f"Image file not found: {image_path}")
+    # Read once per run; the decoded-image store is only used with COLORWEB_IMAGE_STORE=on
+    return load_decoded(image_path, target_size)
+
+def iterate_until_stable(slic, max_iterations, tolerance, chunk=ADAPTIVE_CHUNK):
+    """
+    Iterate SLIC in chunks until the labels stop moving
+    
+    After every chunk the label map is compared with the previous one; once
+    the fraction of pixels that changed label drops below tolerance, or
+    max_iterations is reached, iteration stops. Flat-shaded frames settle
+    within a few iterations, detailed ones still get the maximum.
     
-    image = cv2.imread(image_path)
-    if image is None:
-        raise ValueError(f"Failed to load image: {image_path}")
+    Args:
+        slic: SuperpixelSLIC object from create_slic
+        max_iterations: Upper bound on the iterations
+        tolerance: Fraction of changed pixels (0-1) below which the labels count as settled
+        chunk: Iterations between checks
     
-    return image
+    Returns:
+        tuple: (iterations used, fraction of pixels changed in the last chunk)
+    """
+    used = min(chunk, max_iterations)
+    slic.iterate(used)
+    labels = slic.getLabels()
+    changed = 1.0
+    while used < max_iterations:
+        step = min(chunk, max_iterations - used)
+        slic.iterate(step)
+        used += step
+        new_labels = slic.getLabels()
+        changed = np.count_nonzero(new_labels != labels) / labels.size
+        labels = new_labels
+        if changed < tolerance:
+            break
+    return used, changed
 
-def apply_slic(img, region_size, ruler=20.0, iterations=20):
+def slic_engine():
     """
-    Apply SLIC with specific parameters
+    Name of the SLIC engine in use
+    
+    Returns:
+        str: 'opencv' or 'numpy'
+    """
+    if SLIC_ENGINE not in ('auto', 'opencv', 'numpy'):
+        raise ValueError(f"Unknown COLORWEB_SLIC_ENGINE: {SLIC_ENGINE}, expected auto, opencv or numpy")
+    if SLIC_ENGINE == 'numpy' or (SLIC_ENGINE == 'auto' and not hasattr(cv2, 'ximgproc')):
+        return 'numpy'
+    return 'opencv'
+
+def create_slic(img, algorithm, region_size, ruler):
+    """
+    Construct a SuperpixelSLIC object with the engine in use
+    
+    Plain opencv-python builds lack cv2.ximgproc; numpy_slic then segments
+    with the same interface. MSLIC is only available from OpenCV.
     
     Args:
         img: Input image
+        algorithm: SLIC variant (SLIC, SLICO or MSLIC from numpy_slic or cv2.ximgproc)
         region_size: Average superpixel size
-        ruler: Smoothness factor (fixed at 20.0)
-        iterations: Number of iterations (fixed at 20)
+        ruler: Smoothness factor
     
     Returns:
-        tuple: (result image, number of superpixels)
-    """
-    try:
-        slic = cv2.ximgproc.createSuperpixelSLIC(img, 
-                                                algorithm=cv2.ximgproc.SLICO, 
-                                                region_size=region_size, 
-                                                ruler=ruler)
-        slic.iterate(iterations)
-        
-        labels = slic.getLabels()
-        n_segments = slic.getNumberOfSuperpixels()
-        
-        # mask_slic = slic.getLabelContourMask()
-        
-        superpixel_result = img.copy()
-        for i in range(n_segments):
-            mask = labels == i
-            superpixel_result[mask] = np.mean(img[mask], axis=0)
-        
-        # superpixel_result[mask_slic == 255] = [0, 255, 0]
+        cv2.ximgproc SuperpixelSLIC or numpy_slic.NumpySLIC object, not yet iterated
+    """
+    if slic_engine() == 'numpy':
+        return create_superpixel_slic(img, algorithm, region_size, ruler)
+    return cv2.ximgproc.createSuperpixelSLIC(img, algorithm=algorithm, region_size=region_size, ruler=ruler)
+
+def run_slic(img, region_size, ruler, iterations, algorithm, tolerance=None):
+    """
+    Construct SLIC on an image and iterate it
+    
+    Args:
+        img: Input image
+        region_size: Average superpixel size
+        ruler: Smoothness factor
+        iterations: Number of iterations, the maximum in adaptive mode
+        algorithm: SLIC variant (SLIC, SLICO or MSLIC)
+        tolerance: Enable adaptive mode, see segment_slic
+    
+    Returns:
+        tuple: (SuperpixelSLIC object from create_slic, iterations used, fraction of
+                pixels changed in the last chunk)
+    """
+    with span('slic.construct', region_size=region_size):
+        slic = create_slic(img, algorithm, region_size, ruler)
+    with span('slic.iterate', iterations=iterations) as iterate_span:
+        if tolerance is None:
+            slic.iterate(iterations)
+            used, changed = iterations, 0.0
+        else:
+            used, changed = iterate_until_stable(slic, iterations, tolerance)
+            iterate_span.set(used=used, changed=changed)
+    return slic, used, changed
+
+def segment_tiles(img, region_size, ruler, iterations, algorithm, tolerance=None, tile_size=1024):
+    """
+    Run SLIC tile by tile and stitch the labels into one map
+    
+    Each tile is segmented with TILE_MARGIN_REGIONS region sizes of context
+    on every side, so SLIC's buffers scale with the tile instead of the
+    image. Each superpixel is kept from the tile its centroid falls in, so
+    seams follow superpixel boundaries, and labels are numbered on across
+    tiles; see superpixel_tiles.stitch_tile.
+    
+    Args:
+        img: Input image
+        region_size: Average superpixel size
+        ruler: Smoothness factor
+        iterations: Number of iterations per tile, the maximum in adaptive mode
+        algorithm: SLIC variant
+        tolerance: Enable adaptive mode per tile, see segment_slic
+        tile_size: Largest side of a tile's core in pixels, see superpixel_tiles.tile_grid
+    
+    Returns:
+        tuple: (int32 label map, number of superpixels, most iterations used by
+                a tile, largest fraction changed in a tile's last chunk)
+    """
+    labels = np.full(img.shape[:2], -1, dtype=np.int32)
+    n_segments, used, changed = 0, 0, 0.0
+    tiles = tile_grid(img.shape[0], img.shape[1], tile_size, region_size)
+    for index, (_, padded) in enumerate(tiles):
+        with span('slic.tile', tile=index, tiles=len(tiles)):
+            tile = np.ascontiguousarray(img[padded[0]:padded[1], padded[2]:padded[3]])
+            slic, tile_used, tile_changed = run_slic(tile, region_size, ruler, iterations, algorithm, tolerance)
+            tile_labels = slic.getLabels()
+            del slic
+            with span('slic.stitch'):
+                n_segments = stitch_tile(labels, tile_labels, tiles, index, n_segments)
+            used, changed = max(used, tile_used), max(changed, tile_changed)
+    fill_unassigned(labels)
+    return labels, n_segments, used, changed
+
+def downscale_factor(region_size, max_factor=8, min_region=DOWNSCALE_MIN_REGION):
+    """
+    Pick the largest power-of-two downscale that keeps superpixels min_region wide
+    
+    Args:
+        region_size: Full resolution region size
+        max_factor: Largest factor to consider
+        min_region: Smallest region size allowed on the downscaled image
+    
+    Returns:
+        int: 1, 2, 4 or 8
+    """
+    factor = 1
+    while factor * 2 <= max_factor and region_size / (factor * 2) >= min_region:
+        factor *= 2
+    return factor
+
+def solve_region_sizes(img, segment_counts, ruler=20.0, algorithm=None, refinements=3,
+                       iterations=SOLVER_ITERATIONS):
+    """
+    Solve for the region size that gives about each target number of superpixels
+    
+    The seed grid makes estimate_segment_count exact for the number of
+    clusters, so its inverse is the first guess. Clusters can end up with no
+    pixels though, SLICO's on detailed images in particular, so each guess is
+    run on a thumbnail at a matching region size, and the fraction of seeds
+    that kept pixels there corrects the target before solving again. This
+    repeats until the region size stops changing. Only thumbnails are
+    segmented; full resolution SLIC is left to the settings that are kept.
+    
+    Args:
+        img: Input image
+        segment_counts: Wanted numbers of superpixels
+        ruler: Smoothness factor, passed through to SLIC
+        algorithm: SLIC variant, SLICO by default
+        refinements: Thumbnail runs per target at most
+        iterations: SLIC iterations of a thumbnail run
+    
+    Returns:
+        list: Per target, in the given order, a dict with 'target',
+              'region_size', 'ruler' and 'segments', the superpixel count
+              expected at full resolution
+    """
+    if algorithm is None:
+        algorithm = SLICO
+    height, width = img.shape[:2]
+    thumbnails = {}
+    solved = []
+    with span('slic.solve', targets=len(segment_counts)):
+        for target in segment_counts:
+            region_size = region_size_for_count(img.shape, target)
+            kept_fraction = 1.0
+            tried = set()
+            for _ in range(refinements):
+                if region_size in tried:
+                    break
+                tried.add(region_size)
+                factor = max(1, min(max(height, width) // SOLVER_THUMBNAIL_SIDE, region_size // SOLVER_MIN_REGION))
+                if factor not in thumbnails:
+                    thumbnails[factor] = cv2.resize(img, (max(1, width // factor), max(1, height // factor)),
+                                                    interpolation=cv2.INTER_AREA)
+                thumbnail = thumbnails[factor]
+                thumbnail_region_size = max(2, int(round(region_size / factor)))
+                slic, _, _ = run_slic(thumbnail, thumbnail_region_size, ruler, iterations, algorithm)
+                seeds = estimate_segment_count(thumbnail.shape, thumbnail_region_size)
+                kept_fraction = min(1.0, np.unique(slic.getLabels()).size / seeds)
+                region_size = region_size_for_count(img.shape, target / kept_fraction)
+            solved.append({'target': target,
+                           'region_size': region_size,
+                           'ruler': ruler,
+                           'segments': int(round(estimate_segment_count(img.shape, region_size) * kept_fraction))})
+    return solved
+
+def segment_slic(img, region_size, ruler=20.0, iterations=20, algorithm=None, with_contours=False,
+                 tolerance=None, return_info=False, downscale=1, tile_size=None, use_cache=True):
+    """
+    Run SLIC and return the raw label map
+    
+    Results are kept in the shared stage cache, keyed by image content and
+    parameters, so re-rendering the same segmentation is close to free.
+    One-shot runs that never read a result back pass use_cache=False.
+    
+    With downscale, SLIC runs on a copy shrunk by that factor at a matching
+    region size, and the labels are scaled back up and refined in a
+    REFINE_BAND pixel band along the boundaries at full resolution. Large
+    superpixels cover thousands of pixels, so the coarse levels lose little.
+    
+    With tile_size, SLIC runs on overlapping tiles that are stitched back
+    together, see segment_tiles, so very large images segment in bounded
+    memory. Memory then grows with the tile size apart from the image,
+    the label map and the rendered result.
+    
+    Args:
+        img: Input image
+        region_size: Average superpixel size
+        ruler: Smoothness factor
+        iterations: Number of iterations, the maximum in adaptive mode
+        algorithm: SLIC variant (SLIC, SLICO or MSLIC), SLICO by default
+        with_contours: Also return the superpixel boundary mask
+        tolerance: Enable adaptive mode: stop once fewer than this fraction of
+                   pixels changed label over ADAPTIVE_CHUNK iterations, e.g. 0.01
+        return_info: Also return a dict with the iterations used, the fraction
+                     of pixels changed in the last chunk, whether it converged
+                     and the downscale factor
+        downscale: Downscale factor, or 'auto' to pick it from the region size
+                   with downscale_factor; 1 segments at full resolution
+        tile_size: Segment in tiles with cores of about this many pixels a
+                   side, on the downscaled image's scale as well; None segments
+                   the whole image at once
+        use_cache: Read and write the stage cache
+    
+    Returns:
+        tuple: (label map, number of superpixels), plus the contour mask when
+               with_contours is set and the info dict when return_info is set
+    """
+    if algorithm is None:
+        algorithm = SLICO
+    factor = downscale_factor(region_size) if downscale == 'auto' else int(downscale)
+    engine = slic_engine()
+    
+    def compute():
+        work_img, work_region_size = img, region_size
+        if factor > 1:
+            height, width = img.shape[:2]
+            work_img = cv2.resize(img, (max(1, width // factor), max(1, height // factor)),
+                                  interpolation=cv2.INTER_AREA)
+            work_region_size = max(2, int(round(region_size / factor)))
         
-        return superpixel_result, n_segments
+        if tile_size is not None:
+            labels, n_segments, used, changed = segment_tiles(work_img, work_region_size, ruler,
+                                                              iterations, algorithm, tolerance,
+                                                              max(1, tile_size // factor))
+            arrays = {'labels': labels,
+                      'n_segments': np.array(n_segments),
+                      'iterations': np.array(used),
+                      'changed': np.array(changed)}
+            if with_contours and factor == 1:
+                arrays['contours'] = np.where(label_boundaries(labels), 255, 0).astype(np.uint8)
+        else:
+            slic, used, changed = run_slic(work_img, work_region_size, ruler, iterations,
+                                           algorithm, tolerance)
+            with span('slic.labels'):
+                arrays = {'labels': slic.getLabels(),
+                          'n_segments': np.array(slic.getNumberOfSuperpixels()),
+                          'iterations': np.array(used),
+                          'changed': np.array(changed)}
+                if with_contours and factor == 1:
+                    arrays['contours'] = slic.getLabelContourMask()
         
-    except AttributeError:
-        print("SLIC not available in your OpenCV installation")
-        return None, 0
+        if factor > 1:
+            with span('slic.refine', band=REFINE_BAND):
+                labels = upsample_labels(arrays['labels'], (img.shape[1], img.shape[0]))
+                arrays['labels'] = refine_boundaries(img, labels, region_size, ruler, band=REFINE_BAND)
+                if with_contours:
+                    arrays['contours'] = np.where(label_boundaries(labels), 255, 0).astype(np.uint8)
+        return arrays
+    
+    cache = get_cache() if use_cache else None
+    params = {'algorithm': int(algorithm), 'region_size': region_size, 'ruler': float(ruler),
+              'iterations': iterations, 'contours': with_contours}
+    if tolerance is not None:
+        params.update(tolerance=float(tolerance), chunk=ADAPTIVE_CHUNK)
+    if factor > 1:
+        params.update(downscale=factor, band=REFINE_BAND)
+    if tile_size is not None:
+        params.update(tile_size=int(tile_size), margin=TILE_MARGIN_REGIONS)
+    if engine != 'opencv':
+        params.update(engine=engine)
+    arrays = cache.cached(img, 'slic', params, compute) if cache else compute()
+    
+    result = (arrays['labels'], int(arrays['n_segments']))
+    if with_contours:
+        result += (arrays['contours'],)
+    if return_info:
+        # Entries cached before adaptive mode existed ran the full count
+        used = int(arrays['iterations']) if 'iterations' in arrays else iterations
+        changed = float(arrays['changed']) if 'changed' in arrays else 0.0
+        result += ({'iterations': used, 'changed': changed,
+                    'converged': tolerance is None or changed < tolerance, 'downscale': factor},)
+    return result
+
+def apply_slic(img, region_size, ruler=20.0, iterations=20, tolerance=None, return_info=False, downscale=1,
+               tile_size=None):
+    """
+    Apply SLIC with specific parameters
+    
+    Args:
+        img: Input image
+        region_size: Average superpixel size
+        ruler: Smoothness factor (fixed at 20.0)
+        iterations: Number of iterations (fixed at 20), the maximum in adaptive mode
+        tolerance: Enable adaptive iteration, see segment_slic
+        return_info: Also return the iteration info dict, see segment_slic
+        downscale: Segment a downscaled copy, a factor or 'auto', see segment_slic
+        tile_size: Segment in tiles of about this size to bound memory, see segment_slic
+    
+    Returns:
+        tuple: (result image, number of superpixels), plus the info dict when
+               return_info is set
+    """
+    labels, n_segments, info = segment_slic(img, region_size, ruler, iterations, tolerance=tolerance,
+                                            return_info=True, downscale=downscale, tile_size=tile_size)
+    
+    with span('slic.render', segments=n_segments):
+        superpixel_result = render_mean_colors(img, labels)
+    
+    if return_info:
+        return superpixel_result, n_segments, info
+    return superpixel_result, n_segments
+
+def apply_slic_hierarchy(img, region_sizes, ruler=20.0, iterations=20, tolerance=None, use_cache=True):
+    """
+    Produce every region size from a single SLIC run
+    
+    SLICO runs once at the finest region size; each coarser level is built by
+    merging adjacent superpixels down to the segment count SLIC would give
+    for that region size.
+    
+    Args:
+        img: Input image
+        region_sizes: Region sizes to produce
+        ruler: Smoothness factor
+        iterations: Number of iterations for the single SLIC run, the maximum in adaptive mode
+        tolerance: Enable adaptive iteration, see segment_slic
+        use_cache: Keep the SLIC labels in the stage cache, see segment_slic
+    
+    Returns:
+        list: (region size, result image, number of superpixels) per region size
+    """
+    region_sizes = sorted(region_sizes)
+    labels, n_segments = segment_slic(img, region_sizes[0], ruler, iterations, tolerance=tolerance,
+                                      use_cache=use_cache)
+    
+    targets = {region_size: estimate_segment_count(img.shape, region_size)
+               for region_size in region_sizes[1:]}
+    with span('slic.merge', levels=len(targets)):
+        ladder = merge_ladder(img, labels, n_segments, list(targets.values()))
+    
+    with span('slic.render', segments=n_segments):
+        levels = [(region_sizes[0], render_mean_colors(img, labels), n_segments)]
+    for region_size in region_sizes[1:]:
+        merged_labels = ladder[targets[region_size]][labels]
+        n_merged = int(merged_labels.max()) + 1
+        with span('slic.render', segments=n_merged):
+            levels.append((region_size, render_mean_colors(img, merged_labels), n_merged))
+    
+    return levels
 
 
-def run_focused_experiment(image_path, output_dir):
+def run_focused_experiment(image_path, output_dir, hierarchical=False, tolerance=None, downscale=1,
+                           tile_size=None, segment_counts=None):
     """
     Run focused SLIC experiment with region size variations only
     
     Args:
         image_path: Path to input image
         output_dir: Directory to save results
+        hierarchical: Segment once at the finest region size and build the
+                      coarser levels by merging regions instead of rerunning SLIC;
+                      runs at full resolution, untiled, so it cannot be
+                      combined with downscale or tile_size
+        tolerance: Stop iterating once the labels settle, see segment_slic;
+                   iterations is then the maximum
+        downscale: Segment each region size on a downscaled copy, a factor or
+                   'auto' to shrink only as far as the region size allows
+        tile_size: Segment very large images in tiles of about this size; each
+                   result is then written as soon as it is ready and the grid
+                   is built from copies TILED_GRID_CELL_WIDTH pixels wide
+        segment_counts: Target numbers of superpixels; the region sizes are
+                        solved for them on thumbnails, see solve_region_sizes,
+                        instead of running the fixed list of region sizes
     """
+    if hierarchical and (downscale != 1 or tile_size is not None):
+        raise ValueError("hierarchical mode segments the full-resolution image in one piece, "
+                         "it cannot be combined with downscale or tile_size")
+    
     base_filename = os.path.splitext(os.path.basename(image_path))[0]
     experiment_dir = os.path.join(output_dir, f"{base_filename}")
     os.makedirs(experiment_dir, exist_ok=True)
@@ -78,8 +470,11 @@ def run_focused_experiment(image_path, output_dir):
     print(f"Loading image from {image_path}...")
     img = load_image(image_path)
     
+    # Images are encoded and written in the background while SLIC runs
+    writer = AsyncImageWriter()
+    
     # Save original image
-    cv2.imwrite(os.path.join(experiment_dir, "original.jpg"), img)
+    writer.write(os.path.join(experiment_dir, "original.jpg"), img)
     
     # Fixed parameters
     ruler = 20.0
@@ -88,6 +483,12 @@ def run_focused_experiment(image_path, output_dir):
     
     # Region sizes to test
     region_sizes = [20,30,40,50,60,70,80,90,100,110,120,130,140,150]
+    if segment_counts is not None:
+        solved = solve_region_sizes(img, segment_counts, ruler)
+        for level in solved:
+            print(f"Target {level['target']} superpixels: region size {level['region_size']}, "
+                  f"about {level['segments']} expected")
+        region_sizes = sorted({level['region_size'] for level in solved})
     
     results = []
     
@@ -95,38 +496,57 @@ def run_focused_experiment(image_path, output_dir):
     print(f"Algorithm: {algorithm}, Ruler: {ruler}, Iterations: {iterations}")
     print(f"Testing region sizes: {region_sizes}")
     
-    for region_size in region_sizes:
-        print(f"Testing region size: {region_size}")
+    def keep(region_size, result, n_segments):
+        filename = f"{region_size}_segments{n_segments}.jpg"
+        writer.write(os.path.join(experiment_dir, filename), result)
         
-        # Apply SLIC
-        result, n_segments = apply_slic(img, region_size, ruler, iterations)
-        
-        if result is not None:
-           
-            
-            filename = f"{region_size}_segments{n_segments}.jpg"
-            cv2.imwrite(os.path.join(experiment_dir, filename), result)
+        if tile_size is not None and result.shape[1] > TILED_GRID_CELL_WIDTH:
+            scale = TILED_GRID_CELL_WIDTH / result.shape[1]
+            result = cv2.resize(result, (TILED_GRID_CELL_WIDTH, max(1, round(result.shape[0] * scale))),
+                                interpolation=cv2.INTER_AREA)
+        results.append({
+            'image': result,
+            'region_size': region_size,
+            'segments': n_segments
+        })
+    
+    if hierarchical:
+        print(f"Hierarchical mode: one SLIC run at region size {min(region_sizes)}, merging for the rest")
+        for level in apply_slic_hierarchy(img, region_sizes, ruler, iterations, tolerance):
+            keep(*level)
+    else:
+        if tile_size is not None:
+            print(f"Tiled mode: tiles of about {tile_size} pixels")
+        for region_size in region_sizes:
+            print(f"Testing region size: {region_size}")
             
-            results.append({
-                'image': result,
-                'region_size': region_size,
-                'segments': n_segments
-            })
+            # Apply SLIC
+            result, n_segments, info = apply_slic(img, region_size, ruler, iterations, tolerance,
+                                                  return_info=True, downscale=downscale, tile_size=tile_size)
+            if tolerance is not None:
+                print(f"  {info['iterations']} iterations, {info['changed']:.2%} of pixels changed last")
+            if info['downscale'] > 1:
+                print(f"  segmented at 1/{info['downscale']} scale")
+            keep(region_size, result, n_segments)
     
     # comparison grid
-    create_comparison_grid(results, experiment_dir)
+    create_comparison_grid(results, experiment_dir, writer)
+    writer.close()
+    writer.report()
     
     print(f"\nExperiment complete! Results saved to: {experiment_dir}")
     
     pass
 
-def create_comparison_grid(results, output_dir):
+@traced('grid.region_size')
+def create_comparison_grid(results, output_dir, writer=None):
     """
     Create a single comparison grid for region sizes
     
     Args:
         results: List of experiment results
         output_dir: Directory to save grid
+        writer: Optional AsyncImageWriter to queue the grid on
     """
     if not results:
         return
@@ -154,7 +574,8 @@ def create_comparison_grid(results, output_dir):
         grid[y_start:y_end, x_start:x_end] = result['image']
     
     filename = "region_size_comparison.jpg"
-    cv2.imwrite(os.path.join(output_dir, filename), grid)
+    with ensure_writer(writer) as grid_writer:
+        grid_writer.write(os.path.join(output_dir, filename), grid)
     pass
 
 
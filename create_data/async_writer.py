@@ -0,0 +1,222 @@
+import os
+import io
+import time
+import queue
+import threading
+import contextlib
+import cv2
+from tracing import span
+
+# Tells a writer thread to exit
+_STOP = object()
+
+
+class AsyncImageWriter:
+    """
+    Encode and write images on a small thread pool behind a bounded queue
+
+    write() returns as soon as the image is queued, so the caller can go on
+    computing while earlier images are encoded (cv2.imencode releases the
+    GIL) and written. When max_pending images are waiting, write() blocks
+    until a thread catches up, which bounds memory. Files are written to a
+    temporary name and renamed, so a reader never sees a partial file.
+
+    Every file gets a record with its encode time, write time, byte count and
+    error, if any. flush() waits for everything queued so far, close() also
+    stops the threads. Used as a context manager, the writer is closed on exit.
+    """
+
+    def __init__(self, workers=2, max_pending=8):
+        """
+        Args:
+            workers (int): Encode/write threads
+            max_pending (int): Queued images before write() blocks
+        """
+        self.records = []
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._lock = threading.Lock()
+        self._closed = False
+        self._threads = [threading.Thread(target=self._run, name=f"image-writer-{n}", daemon=True)
+                         for n in range(workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def write(self, path, image, params=None, callback=None):
+        """
+        Queue an image to be encoded in the format of its extension and written
+
+        The writer keeps a reference to image, so it must not be modified
+        afterwards.
+
+        Args:
+            path (str): Output path, missing directories are created
+            image (numpy.ndarray): BGR or grayscale image
+            params (list): Optional cv2.imencode parameters
+            callback (callable): Called with the file's record once it is
+                                 written or failed, on a writer thread
+        """
+        self._submit({'path': path, 'image': image, 'params': params or [], 'callback': callback})
+
+    def write_bytes(self, path, data, encode_time=0.0, callback=None):
+        """
+        Queue already encoded data, e.g. a figure saved to memory
+
+        Args:
+            path (str): Output path, missing directories are created
+            data (bytes): File content
+            encode_time (float): Seconds the caller spent encoding, for the report
+            callback (callable): See write()
+        """
+        self._submit({'path': path, 'data': data, 'encode_time': encode_time, 'callback': callback})
+
+    def _submit(self, task):
+        if self._closed:
+            raise ValueError("Writer is closed")
+        self._queue.put(task)
+
+    def _run(self):
+        while True:
+            task = self._queue.get()
+            if task is _STOP:
+                self._queue.task_done()
+                return
+
+            path = task['path']
+            record = {'path': path, 'encode_time': task.get('encode_time', 0.0),
+                      'write_time': 0.0, 'bytes': 0, 'error': None}
+            try:
+                data = task.get('data')
+                if data is None:
+                    start = time.perf_counter()
+                    with span('write.encode', path=path):
+                        ok, data = cv2.imencode(os.path.splitext(path)[1], task['image'], task['params'])
+                    if not ok:
+                        raise ValueError(f"Could not encode image {path}")
+                    record['encode_time'] = time.perf_counter() - start
+
+                start = time.perf_counter()
+                with span('write.file', path=path):
+                    directory = os.path.dirname(path)
+                    if directory:
+                        os.makedirs(directory, exist_ok=True)
+                    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+                    with open(tmp_path, 'wb') as f:
+                        f.write(data)
+                    os.replace(tmp_path, path)
+                record['write_time'] = time.perf_counter() - start
+                record['bytes'] = memoryview(data).nbytes
+            except Exception as e:
+                record['error'] = str(e)
+                print(f"Error writing {path}: {e}")
+            finally:
+                with self._lock:
+                    self.records.append(record)
+                if task.get('callback') is not None:
+                    try:
+                        task['callback'](record)
+                    except Exception as e:
+                        print(f"Error in write callback for {path}: {e}")
+                self._queue.task_done()
+
+    def flush(self):
+        """
+        Wait until every queued image is written
+
+        Returns:
+            list: Paths that failed to encode or write so far
+        """
+        self._queue.join()
+        return self.failed()
+
+    def close(self):
+        """
+        Flush and stop the threads; later writes raise ValueError
+
+        Returns:
+            dict: See summary()
+        """
+        if not self._closed:
+            self.flush()
+            self._closed = True
+            for _ in self._threads:
+                self._queue.put(_STOP)
+            for thread in self._threads:
+                thread.join()
+        return self.summary()
+
+    def failed(self):
+        """
+        Returns:
+            list: Paths that failed to encode or write
+        """
+        with self._lock:
+            return [record['path'] for record in self.records if record['error'] is not None]
+
+    def summary(self):
+        """
+        Totals over the files handled so far
+
+        Returns:
+            dict: files, failed, bytes, encode_time and write_time
+        """
+        with self._lock:
+            written = [record for record in self.records if record['error'] is None]
+            return {
+                'files': len(written),
+                'failed': len(self.records) - len(written),
+                'bytes': sum(record['bytes'] for record in written),
+                'encode_time': sum(record['encode_time'] for record in written),
+                'write_time': sum(record['write_time'] for record in written),
+            }
+
+    def report(self):
+        """
+        Print the summary
+        """
+        summary = self.summary()
+        print(f"Wrote {summary['files']} files ({summary['bytes'] / 1e6:.1f} MB), "
+              f"encode {summary['encode_time']:.2f}s, write {summary['write_time']:.2f}s, "
+              f"failed {summary['failed']}")
+
+
+@contextlib.contextmanager
+def ensure_writer(writer=None):
+    """
+    Use the given writer, or a fresh one that is closed on exit
+
+    Args:
+        writer (AsyncImageWriter): Writer shared by the caller, or None
+
+    Yields:
+        AsyncImageWriter: The writer to use
+    """
+    if writer is not None:
+        yield writer
+        return
+    with AsyncImageWriter() as own_writer:
+        yield own_writer
+
+
+def save_figure(writer, path, figure, **savefig_kwargs):
+    """
+    Render a matplotlib figure to memory on the calling thread and queue the bytes
+
+    matplotlib is not thread safe, so only the file write is handed off.
+
+    Args:
+        writer (AsyncImageWriter): Writer to queue the file on
+        path (str): Output path, the extension picks the format
+        figure (matplotlib.figure.Figure): Figure to save
+        **savefig_kwargs: Passed to Figure.savefig, e.g. dpi
+    """
+    start = time.perf_counter()
+    buffer = io.BytesIO()
+    with span('write.render_figure', path=path):
+        figure.savefig(buffer, format=os.path.splitext(path)[1][1:], **savefig_kwargs)
+    writer.write_bytes(path, buffer.getvalue(), encode_time=time.perf_counter() - start)
@@ -0,0 +1,257 @@
+import os
+import time
+import queue
+import argparse
+import threading
+from image_io import IMAGE_EXTENSIONS, load_image
+from async_writer import AsyncImageWriter
+from memory import MemoryBudget, parse_size, peak_rss
+import tracing
+from tracing import span
+from SLIC import DEFAULT_TOLERANCE, apply_slic_hierarchy
+
+# Region size of each difficulty image: 1.jpg is the coarsest, 7.jpg the most detailed
+DIFFICULTY_REGION_SIZES = [150, 120, 100, 80, 60, 40, 20]
+
+# Marks the end of a stage's input
+_DONE = object()
+
+
+def find_originals(original_dir):
+    """
+    List the original images and the question set each one belongs to
+
+    Originals are named "{name of the animate}_n", e.g. "Chainsaw Man_2.jpg"
+    becomes set "Chainsaw Man_2" of anime "Chainsaw Man". A full resolution
+    dataset tree works too, every <anime>/<set>/original.jpg is one original.
+
+    Args:
+        original_dir (str): Directory with the original images, or a dataset root
+
+    Returns:
+        list: (image path, anime name, set name) tuples
+    """
+    originals = []
+    for filename in sorted(os.listdir(original_dir)):
+        path = os.path.join(original_dir, filename)
+        if os.path.isdir(path):
+            for set_name in sorted(os.listdir(path)):
+                set_original = os.path.join(path, set_name, "original.jpg")
+                if os.path.isfile(set_original):
+                    originals.append((set_original, filename, set_name))
+            continue
+        if not filename.lower().endswith(IMAGE_EXTENSIONS):
+            continue
+        set_name = os.path.splitext(filename)[0]
+        anime = set_name.rsplit('_', 1)[0] if '_' in set_name else set_name
+        originals.append((path, anime, set_name))
+    return originals
+
+
+def _stage_worker(name, func, in_queue, out_queue, stats, budget):
+    """
+    Pull items from in_queue, apply func and push the result to out_queue
+
+    Items are tuples starting with (anime, set name). Failures are reported
+    and the item is dropped and released from the memory budget, so one
+    broken image does not stop the pipeline.
+    """
+    while True:
+        item = in_queue.get()
+        if item is _DONE:
+            # Let sibling workers of this stage see the end marker too
+            in_queue.put(_DONE)
+            return
+
+        start = time.perf_counter()
+        try:
+            with span(f"stage.{name}", set=item[1]):
+                result = func(item)
+        except Exception as e:
+            print(f"Error in {name} stage for {item[1]}: {e}")
+            with stats['lock']:
+                stats['failed'] += 1
+            budget.release()
+            continue
+        finally:
+            with stats['lock']:
+                stats['stage_times'][name] += time.perf_counter() - start
+
+        if out_queue is not None and result is not None:
+            out_queue.put(result)
+
+
+def generate_dataset(original_dir, output_dir, region_sizes=DIFFICULTY_REGION_SIZES,
+                     image_size=(1024, 1024), ruler=20.0, iterations=20, tolerance=None,
+                     segment_workers=1, queue_size=4, overwrite=False, memory_budget=None):
+    """
+    Stream original images into the <anime>/<anime>_n/{1..7,original}.jpg layout
+
+    Decode+resize and segment+render run as separate threads connected by
+    bounded queues, and an AsyncImageWriter encodes and writes the outputs on
+    its own threads, so the stages overlap and at most a few images are in
+    flight. Nothing is written besides the final files. With a memory budget,
+    no new original is decoded while the process RSS is over it, until a set
+    in flight is fully written.
+
+    Args:
+        original_dir (str): Directory with the original images
+        output_dir (str): Dataset root, e.g. dataset_resized
+        region_sizes (list): Region size of each difficulty image, 1.jpg first
+        image_size (tuple): (width, height) of the output images
+        ruler (float): SLIC smoothness factor
+        iterations (int): SLIC iterations of the single hierarchical run, the
+                          maximum when tolerance is set
+        tolerance (float): Stop SLIC early once fewer than this fraction of
+                           pixels change label, see SLIC.segment_slic
+        segment_workers (int): Threads for the segmentation stage
+        queue_size (int): Capacity of each queue between stages, in images
+        overwrite (bool): Regenerate sets that already exist
+        memory_budget (int or str): RSS limit in bytes or e.g. '2G', None for no limit
+
+    Returns:
+        dict: Number of sets and images written, elapsed time, busy time per
+              stage, the latency of every set from decode start until its
+              last file is on disk and the peak RSS in bytes
+    """
+    def decode(item):
+        anime, set_name, path = item
+        started = time.perf_counter()
+        return anime, set_name, load_image(path, target_size=image_size), started
+
+    def segment(item):
+        anime, set_name, img, started = item
+        # A one-shot build never reads the labels back, keep them out of the stage cache
+        levels = apply_slic_hierarchy(img, region_sizes, ruler, iterations, tolerance, use_cache=False)
+        by_region_size = {region_size: result for region_size, result, _ in levels}
+        outputs = [(f"{idx}.jpg", by_region_size[region_size])
+                   for idx, region_size in enumerate(region_sizes, start=1)]
+        outputs.append(("original.jpg", img))
+        return anime, set_name, outputs, started
+
+    def write(item):
+        # Blocks while the writer is full, which holds back the earlier stages
+        anime, set_name, outputs, started = item
+        set_dir = os.path.join(output_dir, anime, set_name)
+        remaining = [len(outputs)]
+
+        def written(record):
+            with stats['lock']:
+                remaining[0] -= 1
+                if remaining[0] == 0:
+                    stats['latencies'].append(time.perf_counter() - started)
+                    budget.release()
+
+        for filename, image in outputs:
+            writer.write(os.path.join(set_dir, filename), image, callback=written)
+        with stats['lock']:
+            stats['sets'] += 1
+        print(f"Queued: {set_dir}")
+
+    stages = [
+        ('decode', decode, 1),
+        ('segment', segment, segment_workers),
+        ('write', write, 1),
+    ]
+    stats = {
+        'lock': threading.Lock(),
+        'sets': 0,
+        'failed': 0,
+        'latencies': [],
+        'stage_times': {name: 0.0 for name, _, _ in stages},
+    }
+
+    budget = MemoryBudget(memory_budget)
+    writer = AsyncImageWriter(max_pending=queue_size * (len(region_sizes) + 1))
+    queues = [queue.Queue(maxsize=queue_size) for _ in stages]
+    threads = []
+    for idx, (name, func, n_workers) in enumerate(stages):
+        out_queue = queues[idx + 1] if idx + 1 < len(stages) else None
+        threads.append([threading.Thread(target=_stage_worker, name=f"{name}-{n}",
+                                         args=(name, func, queues[idx], out_queue, stats, budget),
+                                         daemon=True)
+                        for n in range(n_workers)])
+
+    start = time.perf_counter()
+    for stage_threads in threads:
+        for thread in stage_threads:
+            thread.start()
+
+    skipped = 0
+    for path, anime, set_name in find_originals(original_dir):
+        if not overwrite and os.path.exists(os.path.join(output_dir, anime, set_name, "original.jpg")):
+            skipped += 1
+            continue
+        budget.acquire()
+        queues[0].put((anime, set_name, path))
+    queues[0].put(_DONE)
+
+    # Drain the stages in order, passing the end marker down the pipeline
+    for idx, stage_threads in enumerate(threads):
+        for thread in stage_threads:
+            thread.join()
+        if idx + 1 < len(queues):
+            queues[idx + 1].put(_DONE)
+
+    write_summary = writer.close()
+
+    # A set with any file that did not make it to disk counts as failed
+    failed_sets = {os.path.dirname(path) for path in writer.failed()}
+
+    elapsed = time.perf_counter() - start
+    stage_times = dict(stats['stage_times'])
+    stage_times['encode'] = write_summary['encode_time']
+    stage_times['write'] = write_summary['write_time']
+    summary = {
+        'sets': stats['sets'] - len(failed_sets),
+        'images': write_summary['files'],
+        'bytes': write_summary['bytes'],
+        'skipped': skipped,
+        'failed': stats['failed'] + len(failed_sets),
+        'elapsed': elapsed,
+        'stage_times': stage_times,
+        'latencies': stats['latencies'],
+        'peak_rss': peak_rss(),
+    }
+
+    print(f"Generated {summary['sets']} sets ({summary['images']} images) in {elapsed:.2f}s, "
+          f"skipped {skipped}, failed {summary['failed']}")
+    print("Busy time per stage: " + ", ".join(
+        f"{name}={seconds:.2f}s" for name, seconds in summary['stage_times'].items()))
+    budget.report()
+
+    return summary
+
+
+def main():
+    """
+    Generate question sets straight from the original images
+    """
+    parser = argparse.ArgumentParser(description="Generate <anime>/<anime>_n/{1..7,original}.jpg "
+                                                 "question sets from original images")
+    parser.add_argument('--original-dir', default='original', help="Directory with the original images")
+    parser.add_argument('--output-dir', default='dataset_resized', help="Dataset root to write to")
+    parser.add_argument('--region-sizes', type=int, nargs=7, default=DIFFICULTY_REGION_SIZES,
+                        help="Region size of 1.jpg ... 7.jpg")
+    parser.add_argument('--segment-workers', type=int, default=1, help="Threads for the segmentation stage")
+    parser.add_argument('--overwrite', action='store_true', help="Regenerate sets that already exist")
+    parser.add_argument('--slic-tolerance', type=float, nargs='?', const=DEFAULT_TOLERANCE,
+                        help="Stop SLIC early once fewer than this fraction of pixels change label "
+                             f"(default {DEFAULT_TOLERANCE} when given without a value)")
+    parser.add_argument('--memory-budget', type=parse_size, metavar='SIZE',
+                        help="Decode no new original while the RSS is over SIZE, e.g. 2G")
+    parser.add_argument('--trace', metavar='PATH', help="Write a Chrome trace of the run to PATH")
+    parser.add_argument('--trace-memory', action='store_true',
+                        help="With --trace, also record tracemalloc and RSS high-water marks per span")
+    args = parser.parse_args()
+
+    if args.trace:
+        tracing.enable(args.trace, memory=args.trace_memory)
+
+    generate_dataset(args.original_dir, args.output_dir, region_sizes=args.region_sizes,
+                     tolerance=args.slic_tolerance, segment_workers=args.segment_workers,
+                     overwrite=args.overwrite, memory_budget=args.memory_budget)
+
+
+if __name__ == "__main__":
+    main()
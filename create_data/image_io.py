@@ -0,0 +1,164 @@
+import os
+import struct
+import cv2
+import numpy as np
+from typing import List, Optional, Tuple
+from tracing import traced
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.tiff', '.tif')
+
+# JPEG start-of-frame markers (baseline, progressive, lossless, arithmetic)
+_JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+# Reduced decode flags by downscale factor; libjpeg scales in the DCT domain
+_REDUCED_COLOR_FLAGS = {
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+_REDUCED_GRAYSCALE_FLAGS = {
+    2: cv2.IMREAD_REDUCED_GRAYSCALE_2,
+    4: cv2.IMREAD_REDUCED_GRAYSCALE_4,
+    8: cv2.IMREAD_REDUCED_GRAYSCALE_8,
+}
+
+
+def read_jpeg_size(image_path: str) -> Optional[Tuple[int, int]]:
+    """Read the (width, height) of a JPEG from its frame header without decoding.
+    Params:
+        image_path: Path to the image file
+    Returns:
+        size: (width, height), or None if the file is not a JPEG
+    """
+    with open(image_path, 'rb') as f:
+        if f.read(2) != b'\xff\xd8':
+            return None
+        while True:
+            byte = f.read(1)
+            if not byte:
+                return None
+            if byte != b'\xff':
+                continue
+            marker = f.read(1)
+            # Skip fill bytes and markers without a payload
+            while marker == b'\xff':
+                marker = f.read(1)
+            if not marker:
+                return None
+            marker = marker[0]
+            if marker in (0x01, 0xD8) or 0xD0 <= marker <= 0xD7:
+                continue
+            if marker == 0xD9:
+                return None
+            length_bytes = f.read(2)
+            if len(length_bytes) < 2:
+                return None
+            length = struct.unpack('>H', length_bytes)[0]
+            if marker in _JPEG_SOF_MARKERS:
+                header = f.read(5)
+                if len(header) < 5:
+                    return None
+                height, width = struct.unpack('>HH', header[1:5])
+                return width, height
+            f.seek(length - 2, os.SEEK_CUR)
+
+
+def reduced_decode_factor(image_size: Tuple[int, int], target_size: Tuple[int, int]) -> int:
+    """Pick the largest power-of-two decode downscale that still covers the target.
+    Params:
+        image_size: (width, height) of the encoded image
+        target_size: (width, height) the image will be resized to
+    Returns:
+        factor: 1, 2, 4 or 8
+    """
+    # resize_with_pad scales the longest side, so only that side has to be covered
+    longest_side = max(image_size)
+    target_side = max(target_size)
+    for factor in (8, 4, 2):
+        if longest_side // factor >= target_side:
+            return factor
+    return 1
+
+
+@traced('io.resize_with_pad')
+def resize_with_pad(image: np.array,
+                    new_shape: Tuple[int, int],
+                    padding_color: Tuple[int] = (255, 255, 255)) -> np.array:
+    """Maintains aspect ratio and resizes with padding.
+    Params:
+        image: Image to be resized.
+        new_shape: Expected (width, height) of new image.
+        padding_color: Tuple in BGR of padding color
+    Returns:
+        image: Resized image with padding
+    """
+    original_shape = (image.shape[1], image.shape[0])
+    ratio = float(max(new_shape))/max(original_shape)
+    new_size = tuple([int(x*ratio) for x in original_shape])
+    # Area averaging keeps shrunk line art free of aliasing
+    interpolation = cv2.INTER_AREA if ratio < 1 else cv2.INTER_LINEAR
+    image = cv2.resize(image, new_size, interpolation=interpolation)
+    delta_w = new_shape[0] - new_size[0]
+    delta_h = new_shape[1] - new_size[1]
+    top, bottom = delta_h//2, delta_h-(delta_h//2)
+    left, right = delta_w//2, delta_w-(delta_w//2)
+    image = cv2.copyMakeBorder(image, top, bottom, left, right, cv2.BORDER_CONSTANT, value=padding_color)
+    return image
+
+
+@traced('io.load_image')
+def load_image(image_path: str,
+               target_size: Optional[Tuple[int, int]] = None,
+               grayscale: bool = False) -> np.array:
+    """Load an image, decoding JPEGs at reduced resolution when a target size is known.
+    Params:
+        image_path: Path to the image file
+        target_size: (width, height) the image is destined for. When given, a JPEG is
+            decoded at the largest 1/2, 1/4 or 1/8 scale that is still at least that
+            big and the result is resized with padding to exactly target_size.
+        grayscale: Decode as single-channel grayscale instead of BGR
+    Returns:
+        image: The loaded image
+    """
+    if not os.path.exists(image_path):
+        raise FileNotFoundError(f"Image file not found: {image_path}")
+
+    flags = cv2.IMREAD_GRAYSCALE if grayscale else cv2.IMREAD_COLOR
+    if target_size is not None:
+        image_size = read_jpeg_size(image_path)
+        factor = reduced_decode_factor(image_size, target_size) if image_size else 1
+        if factor > 1:
+            flags = (_REDUCED_GRAYSCALE_FLAGS if grayscale else _REDUCED_COLOR_FLAGS)[factor]
+
+    image = cv2.imread(image_path, flags)
+    if image is None:
+        raise ValueError(f"Failed to load image: {image_path}")
+
+    if target_size is not None:
+        padding_color = 255 if grayscale else (255, 255, 255)
+        image = resize_with_pad(image, target_size, padding_color)
+
+    return image
+
+
+def find_image_files(root_dir: str, names: Optional[Tuple[str, ...]] = None) -> List[str]:
+    """Recursively list the images below a directory, e.g. the whole dataset_resized tree.
+    Params:
+        root_dir: Directory to walk
+        names: Only keep files with one of these names, e.g. ('original.jpg',)
+    Returns:
+        paths: Sorted image paths
+    """
+    if not os.path.isdir(root_dir):
+        raise FileNotFoundError(f"Directory not found: {root_dir}")
+
+    paths = []
+    for dirpath, dirnames, filenames in os.walk(root_dir):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            if not filename.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            if names is not None and filename not in names:
+                continue
+            paths.append(os.path.join(dirpath, filename))
+    return paths
@@ -0,0 +1,323 @@
+import os
+import json
+import argparse
+import hashlib
+import threading
+import contextlib
+import numpy as np
+import cv2
+from image_io import load_image, find_image_files
+from stage_cache import DEFAULT_CACHE_DIR
+from tracing import span
+
+try:
+    import fcntl
+except ImportError:
+    # No cross-process locking on Windows; run one writer at a time there
+    fcntl = None
+
+# Only sweeps that read the same image many times use the store by default, see
+# load_decoded. Set COLORWEB_IMAGE_STORE=on to use it for every loader, off (or
+# 0, false, no) to disable it, or a directory to move it; it is also off while
+# COLORWEB_CACHE is off
+DEFAULT_STORE_DIR = os.path.join(DEFAULT_CACHE_DIR, 'images')
+DEFAULT_MAX_BYTES = int(os.environ.get('COLORWEB_IMAGE_STORE_MAX_BYTES', 4 * 1024 ** 3))
+
+PACK_FILENAME = 'images.pack'
+INDEX_FILENAME = 'index.json'
+LOCK_FILENAME = 'index.lock'
+INDEX_VERSION = 1
+
+# Arrays start on page boundaries in the pack
+ALIGNMENT = 4096
+
+# Stored variants and the conversion from the decoded BGR image
+VARIANTS = {
+    'bgr': None,
+    'rgb': cv2.COLOR_BGR2RGB,
+    'gray': cv2.COLOR_BGR2GRAY,
+    'lab': cv2.COLOR_BGR2Lab,
+}
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+def hash_file(path):
+    """Compute the SHA-256 hash of a file's content."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ImageStore:
+    """
+    Decoded images in one memory-mapped pack file, for loading without a JPEG decode
+
+    Every array is appended raw to the pack and an index records its offset,
+    shape and dtype under (content hash of the source file, variant, target
+    size). Sources are looked up by path and revalidated by size and mtime,
+    falling back to the content hash, so an edited file is decoded again and
+    copies of the same file share one entry. Hits are copy-on-write mappings
+    of the pack: writable like a freshly decoded image, and pages are only
+    copied, privately to that array, where the caller writes to it.
+
+    The pack only grows. Once it reaches max_bytes new images are still
+    returned but no longer stored; clear() starts over. Several processes may
+    share a store, appends are serialized with a lock file.
+    """
+
+    def __init__(self, store_dir=DEFAULT_STORE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        """
+        Args:
+            store_dir (str): Directory of the pack and index files
+            max_bytes (int): Pack size after which nothing new is stored
+        """
+        self.store_dir = store_dir
+        self.max_bytes = max_bytes
+        self.pack_path = os.path.join(store_dir, PACK_FILENAME)
+        self.index_path = os.path.join(store_dir, INDEX_FILENAME)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(store_dir, exist_ok=True)
+        self._index = self._read_index()
+
+    def _read_index(self):
+        try:
+            with open(self.index_path) as f:
+                index = json.load(f)
+            if index.get('version') == INDEX_VERSION:
+                return index
+        except (OSError, ValueError):
+            pass
+        return {'version': INDEX_VERSION, 'sources': {}, 'arrays': {}}
+
+    def _write_index(self, index):
+        tmp_path = f"{self.index_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(index, f)
+        os.replace(tmp_path, self.index_path)
+
+    @contextlib.contextmanager
+    def _locked(self):
+        with open(os.path.join(self.store_dir, LOCK_FILENAME), 'a') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    @staticmethod
+    def _array_key(content_hash, variant, target_size):
+        size = f"{target_size[0]}x{target_size[1]}" if target_size is not None else 'full'
+        return f"{content_hash}:{variant}:{size}"
+
+    def _content_hash(self, image_path):
+        """
+        Content hash of a source file, from the index while its size and mtime match
+        """
+        path = os.path.abspath(image_path)
+        stat = os.stat(path)
+        source = self._index['sources'].get(path)
+        if source is not None and source['size'] == stat.st_size and source['mtime'] == stat.st_mtime:
+            return source['sha256'], None
+        source = {'size': stat.st_size, 'mtime': stat.st_mtime, 'sha256': hash_file(path)}
+        return source['sha256'], (path, source)
+
+    def _view(self, entry):
+        """
+        Copy-on-write mapping of an array in the pack
+        
+        Every hit gets a mapping of its own, so one caller's writes never show
+        up in another's image or in the pack.
+        """
+        return np.memmap(self.pack_path, dtype=entry['dtype'], mode='c', offset=entry['offset'],
+                         shape=tuple(entry['shape'])).view(np.ndarray)
+
+    def _lookup(self, key):
+        entry = self._index['arrays'].get(key)
+        if entry is None:
+            # Another process may have added it since the index was read
+            with self._lock:
+                self._index = self._read_index()
+            entry = self._index['arrays'].get(key)
+        return self._view(entry) if entry is not None else None
+
+    def get(self, image_path, target_size=None, variant='bgr'):
+        """
+        Load a decoded image, from the pack when it is there
+
+        Args:
+            image_path (str): Path to the image file
+            target_size (tuple): Optional (width, height) passed on to image_io.load_image
+            variant (str): One of VARIANTS
+
+        Returns:
+            numpy.ndarray: The image, writable either way; a copy-on-write mapping on a hit
+        """
+        if variant not in VARIANTS:
+            raise ValueError(f"Unknown image variant: {variant}, expected one of {list(VARIANTS)}")
+
+        content_hash, new_source = self._content_hash(image_path)
+        key = self._array_key(content_hash, variant, target_size)
+        with span('store.lookup', variant=variant):
+            image = self._lookup(key)
+        if image is not None:
+            self.hits += 1
+            if new_source is not None:
+                self.put({}, new_source)
+            return image
+
+        self.misses += 1
+        arrays = {}
+        # Derive a variant from the stored BGR image instead of decoding again
+        bgr_key = self._array_key(content_hash, 'bgr', target_size)
+        bgr = self._lookup(bgr_key)
+        if bgr is None:
+            bgr = load_image(image_path, target_size)
+            arrays[bgr_key] = bgr
+        image = bgr if VARIANTS[variant] is None else cv2.cvtColor(bgr, VARIANTS[variant])
+        arrays[key] = image
+        self.put(arrays, new_source)
+        return image
+
+    def put(self, arrays, source=None):
+        """
+        Append arrays to the pack and record them in the index
+
+        Args:
+            arrays (dict): Array key -> array, see _array_key
+            source (tuple): Optional (absolute path, size/mtime/sha256 record) to remember
+        """
+        with span('store.put', arrays=len(arrays)), self._lock, self._locked():
+            index = self._read_index()
+            if source is not None:
+                index['sources'][source[0]] = source[1]
+
+            offset = os.path.getsize(self.pack_path) if os.path.exists(self.pack_path) else 0
+            with open(self.pack_path, 'ab') as f:
+                for key, array in arrays.items():
+                    if key in index['arrays']:
+                        continue
+                    padding = -offset % ALIGNMENT
+                    if offset + padding + array.nbytes > self.max_bytes:
+                        break
+                    f.write(b'\0' * padding)
+                    offset += padding
+                    f.write(np.ascontiguousarray(array).data)
+                    index['arrays'][key] = {'offset': offset, 'shape': list(array.shape),
+                                            'dtype': array.dtype.str}
+                    offset += array.nbytes
+
+            self._write_index(index)
+            self._index = index
+
+    def clear(self):
+        """
+        Delete every stored image
+        """
+        with self._lock, self._locked():
+            for path in (self.pack_path, self.index_path):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            self._index = self._read_index()
+
+    def summary(self):
+        """
+        Returns:
+            dict: Stored arrays, pack bytes, hits and misses
+        """
+        return {
+            'arrays': len(self._index['arrays']),
+            'bytes': os.path.getsize(self.pack_path) if os.path.exists(self.pack_path) else 0,
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+
+def get_store(default=True):
+    """
+    Return the shared image store
+
+    Args:
+        default (bool): Whether to use the store when COLORWEB_IMAGE_STORE is not set
+
+    Returns:
+        ImageStore: The store, or None when it or the stage cache is turned off
+    """
+    global _default_store
+    setting = os.environ.get('COLORWEB_IMAGE_STORE', 'on' if default else 'off')
+    cache_setting = os.environ.get('COLORWEB_CACHE', 'on')
+    if any(value.lower() in ('off', '0', 'false', 'no') for value in (setting, cache_setting)):
+        return None
+    with _default_store_lock:
+        if _default_store is None:
+            # on, 1, true and yes mean the default directory, not a directory of that name
+            store_dir = DEFAULT_STORE_DIR if setting.lower() in ('', 'on', '1', 'true', 'yes') else setting
+            _default_store = ImageStore(store_dir)
+    return _default_store
+
+
+def load_decoded(image_path, target_size=None, variant='bgr', use_store=False):
+    """
+    Load an image through the shared store, or decode it when the store is off
+
+    A run that decodes every image once gains nothing from the store and
+    would only fill it, so callers opt in.
+
+    Args:
+        image_path (str): Path to the image file
+        target_size (tuple): Optional (width, height) passed on to image_io.load_image
+        variant (str): 'bgr', 'rgb', 'gray' or 'lab'
+        use_store (bool): Use the store unless COLORWEB_IMAGE_STORE is off; for
+                          sweeps that read the same image many times. Without
+                          it, the store is only used with COLORWEB_IMAGE_STORE=on
+
+    Returns:
+        numpy.ndarray: The image, writable; a copy-on-write mapping when it comes from the store
+    """
+    store = get_store(default=use_store)
+    if store is not None:
+        return store.get(image_path, target_size, variant)
+    if variant not in VARIANTS:
+        raise ValueError(f"Unknown image variant: {variant}, expected one of {list(VARIANTS)}")
+    image = load_image(image_path, target_size)
+    return image if VARIANTS[variant] is None else cv2.cvtColor(image, VARIANTS[variant])
+
+
+def main():
+    """
+    Fill the store ahead of a parameter sweep
+    """
+    parser = argparse.ArgumentParser(description="Decode every image below a directory into the image store")
+    parser.add_argument('image_dir', help="Directory to walk, e.g. dataset_resized")
+    parser.add_argument('--variants', nargs='+', choices=list(VARIANTS), default=['bgr'],
+                        help="Variants to store")
+    parser.add_argument('--names', nargs='+', help="Only store files with these names")
+    parser.add_argument('--clear', action='store_true', help="Empty the store first")
+    args = parser.parse_args()
+
+    store = get_store()
+    if store is None:
+        parser.error("The image store is turned off (COLORWEB_IMAGE_STORE or COLORWEB_CACHE)")
+    if args.clear:
+        store.clear()
+
+    for image_path in find_image_files(args.image_dir, args.names):
+        for variant in args.variants:
+            store.get(image_path, variant=variant)
+
+    summary = store.summary()
+    print(f"Store {store.store_dir}: {summary['arrays']} arrays, {summary['bytes'] / 2 ** 20:.0f} MiB, "
+          f"{summary['misses']} added")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,295 @@
+import os
+import re
+import sys
+import time
+import threading
+import tracemalloc
+import multiprocessing
+
+MIB = 2 ** 20
+
+_SIZE_UNITS = {'': 1, 'k': 2 ** 10, 'm': 2 ** 20, 'g': 2 ** 30, 't': 2 ** 40}
+
+
+def parse_size(text):
+    """
+    Parse a memory size such as '1500M', '2G', '2GiB' or a plain byte count
+
+    Args:
+        text (str): Size with an optional K/M/G/T suffix, powers of 1024
+
+    Returns:
+        int: Size in bytes
+    """
+    match = re.fullmatch(r'\s*(\d+(?:\.\d+)?)\s*([kmgt]?)(?:i?b)?\s*', str(text), re.IGNORECASE)
+    if match is None:
+        raise ValueError(f"Invalid memory size: {text!r}")
+    return int(float(match.group(1)) * _SIZE_UNITS[match.group(2).lower()])
+
+
+def current_rss():
+    """
+    Resident set size of this process in bytes
+
+    Read from /proc on Linux. Elsewhere the peak RSS is returned instead,
+    which only ever grows, so a budget errs on the side of throttling.
+    """
+    try:
+        with open('/proc/self/statm', 'rb') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return peak_rss()
+
+
+def children_rss():
+    """
+    Summed resident set size of the live child processes, e.g. pool workers, in bytes
+
+    Read from /proc on Linux; elsewhere 0, so only this process counts.
+    """
+    total = 0
+    for child in multiprocessing.active_children():
+        try:
+            with open(f'/proc/{child.pid}/statm', 'rb') as f:
+                total += int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+        except (OSError, ValueError, IndexError):
+            # Exited meanwhile, or no /proc
+            pass
+    return total
+
+
+def peak_rss():
+    """
+    Peak resident set size of this process in bytes
+    """
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class _Frame:
+    __slots__ = ('py_start', 'py_peak', 'rss_start', 'rss_peak')
+
+    def __init__(self, py_current, rss):
+        self.py_start = self.py_peak = py_current
+        self.rss_start = self.rss_peak = rss
+
+
+class MemoryTracker:
+    """
+    High-water marks of traced Python memory and RSS over nested, overlapping spans
+
+    tracemalloc only keeps one process wide peak, so the peak is folded into
+    every open span and reset whenever a span starts or ends; each span ends
+    up with the highest value seen while it was open, in any thread. A
+    sampler thread does the same for the RSS, which catches OpenCV buffers
+    that tracemalloc does not see.
+    """
+
+    def __init__(self, interval=0.01, on_sample=None):
+        """
+        Args:
+            interval (float): Seconds between RSS samples
+            on_sample (callable): Called with (rss bytes, traced bytes) on every sample
+        """
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self.interval = interval
+        self.on_sample = on_sample
+        self._open = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, name='memory-sampler', daemon=True)
+        self._thread.start()
+
+    def _fold(self, py_peak, rss):
+        for frame in self._open:
+            if py_peak > frame.py_peak:
+                frame.py_peak = py_peak
+            if rss > frame.rss_peak:
+                frame.rss_peak = rss
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            rss = current_rss()
+            traced, _ = tracemalloc.get_traced_memory()
+            with self._lock:
+                self._fold(0, rss)
+            if self.on_sample is not None:
+                self.on_sample(rss, traced)
+
+    def begin(self):
+        """
+        Start measuring a span
+
+        Returns:
+            object: Token to pass to end()
+        """
+        rss = current_rss()
+        with self._lock:
+            current, peak = tracemalloc.get_traced_memory()
+            self._fold(peak, rss)
+            tracemalloc.reset_peak()
+            frame = _Frame(current, rss)
+            self._open.append(frame)
+        return frame
+
+    def end(self, frame):
+        """
+        Stop measuring a span
+
+        Args:
+            frame (object): Token returned by begin()
+
+        Returns:
+            dict: py_peak_mib and rss_peak_mib, the highest traced and resident
+                  memory while the span was open, and their growth over the
+                  value at its start as py_delta_mib and rss_delta_mib
+        """
+        rss = current_rss()
+        with self._lock:
+            _, peak = tracemalloc.get_traced_memory()
+            self._fold(peak, rss)
+            tracemalloc.reset_peak()
+            self._open.remove(frame)
+        return {
+            'py_peak_mib': round(frame.py_peak / MIB, 2),
+            'py_delta_mib': round((frame.py_peak - frame.py_start) / MIB, 2),
+            'rss_peak_mib': round(frame.rss_peak / MIB, 2),
+            'rss_delta_mib': round((frame.rss_peak - frame.rss_start) / MIB, 2),
+        }
+
+    def stop(self):
+        """
+        Stop the sampler thread and tracemalloc
+        """
+        self._stop.set()
+        self._thread.join()
+        tracemalloc.stop()
+
+
+class MemoryBudget:
+    """
+    Admit images into a batch only while the process RSS is under a budget
+
+    A batch runner calls acquire() before it starts on an image and release()
+    once the image's outputs are written. Over the budget, acquire() waits for
+    images in flight to finish; one image is always admitted when none is in
+    flight, so a budget below the size of a single image slows the batch down
+    to one image at a time instead of stalling it. Only this process is
+    measured, unless children is set for a runner whose pool workers decode
+    and write images themselves; their RSS is then added.
+    """
+
+    def __init__(self, limit=None, poll_interval=0.05, children=False):
+        """
+        Args:
+            limit (int or str): Budget in bytes or as accepted by parse_size,
+                                None for no limit
+            poll_interval (float): Seconds between RSS checks while waiting
+            children (bool): Count the RSS of the child processes, see children_rss
+        """
+        self.limit = parse_size(limit) if isinstance(limit, str) else limit
+        self.poll_interval = poll_interval
+        self.children = children
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.throttled = 0
+        self.wait_time = 0.0
+        self._cancelled = False
+        self._cond = threading.Condition()
+
+    def rss(self):
+        """
+        Returns:
+            int: The measured RSS in bytes, with the child processes if counted
+        """
+        return current_rss() + (children_rss() if self.children else 0)
+
+    def over_budget(self):
+        return self.limit is not None and not self._cancelled and self.rss() > self.limit
+
+    def acquire(self):
+        """
+        Wait until another image fits in the budget and count it as in flight
+        """
+        with self._cond:
+            if self.in_flight and self.over_budget():
+                self.throttled += 1
+                start = time.perf_counter()
+                # Poll as well, the RSS also drops without any image finishing
+                while self.in_flight and self.over_budget():
+                    self._cond.wait(self.poll_interval)
+                self.wait_time += time.perf_counter() - start
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+    def release(self, *_):
+        """
+        Mark an image as done; accepts and ignores callback arguments
+        """
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
+
+    def cancel(self):
+        """
+        Stop throttling, so a producer blocked in acquire() returns when the
+        consumer has given up, e.g. before joining a pool after an error
+        """
+        with self._cond:
+            self._cancelled = True
+            self._cond.notify_all()
+
+    def drain(self, flush):
+        """
+        Call flush if the process is over the budget
+
+        For runners that work on one image at a time, where the only other
+        images in flight are outputs queued on a writer.
+
+        Args:
+            flush (callable): Waits for the queued work, e.g. AsyncImageWriter.flush
+        """
+        if self.over_budget():
+            self.throttled += 1
+            start = time.perf_counter()
+            flush()
+            self.wait_time += time.perf_counter() - start
+
+    def throttle(self, items):
+        """
+        Yield items, acquiring the budget before each one
+
+        Every item must be released by the consumer. Handing the generator
+        to Pool.imap_unordered throttles how fast tasks are submitted.
+
+        Args:
+            items (iterable): Work items, e.g. pool tasks
+
+        Yields:
+            The items, one at a time
+        """
+        for item in items:
+            self.acquire()
+            yield item
+
+    def summary(self):
+        """
+        Returns:
+            dict: limit, max_in_flight, throttled (waits) and wait_time in seconds
+        """
+        return {'limit': self.limit, 'max_in_flight': self.max_in_flight,
+                'throttled': self.throttled, 'wait_time': self.wait_time}
+
+    def report(self):
+        """
+        Print how much the budget held the batch back
+        """
+        if self.limit is None:
+            return
+        in_flight = f"up to {self.max_in_flight} images in flight, " if self.max_in_flight else ""
+        print(f"Memory budget {self.limit / MIB:.0f} MiB: {in_flight}"
+              f"throttled {self.throttled} times for {self.wait_time:.2f}s, "
+              f"peak RSS {peak_rss() / MIB:.0f} MiB")
@@ -0,0 +1,298 @@
+import numpy as np
+
+# Same values as cv2.ximgproc.SLIC, SLICO and MSLIC, so either engine takes either constant
+SLIC = 100
+SLICO = 101
+MSLIC = 102
+
+ALGORITHMS = {'SLIC': SLIC, 'SLICO': SLICO, 'MSLIC': MSLIC}
+
+# Initial color distance normalization of every SLICO cluster, as in OpenCV
+SLICO_INITIAL_MAX_COLOR = 10.0 * 10.0
+
+# Pixels scored per batch; the 9 candidate scores and the one-hot choice
+# take 72 bytes a pixel, so about 72 MiB of scratch for 2^20 pixels
+BATCH_PIXELS = 1 << 20
+
+# Score of a candidate cell outside the grid
+_FAR = 1e30
+
+
+class NumpySLIC:
+    """
+    SLIC and SLICO superpixels in NumPy, for OpenCV builds without ximgproc
+
+    Exposes the part of cv2.ximgproc.SuperpixelSLIC the pipeline uses:
+    iterate(), getLabels(), getNumberOfSuperpixels() and getLabelContourMask().
+    Like OpenCV, distances are taken on the input channels as given, seeds
+    start on a grid moved to the lowest gradient nearby, and iterate() can be
+    called again to continue.
+
+    The image is cut into a grid of equal cells, one seed per cell, and a
+    pixel only considers the centers that started in its own cell and the
+    eight around it, the equivalent of SLIC's 2S search window. The distances
+    of a cell's pixels to those 9 centers are one small matrix product,
+    |p|^2 - 2 p.c + |c|^2 with each center's weights folded into its row, and
+    a second product of the one-hot choice with the pixel features gives the
+    sums for the center update. An iteration is then a few batched np.matmul
+    calls over all cells instead of a loop over centers.
+    """
+
+    def __init__(self, img, algorithm=SLICO, region_size=10, ruler=10.0):
+        """
+        Args:
+            img (numpy.ndarray): Image to segment, H x W or H x W x C of any depth
+            algorithm (int): SLIC or SLICO; MSLIC needs OpenCV's implementation
+            region_size (int): Average superpixel size
+            ruler (float): Smoothness factor, SLIC only; SLICO adapts it per superpixel
+        """
+        if algorithm not in (SLIC, SLICO):
+            raise ValueError(f"The NumPy SLIC engine supports SLIC and SLICO, not algorithm {algorithm}")
+        self.algorithm = algorithm
+        self.region_size = max(1, int(region_size))
+        self.ruler = float(ruler)
+
+        image = np.asarray(img, dtype=np.float32)
+        if image.ndim == 2:
+            image = image[:, :, None]
+        self.height, self.width, channels = image.shape
+        self._channels = channels
+
+        # Cells of one size over a padded image: round(H / S) rows of ceil(H / rows) pixels
+        self.rows = max(1, int(round(self.height / self.region_size)))
+        self.cols = max(1, int(round(self.width / self.region_size)))
+        self.cell_h = -(-self.height // self.rows)
+        self.cell_w = -(-self.width // self.cols)
+        self.n_centers = self.rows * self.cols
+        padded_h, padded_w = self.rows * self.cell_h, self.cols * self.cell_w
+
+        # Colors relative to the image mean keep the float32 scores precise
+        image = image - image.reshape(-1, channels).mean(axis=0)
+
+        # Per pixel features, cells x features x pixels: colors, position in
+        # the cell, |color|^2 and 1, the counterpart of the rows built in
+        # _candidates. Padding pixels are all zero, so they add nothing to
+        # the center sums.
+        features = np.zeros((padded_h, padded_w, channels + 4), dtype=np.float32)
+        features[:self.height, :self.width, :channels] = image
+        features[:self.height, :self.width, channels] = (np.arange(self.height) % self.cell_h)[:, None]
+        features[:self.height, :self.width, channels + 1] = np.arange(self.width) % self.cell_w
+        features[:self.height, :self.width, channels + 2] = (image ** 2).sum(axis=2)
+        features[:self.height, :self.width, channels + 3] = 1.0
+        self._features = np.ascontiguousarray(
+            features.reshape(self.rows, self.cell_h, self.cols, self.cell_w, channels + 4)
+            .transpose(0, 2, 4, 1, 3)).reshape(self.n_centers, channels + 4, self.cell_h * self.cell_w)
+        del features
+
+        origin_y, origin_x = np.meshgrid(np.arange(self.rows) * self.cell_h, np.arange(self.cols) * self.cell_w,
+                                         indexing='ij')
+        self._origin = np.stack([origin_y.ravel(), origin_x.ravel()], axis=1).astype(np.float64)
+
+        # The 9 cells around every cell, -1 outside the grid
+        offsets = [(dy, dx) for dy in (-1, 0, 1) for dx in (-1, 0, 1)]
+        cell_y, cell_x = np.divmod(np.arange(self.n_centers), self.cols)
+        neighbor_y = cell_y[:, None] + np.array([dy for dy, _ in offsets])
+        neighbor_x = cell_x[:, None] + np.array([dx for _, dx in offsets])
+        inside = (neighbor_y >= 0) & (neighbor_y < self.rows) & (neighbor_x >= 0) & (neighbor_x < self.cols)
+        self._neighbors = np.where(inside, neighbor_y * self.cols + neighbor_x, -1)
+
+        self._centers = self._seed(image)
+        self._max_color = np.full(self.n_centers, SLICO_INITIAL_MAX_COLOR)
+        # Until iterated, every pixel belongs to its cell's seed
+        self._compact(np.repeat(np.arange(self.n_centers, dtype=np.int32), self.cell_h * self.cell_w))
+
+    def _seed(self, image):
+        """
+        One seed in the middle of every cell, moved to the lowest gradient in its 3x3 neighborhood
+
+        Returns:
+            numpy.ndarray: (cells, C + 2) float64 centers, colors then y and x
+        """
+        edges = np.zeros(image.shape[:2], dtype=np.float32)
+        edges[1:-1, :] += ((image[2:, :] - image[:-2, :]) ** 2).sum(axis=2)
+        edges[:, 1:-1] += ((image[:, 2:] - image[:, :-2]) ** 2).sum(axis=2)
+
+        # Middle of the part of each cell inside the image
+        origin_y, origin_x = self._origin.astype(np.int64).T
+        seed_y = (origin_y + np.minimum(origin_y + self.cell_h, self.height)) // 2
+        seed_x = (origin_x + np.minimum(origin_x + self.cell_w, self.width)) // 2
+
+        candidates_y = np.clip(seed_y[:, None] + np.repeat([-1, 0, 1], 3), 0, self.height - 1)
+        candidates_x = np.clip(seed_x[:, None] + np.tile([-1, 0, 1], 3), 0, self.width - 1)
+        best = np.argmin(edges[candidates_y, candidates_x], axis=1)
+        seed_y = candidates_y[np.arange(self.n_centers), best]
+        seed_x = candidates_x[np.arange(self.n_centers), best]
+
+        centers = np.empty((self.n_centers, self._channels + 2))
+        centers[:, :self._channels] = image[seed_y, seed_x]
+        centers[:, self._channels] = seed_y
+        centers[:, self._channels + 1] = seed_x
+        return centers
+
+    def _candidates(self, cells):
+        """
+        Rows of the distance product for a range of cells
+
+        Args:
+            cells (slice): Cells to build the rows for
+
+        Returns:
+            numpy.ndarray: (cells, 9, C + 4) float32, so that rows @ features is
+                           w * color distance^2 + s * (xy distance^2 - |xy|^2)
+                           to each of the 9 centers around the cell
+        """
+        channels = self._channels
+        neighbors = self._neighbors[cells]
+        inside = neighbors >= 0
+        centers = self._centers[np.maximum(neighbors, 0)]
+        colors = centers[:, :, :channels]
+        position = centers[:, :, channels:] - self._origin[cells][:, None, :]
+
+        if self.algorithm == SLICO:
+            color_weight = 1.0 / self._max_color[np.maximum(neighbors, 0)]
+            spatial_weight = 1.0 / self.region_size ** 2
+        else:
+            color_weight = np.ones(neighbors.shape)
+            spatial_weight = (self.ruler / self.region_size) ** 2
+
+        rows = np.empty(neighbors.shape + (channels + 4,))
+        rows[:, :, :channels] = -2.0 * color_weight[:, :, None] * colors
+        rows[:, :, channels:channels + 2] = -2.0 * spatial_weight * position
+        rows[:, :, channels + 2] = color_weight
+        rows[:, :, channels + 3] = (color_weight * (colors ** 2).sum(axis=2) +
+                                    spatial_weight * (position ** 2).sum(axis=2))
+        rows[~inside] = 0.0
+        rows[~inside, channels + 3] = _FAR
+        return rows.astype(np.float32)
+
+    def _step(self):
+        """
+        One iteration: label every pixel with the nearest of the 9 centers
+        around its cell, then move the centers to the mean color and position
+        of their pixels
+
+        Returns:
+            numpy.ndarray: (cells, pixels per cell) int32 center index per pixel
+        """
+        channels = self._channels
+        pixels = self.cell_h * self.cell_w
+        batch = max(1, BATCH_PIXELS // pixels)
+        labels = np.empty((self.n_centers, pixels), dtype=np.int32)
+        sums = np.zeros((self.n_centers, channels + 4))
+        max_color = np.zeros(self.n_centers)
+
+        for start in range(0, self.n_centers, batch):
+            cells = slice(start, min(start + batch, self.n_centers))
+            features = self._features[cells]
+            neighbors = self._neighbors[cells]
+            inside = neighbors >= 0
+
+            # min and == along the 9 candidates are much faster than argmin
+            scores = np.matmul(self._candidates(cells), features)
+            chosen = scores == scores.min(axis=1, keepdims=True)
+            tied = np.count_nonzero(chosen, axis=1) > 1
+            if tied.any():
+                cell, pixel = np.nonzero(tied)
+                chosen[cell, :, pixel] = False
+                chosen[cell, scores[cell, :, pixel].argmin(axis=1), pixel] = True
+            chosen = chosen.astype(np.float32)
+            labels[cells] = np.matmul(neighbors[:, None, :].astype(np.float32), chosen)[:, 0, :]
+
+            # Feature sums per candidate, cell positions shifted to image positions
+            partial = np.matmul(chosen, features.transpose(0, 2, 1)).astype(np.float64)
+            partial[:, :, channels:channels + 2] += partial[:, :, channels + 3:] * self._origin[cells][:, None, :]
+            np.add.at(sums, neighbors[inside], partial[inside])
+
+            if self.algorithm == SLICO:
+                # Largest color distance per cluster, to the centers the pixels were assigned by
+                colors = self._centers[np.maximum(neighbors, 0), :channels].astype(np.float32)
+                difference = features[:, :channels, :] - np.matmul(colors.transpose(0, 2, 1), chosen)
+                distance = (difference ** 2).sum(axis=1) * features[:, channels + 3, :]
+                largest = np.stack([(distance * chosen[:, k, :]).max(axis=1) for k in range(9)], axis=1)
+                np.maximum.at(max_color, neighbors[inside], largest[inside])
+
+        count = sums[:, channels + 3]
+        assigned = count > 0
+        self._centers[assigned] = sums[assigned, :channels + 2] / count[assigned, None]
+        if self.algorithm == SLICO:
+            self._max_color = np.where(assigned, np.maximum(max_color, 1.0), self._max_color)
+        return labels
+
+    def iterate(self, num_iterations=10):
+        """
+        Run SLIC iterations; further calls continue from the current centers
+
+        Afterwards the labels are renumbered over the centers that kept
+        pixels, so getNumberOfSuperpixels() counts no empty clusters.
+
+        Args:
+            num_iterations (int): Number of iterations
+        """
+        if num_iterations <= 0:
+            return
+        for _ in range(num_iterations):
+            labels = self._step()
+        self._compact(labels)
+
+    def _compact(self, labels):
+        """
+        Store the label map with the centers that own pixels numbered 0..n-1
+
+        Cells of the padded grid can lie wholly outside the image and
+        clusters can lose all their pixels, neither may count as a superpixel.
+        """
+        labels = self._to_image(labels)
+        used = np.bincount(labels.ravel(), minlength=self.n_centers) > 0
+        self._labels = (np.cumsum(used) - 1).astype(np.int32)[labels]
+        self._n_labels = int(np.count_nonzero(used))
+
+    def _to_image(self, labels):
+        """
+        Reshape (cells, pixels per cell) labels to the H x W label map
+        """
+        labels = labels.reshape(self.rows, self.cols, self.cell_h, self.cell_w).transpose(0, 2, 1, 3)
+        return np.ascontiguousarray(labels.reshape(self.rows * self.cell_h, self.cols * self.cell_w)
+                                    [:self.height, :self.width])
+
+    def getLabels(self):
+        """
+        Returns:
+            numpy.ndarray: int32 label map (H x W), values below getNumberOfSuperpixels()
+        """
+        return self._labels.copy()
+
+    def getNumberOfSuperpixels(self):
+        """
+        Returns:
+            int: Number of superpixels with pixels, label values are below it
+        """
+        return self._n_labels
+
+    def getLabelContourMask(self, thick_line=True):
+        """
+        Args:
+            thick_line (bool): Mark the pixels on both sides of a boundary
+
+        Returns:
+            numpy.ndarray: uint8 mask, 255 on superpixel boundaries
+        """
+        labels = self.getLabels()
+        mask = np.zeros(labels.shape, dtype=bool)
+        horizontal = labels[:, :-1] != labels[:, 1:]
+        vertical = labels[:-1, :] != labels[1:, :]
+        mask[:, :-1] |= horizontal
+        mask[:-1, :] |= vertical
+        if thick_line:
+            mask[:, 1:] |= horizontal
+            mask[1:, :] |= vertical
+        return np.where(mask, 255, 0).astype(np.uint8)
+
+
+def create_superpixel_slic(img, algorithm=SLICO, region_size=10, ruler=10.0):
+    """
+    Drop-in for cv2.ximgproc.createSuperpixelSLIC
+
+    Returns:
+        NumpySLIC: The superpixel object, not yet iterated
+    """
+    return NumpySLIC(img, algorithm, region_size, ruler)
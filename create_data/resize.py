@@ -1,30 +1,270 @@
 import cv2
 import numpy as np
 import os
-from typing import Tuple
+import json
+import time
+import hashlib
+import multiprocessing
+import multiprocessing.util
+from image_io import IMAGE_EXTENSIONS, load_image, resize_with_pad
+from async_writer import AsyncImageWriter
+from memory import MemoryBudget
 
-def resize_with_pad(image: np.array, 
-                    new_shape: Tuple[int, int], 
-                    padding_color: Tuple[int] = (255, 255, 255)) -> np.array:
-    """Maintains aspect ratio and resizes with padding.
-    Params:
-        image: Image to be resized.
-        new_shape: Expected (width, height) of new image.
-        padding_color: Tuple in BGR of padding color
+# Records source size, mtime and hash of every resized image
+STATE_FILENAME = '.resize_state.json'
+
+def hash_file(path):
+    """Compute the SHA-256 hash of a file's content."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def find_images(dataset_dir):
+    """Yield (anime, set, filename) for every image in dataset/<anime>/<set>/."""
+    for name in sorted(os.listdir(dataset_dir)):
+        animate_folder_dir = os.path.join(dataset_dir, name)
+        
+        # Skip if it's not a directory
+        if not os.path.isdir(animate_folder_dir):
+            continue
+        
+        for char_folder in sorted(os.listdir(animate_folder_dir)):
+            char_folder_path = os.path.join(animate_folder_dir, char_folder)
+            
+            # Skip if it's not a directory
+            if not os.path.isdir(char_folder_path):
+                continue
+            
+            for img_file in sorted(os.listdir(char_folder_path)):
+                # Skip if it's not a file or not an image
+                if not os.path.isfile(os.path.join(char_folder_path, img_file)):
+                    continue
+                if not img_file.lower().endswith(IMAGE_EXTENSIONS):
+                    continue
+                
+                yield name, char_folder, img_file
+
+def load_state(state_path, new_shape):
+    """Load the resize state file, starting over if the target size changed."""
+    state = None
+    if os.path.exists(state_path):
+        try:
+            with open(state_path) as f:
+                state = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Warning: Ignoring unreadable state file {state_path}: {e}")
+    
+    if state is None or state.get('shape') != list(new_shape):
+        state = {'shape': list(new_shape), 'files': {}}
+    return state
+
+def save_state(state_path, state):
+    """Atomically write the resize state file."""
+    tmp_path = state_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, state_path)
+
+def is_up_to_date(img_path, output_path, entry):
+    """
+    Check a source image against its state entry
+    
+    Returns:
+        tuple: (up to date, refreshed state entry or None)
+    """
+    if entry is None or not os.path.exists(output_path):
+        return False, None
+    
+    stat = os.stat(img_path)
+    if stat.st_size != entry['size']:
+        return False, None
+    if stat.st_mtime == entry['mtime']:
+        return True, entry
+    
+    # Touched but maybe not changed: fall back to the content hash
+    if hash_file(img_path) == entry['sha256']:
+        return True, dict(entry, mtime=stat.st_mtime)
+    return False, None
+
+# Writer a pool worker encodes and writes its own images with, started by _init_worker
+_worker_writer = None
+
+def _init_worker():
+    """
+    Start the writer of a worker process
+    
+    The writer is closed, so everything queued is written, when the pool
+    shuts the worker down.
+    """
+    global _worker_writer
+    _worker_writer = AsyncImageWriter()
+    multiprocessing.util.Finalize(_worker_writer, _worker_writer.close, exitpriority=10)
+
+def resize_file(task):
+    """
+    Decode and resize one image
+    
+    Args:
+        task: Tuple of (relative path, source path, output path, new shape)
+    
+    Returns:
+        tuple: (relative path, resized image or None, state entry or None, error message or None)
+    """
+    rel_path, img_path, output_path, new_shape = task
+    try:
+        stat = os.stat(img_path)
+        
+        # Read the image at the smallest JPEG scale that covers new_shape, then resize
+        resized_img = load_image(img_path, target_size=new_shape)
+        
+        entry = {'size': stat.st_size, 'mtime': stat.st_mtime, 'sha256': hash_file(img_path)}
+        return rel_path, resized_img, entry, None
+    
+    except Exception as e:
+        return rel_path, None, None, str(e)
+
+def resize_and_write_file(task):
+    """
+    Decode and resize one image in a pool worker and write it there
+    
+    Only the state entry goes back to the parent, so encoding is spread over
+    the workers and no image crosses the process boundary. A stale output is
+    removed first, so a failed write shows up as a missing file.
+    
+    Args:
+        task: See resize_file
+    
     Returns:
-        image: Resized image with padding
+        tuple: (relative path, state entry or None, error message or None)
+    """
+    rel_path, resized_img, entry, error = resize_file(task)
+    if error is None:
+        output_path = task[2]
+        try:
+            os.remove(output_path)
+        except FileNotFoundError:
+            pass
+        _worker_writer.write(output_path, resized_img)
+    return rel_path, entry, error
+
+def resize_dataset(dataset_dir, new_dataset_dir, new_shape=(1024, 1024), workers=None, force=False,
+                   memory_budget=None):
     """
-    original_shape = (image.shape[1], image.shape[0])
-    ratio = float(max(new_shape))/max(original_shape)
-    new_size = tuple([int(x*ratio) for x in original_shape])
-    image = cv2.resize(image, new_size)
-    delta_w = new_shape[0] - new_size[0]
-    delta_h = new_shape[1] - new_size[1]
-    top, bottom = delta_h//2, delta_h-(delta_h//2)
-    left, right = delta_w//2, delta_w-(delta_w//2)
-    image = cv2.copyMakeBorder(image, top, bottom, left, right, cv2.BORDER_CONSTANT, value=padding_color)
-    return image
-  
+    Resize every image of dataset/<anime>/<set>/ into new_dataset_dir
+    
+    Decode and resize run on a pool of worker processes, encoding and writing
+    on the threads of an AsyncImageWriter in each worker. Images whose
+    source size and mtime (or, failing that, content hash) match the state
+    file from the previous run are skipped. With a memory budget, no new
+    image is handed to the workers while the RSS of this process and its
+    workers is over it, until a resized image in flight comes back from the
+    workers, or without workers, is written.
+    
+    Args:
+        dataset_dir: Source dataset directory
+        new_dataset_dir: Output directory with the same layout
+        new_shape: Expected (width, height) of the resized images
+        workers: Number of worker processes (None = one per CPU core)
+        force: Ignore the state file and process every image
+        memory_budget: Limit on the summed RSS of this process and the pool
+                       workers, in bytes or e.g. '2G', None for no limit
+    
+    Returns:
+        dict: Counts of processed, skipped and failed images
+    """
+    os.makedirs(new_dataset_dir, exist_ok=True)
+    state_path = os.path.join(new_dataset_dir, STATE_FILENAME)
+    state = load_state(state_path, new_shape)
+    if force:
+        state['files'] = {}
+    
+    tasks = []
+    skipped = 0
+    for name, char_folder, img_file in find_images(dataset_dir):
+        rel_path = os.path.join(name, char_folder, img_file)
+        img_path = os.path.join(dataset_dir, rel_path)
+        output_path = os.path.join(new_dataset_dir, rel_path)
+        
+        up_to_date, entry = is_up_to_date(img_path, output_path, state['files'].get(rel_path))
+        if up_to_date:
+            state['files'][rel_path] = entry
+            skipped += 1
+            continue
+        
+        # Create corresponding character folder in new dataset
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        tasks.append((rel_path, img_path, output_path, tuple(new_shape)))
+    
+    if workers is None:
+        workers = os.cpu_count() or 1
+    
+    print(f"Resizing {len(tasks)} images on {workers} worker(s), {skipped} up to date")
+    processed = 0
+    failed = 0
+    start = time.perf_counter()
+    
+    budget = MemoryBudget(memory_budget, children=workers > 1 and len(tasks) > 1)
+    throttled_tasks = budget.throttle(tasks)
+    if workers > 1 and len(tasks) > 1:
+        pool = multiprocessing.Pool(workers, initializer=_init_worker)
+        completed = pool.imap_unordered(resize_and_write_file, throttled_tasks)
+    else:
+        pool = None
+        completed = map(resize_file, throttled_tasks)
+    writer = AsyncImageWriter()
+    done = []
+    try:
+        for result in completed:
+            if pool is not None:
+                rel_path, entry, error = result
+                resized_img = None
+            else:
+                rel_path, resized_img, entry, error = result
+            if error is not None:
+                failed += 1
+                state['files'].pop(rel_path, None)
+                print(f"Error processing {rel_path}: {error}")
+                budget.release()
+                continue
+            processed += 1
+            state['files'][rel_path] = entry
+            done.append(rel_path)
+            if resized_img is not None:
+                writer.write(os.path.join(new_dataset_dir, rel_path), resized_img, callback=budget.release)
+            else:
+                # Written by the worker
+                budget.release()
+            print(f"Resized: {os.path.join(new_dataset_dir, rel_path)}")
+    finally:
+        budget.cancel()
+        if pool is not None:
+            pool.close()
+            pool.join()
+        writer.close()
+        
+        # Only record images that actually made it to disk
+        lost = {os.path.relpath(output_path, new_dataset_dir) for output_path in writer.failed()}
+        if pool is not None:
+            # Workers report write errors in their own output only, check the files
+            lost |= {rel_path for rel_path in done
+                     if not os.path.exists(os.path.join(new_dataset_dir, rel_path))}
+        for rel_path in lost:
+            processed -= 1
+            failed += 1
+            state['files'].pop(rel_path, None)
+        save_state(state_path, state)
+    
+    elapsed = time.perf_counter() - start
+    rate = processed / elapsed if elapsed > 0 else 0.0
+    print(f"Resized {processed} images in {elapsed:.2f}s ({rate:.1f} images/sec), "
+          f"skipped {skipped}, failed {failed}")
+    writer.report()
+    budget.report()
+    
+    return {'processed': processed, 'skipped': skipped, 'failed': failed}
+
 def main():
     # test
     """
@@ -37,62 +277,10 @@ def main():
     """
 
     # main pipe
-    dataset_dir = 'dataset/hunter'
-    new_dataset_dir = "dataset_resized/hunter"
-
-    # Create the new dataset directory if it doesn't exist
-    if not os.path.exists(new_dataset_dir):
-        os.makedirs(new_dataset_dir)
-
-    for name in os.listdir(dataset_dir):
-        animate_folder_dir = os.path.join(dataset_dir, name)
-        
-        # Skip if it's not a directory
-        if not os.path.isdir(animate_folder_dir):
-            continue
-            
-        # Create corresponding folder in new dataset
-        new_animate_folder_dir = os.path.join(new_dataset_dir, name)
-        if not os.path.exists(new_animate_folder_dir):
-            os.makedirs(new_animate_folder_dir)
-        
-        for img_file in os.listdir(animate_folder_dir):
-
-            char_folder_path = os.path.join(animate_folder_dir, img_file)
-            # Construct full path to the image file
-            img_path = os.path.join(char_folder_path, img_file)
-            
-            print(f"Image path: {img_path}")
-            # Skip if it's not a file or not an image
-            if not os.path.isfile(img_path):
-                continue
-            
-            # Check if it's an image file (optional, but recommended)
-            if not img_file.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp', '.tiff', '.tif')):
-                continue
-            
-            print(f"Processing: {img_path}")
-            
-            try:
-                # Read the image
-                img = cv2.imread(img_path)
-                
-                if img is None:
-                    print(f"Warning: Could not read image {img_path}")
-                    continue
-                
-                # Resize the image
-                resized_img = resize_with_pad(img, (1024, 1024))
-                
-                # Construct output path with same filename
-                output_path = os.path.join(animate_folder_dir, img_file)
-                print(f"Output path: {output_path}")
-                # Save the resized image
-                cv2.imwrite(output_path, resized_img)
-                print(f"Saved: {output_path}")
-                
-            except Exception as e:
-                print(f"Error processing {img_path}: {str(e)}")
+    dataset_dir = 'dataset'
+    new_dataset_dir = "dataset_resized"
+    
+    resize_dataset(dataset_dir, new_dataset_dir)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
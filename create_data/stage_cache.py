@@ -0,0 +1,185 @@
+import os
+import json
+import zipfile
+import hashlib
+import numpy as np
+
+# Set COLORWEB_CACHE=off to disable caching, COLORWEB_CACHE_DIR to move it
+DEFAULT_CACHE_DIR = os.environ.get('COLORWEB_CACHE_DIR',
+                                   os.path.join(os.path.expanduser('~'), '.cache', 'colorweb'))
+DEFAULT_MAX_BYTES = int(os.environ.get('COLORWEB_CACHE_MAX_BYTES', 2 * 1024 ** 3))
+
+_default_cache = None
+
+
+def hash_array(array):
+    """
+    Hash the content, shape and dtype of an array
+
+    Args:
+        array (numpy.ndarray): Array to hash
+
+    Returns:
+        str: Hex digest
+    """
+    array = np.ascontiguousarray(array)
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(f"{array.dtype.str}{array.shape}".encode())
+    digest.update(memoryview(array).cast('B'))
+    return digest.hexdigest()
+
+
+class StageCache:
+    """
+    Content-addressed on-disk cache for expensive stage outputs
+
+    Entries are keyed by (image content hash, stage name, parameters) and
+    stored as compressed .npz files. Every hit refreshes the file's mtime and
+    the least recently used entries are evicted once the cache grows past
+    max_bytes. The directory is scanned once for its size, later puts add to
+    that total and only rescan when it goes over max_bytes.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._total = None
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def key(self, image, stage, params):
+        """
+        Build the cache key of a stage output
+
+        Args:
+            image (numpy.ndarray): Stage input image
+            stage (str): Stage name
+            params (dict): Parameters that influence the output
+
+        Returns:
+            str: Cache key
+        """
+        payload = json.dumps({'image': hash_array(image), 'stage': stage, 'params': params},
+                             sort_keys=True, default=str)
+        return f"{stage}-{hashlib.sha256(payload.encode()).hexdigest()}"
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.npz")
+
+    def get(self, key):
+        """
+        Load a cached entry
+
+        Returns:
+            dict: Name -> array, or None on a miss
+        """
+        path = self._path(key)
+        try:
+            with np.load(path) as data:
+                arrays = {name: data[name] for name in data.files}
+            os.utime(path)
+        except (OSError, ValueError, EOFError, zipfile.BadZipFile):
+            # Missing, truncated by an interrupted writer, or evicted by another process
+            return None
+        return arrays
+
+    def put(self, key, arrays):
+        """
+        Store an entry and evict old entries if the cache is over its size cap
+
+        The cache only saves time, so a failed write, e.g. on a full disk, or
+        an entry evicted by another process meanwhile skips the store.
+
+        Args:
+            key (str): Cache key
+            arrays (dict): Name -> array
+        """
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+        try:
+            replaced = os.path.getsize(path)
+        except OSError:
+            replaced = 0
+        try:
+            np.savez_compressed(tmp_path, **arrays)
+            os.replace(tmp_path, path)
+            added = os.path.getsize(path) - replaced
+        except OSError as e:
+            print(f"Warning: Could not store cache entry {key}: {e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return
+
+        if self._total is None:
+            self.evict()
+        else:
+            self._total += added
+            if self._total > self.max_bytes:
+                self.evict()
+
+    def cached(self, image, stage, params, compute):
+        """
+        Return the cached output of a stage, computing and storing it on a miss
+
+        Args:
+            image (numpy.ndarray): Stage input image
+            stage (str): Stage name
+            params (dict): Parameters that influence the output
+            compute (callable): Returns a dict of arrays, or None to skip caching
+
+        Returns:
+            dict: Name -> array, or None if compute returned None
+        """
+        key = self.key(image, stage, params)
+        arrays = self.get(key)
+        if arrays is None:
+            arrays = compute()
+            if arrays is not None:
+                self.put(key, arrays)
+        return arrays
+
+    def evict(self):
+        """
+        Delete least recently used entries until the cache fits in max_bytes
+        """
+        entries = []
+        total = 0
+        for entry in os.scandir(self.cache_dir):
+            if not entry.name.endswith('.npz') or '.tmp' in entry.name:
+                continue
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total += stat.st_size
+
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+        self._total = total
+
+
+def get_cache():
+    """
+    Return the shared stage cache
+
+    One-shot runs whose results are never read back, like generate_dataset,
+    should not call this at all; see the use_cache argument of SLIC.segment_slic.
+
+    Returns:
+        StageCache: The cache, or None when COLORWEB_CACHE is set to off
+    """
+    global _default_cache
+    if os.environ.get('COLORWEB_CACHE', 'on').lower() in ('off', '0', 'false', 'no'):
+        return None
+    if _default_cache is None:
+        _default_cache = StageCache()
+    return _default_cache
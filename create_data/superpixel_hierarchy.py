@@ -0,0 +1,165 @@
+import math
+import heapq
+import numpy as np
+import cv2
+from superpixel_stats import compute_label_stats
+
+
+def estimate_segment_count(shape, region_size):
+    """
+    Estimate how many superpixels SLIC produces for a region size
+
+    SLIC seeds one superpixel per grid cell, so the count follows directly
+    from the image size.
+
+    Args:
+        shape (tuple): Image shape (height, width, ...)
+        region_size (int): Average superpixel size
+
+    Returns:
+        int: Expected number of superpixels
+    """
+    height, width = shape[:2]
+    x_strips = max(1, int(0.5 + width / region_size))
+    y_strips = max(1, int(0.5 + height / region_size))
+    return x_strips * y_strips
+
+
+def region_size_for_count(shape, target_count, min_region=2):
+    """
+    Invert estimate_segment_count: the region size whose seed grid comes closest to a count
+
+    Args:
+        shape (tuple): Image shape (height, width, ...)
+        target_count (float): Wanted number of superpixels
+        min_region (int): Smallest region size to return
+
+    Returns:
+        int: Region size, the larger one on ties
+    """
+    height, width = shape[:2]
+    guess = math.sqrt(height * width / max(target_count, 1.0))
+    candidates = range(max(min_region, int(guess * 0.8)), max(min_region, int(guess * 1.25)) + 2)
+    return min(candidates, key=lambda region_size: (abs(estimate_segment_count(shape, region_size) - target_count),
+                                                    -region_size))
+
+
+def build_adjacency(labels):
+    """
+    Find all pairs of labels that touch horizontally or vertically
+
+    Args:
+        labels (numpy.ndarray): Integer label map (H x W)
+
+    Returns:
+        numpy.ndarray: (m, 2) array of unique pairs with a < b
+    """
+    right = np.stack([labels[:, :-1].ravel(), labels[:, 1:].ravel()], axis=1)
+    down = np.stack([labels[:-1, :].ravel(), labels[1:, :].ravel()], axis=1)
+    pairs = np.concatenate([right, down])
+    pairs = pairs[pairs[:, 0] != pairs[:, 1]]
+    pairs.sort(axis=1)
+    return np.unique(pairs, axis=0)
+
+
+def merge_ladder(img, labels, n_labels, target_counts):
+    """
+    Greedily merge adjacent superpixels and snapshot each target count
+
+    Pairs are merged in order of the Ward criterion on their mean Lab color,
+    count_a * count_b / (count_a + count_b) * |mean_a - mean_b|^2, so small
+    regions and similar colors go first. Only region statistics are touched
+    while merging; the pixels are never revisited.
+
+    Args:
+        img (numpy.ndarray): BGR image the labels were computed on
+        labels (numpy.ndarray): Integer label map (H x W)
+        n_labels (int): Number of labels in the map
+        target_counts (list): Region counts to snapshot
+
+    Returns:
+        dict: Target count -> (n_labels,) array mapping each original label
+              to a compact merged label, -1 for labels without pixels. A
+              target the graph cannot reach (disconnected regions) maps to
+              the smallest count reached.
+    """
+    lab = cv2.cvtColor(img, cv2.COLOR_BGR2Lab)
+    stats = compute_label_stats(lab, labels, n_labels, with_geometry=False)
+    count = stats['count'].astype(np.float64)
+    color_sum = stats['mean_color'] * count[:, None]
+    present = count > 0
+
+    neighbors = [set() for _ in range(n_labels)]
+    for a, b in build_adjacency(labels):
+        neighbors[a].add(int(b))
+        neighbors[b].add(int(a))
+
+    parent = np.arange(n_labels)
+    version = [0] * n_labels
+
+    def find(x):
+        root = x
+        while parent[root] != root:
+            root = parent[root]
+        while parent[x] != root:
+            parent[x], x = root, parent[x]
+        return root
+
+    def cost(a, b):
+        diff = color_sum[a] / count[a] - color_sum[b] / count[b]
+        return count[a] * count[b] / (count[a] + count[b]) * float(diff @ diff)
+
+    heap = []
+    for a in range(n_labels):
+        for b in neighbors[a]:
+            if a < b:
+                heap.append((cost(a, b), a, b, 0, 0))
+    heapq.heapify(heap)
+
+    def snapshot():
+        # Only labels with pixels count, empty ones would leave gaps in the merged ids
+        roots = np.array([find(x) for x in range(n_labels)])
+        compact = np.full(n_labels, -1, dtype=np.int64)
+        _, compact[present] = np.unique(roots[present], return_inverse=True)
+        return compact
+
+    ladder = {}
+    targets = sorted(set(target_counts), reverse=True)
+    n_alive = int(np.count_nonzero(count))
+
+    while targets and targets[0] >= n_alive:
+        ladder[targets.pop(0)] = snapshot()
+
+    while targets and heap:
+        _, a, b, version_a, version_b = heapq.heappop(heap)
+        if version[a] != version_a or version[b] != version_b:
+            continue
+
+        # Merge the smaller region into the larger one
+        if count[a] < count[b]:
+            a, b = b, a
+        parent[b] = a
+        count[a] += count[b]
+        color_sum[a] += color_sum[b]
+        neighbors[a] |= neighbors[b]
+        neighbors[a] -= {a, b}
+        for c in neighbors[b]:
+            if c != a:
+                neighbors[c].discard(b)
+                neighbors[c].add(a)
+        neighbors[b] = set()
+        version[a] += 1
+        version[b] += 1
+        n_alive -= 1
+
+        for c in neighbors[a]:
+            low, high = (a, c) if a < c else (c, a)
+            heapq.heappush(heap, (cost(a, c), low, high, version[low], version[high]))
+
+        while targets and targets[0] >= n_alive:
+            ladder[targets.pop(0)] = snapshot()
+
+    for target in targets:
+        ladder[target] = snapshot()
+
+    return ladder
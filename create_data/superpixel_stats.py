@@ -0,0 +1,93 @@
+import numpy as np
+
+
+def compute_label_stats(img, labels, n_labels=None, with_geometry=True):
+    """
+    Compute per-label statistics of a superpixel label map in one pass
+
+    Every statistic is accumulated with np.bincount over the flattened label
+    map, so the cost is O(pixels) no matter how many superpixels there are.
+
+    Args:
+        img (numpy.ndarray): Image the labels were computed on (H x W or H x W x C)
+        labels (numpy.ndarray): Integer label map (H x W), values in [0, n_labels)
+        n_labels (int): Number of labels (defaults to labels.max() + 1)
+        with_geometry (bool): Also compute centroids and bounding boxes
+
+    Returns:
+        dict: Per-label arrays indexed by label id
+            'count': (n,) number of pixels
+            'mean_color': (n, C) mean color (float64, zero for empty labels)
+            'centroid': (n, 2) mean (y, x) position, only with geometry
+            'bbox': (n, 4) inclusive (y_min, x_min, y_max, x_max), only with geometry
+    """
+    if labels.shape != img.shape[:2]:
+        raise ValueError(f"Label map shape {labels.shape} does not match image shape {img.shape[:2]}")
+
+    flat_labels = labels.ravel()
+    if n_labels is None:
+        n_labels = int(flat_labels.max()) + 1 if flat_labels.size else 0
+
+    count = np.bincount(flat_labels, minlength=n_labels)
+    safe_count = np.maximum(count, 1)
+
+    pixels = img.reshape(flat_labels.size, -1)
+    mean_color = np.empty((n_labels, pixels.shape[1]), dtype=np.float64)
+    for c in range(pixels.shape[1]):
+        mean_color[:, c] = np.bincount(flat_labels, weights=pixels[:, c], minlength=n_labels) / safe_count
+
+    stats = {
+        'count': count,
+        'mean_color': mean_color,
+    }
+
+    if with_geometry:
+        height, width = labels.shape
+        rows = np.repeat(np.arange(height), width)
+        cols = np.tile(np.arange(width), height)
+
+        centroid = np.empty((n_labels, 2), dtype=np.float64)
+        centroid[:, 0] = np.bincount(flat_labels, weights=rows, minlength=n_labels) / safe_count
+        centroid[:, 1] = np.bincount(flat_labels, weights=cols, minlength=n_labels) / safe_count
+
+        # Empty labels keep the (height, width, -1, -1) sentinel
+        bbox = np.empty((n_labels, 4), dtype=np.int64)
+        bbox[:, 0] = height
+        bbox[:, 1] = width
+        bbox[:, 2:] = -1
+        np.minimum.at(bbox[:, 0], flat_labels, rows)
+        np.minimum.at(bbox[:, 1], flat_labels, cols)
+        np.maximum.at(bbox[:, 2], flat_labels, rows)
+        np.maximum.at(bbox[:, 3], flat_labels, cols)
+
+        stats['centroid'] = centroid
+        stats['bbox'] = bbox
+
+    return stats
+
+
+def render_mean_colors(img, labels, stats=None, boundary_mask=None, boundary_color=(0, 255, 0)):
+    """
+    Fill every superpixel with its mean color through a lookup table
+
+    Args:
+        img (numpy.ndarray): Source image
+        labels (numpy.ndarray): Integer label map (H x W)
+        stats (dict): Output of compute_label_stats, computed if not given
+        boundary_mask (numpy.ndarray): Optional contour mask, pixels == 255 are painted
+        boundary_color (tuple): Color used for the boundary pixels
+
+    Returns:
+        numpy.ndarray: Image with each superpixel filled by its mean color
+    """
+    if stats is None:
+        stats = compute_label_stats(img, labels, with_geometry=False)
+
+    # Casting truncates like assigning the float mean into the uint8 image did
+    lut = stats['mean_color'].astype(img.dtype)
+    result = lut[labels].reshape(img.shape)
+
+    if boundary_mask is not None:
+        result[boundary_mask == 255] = boundary_color
+
+    return result
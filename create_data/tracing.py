@@ -0,0 +1,279 @@
+import os
+import json
+import time
+import atexit
+import functools
+import threading
+from memory import MemoryTracker
+
+# Set COLORWEB_TRACE=trace.json to record every run of any script to that file
+TRACE_ENV = 'COLORWEB_TRACE'
+# Set COLORWEB_TRACE_MEMORY=1 as well to record memory high-water marks per span
+TRACE_MEMORY_ENV = 'COLORWEB_TRACE_MEMORY'
+
+_tracer = None
+
+
+class Tracer:
+    """
+    Collects completed spans and exports them as Chrome trace JSON
+
+    The file opens in chrome://tracing and https://ui.perfetto.dev, with one
+    track per thread. Spans of worker processes are not collected.
+
+    With memory tracking on, every span also gets the tracemalloc and RSS
+    high-water marks reached while it was open, and the RSS and traced
+    memory are sampled onto a counter track under the spans.
+    """
+
+    def __init__(self, memory=False):
+        """
+        Args:
+            memory (bool): Record memory high-water marks per span (slower,
+                           tracemalloc hooks every Python allocation)
+        """
+        self.events = []
+        self._lock = threading.Lock()
+        self._threads = {}
+        self._pid = os.getpid()
+        self.memory = None
+        if memory:
+            self.track_memory()
+
+    def track_memory(self):
+        """
+        Start recording memory high-water marks for the spans started from now on
+        """
+        if self.memory is None:
+            self.memory = MemoryTracker(on_sample=self._add_memory_sample)
+
+    def _add_memory_sample(self, rss, traced):
+        event = {
+            'name': 'memory',
+            'ph': 'C',
+            'ts': time.perf_counter_ns() / 1000,
+            'pid': self._pid,
+            'args': {'rss_mib': round(rss / 2 ** 20, 2), 'traced_mib': round(traced / 2 ** 20, 2)},
+        }
+        with self._lock:
+            self.events.append(event)
+
+    def add(self, name, start_ns, end_ns, args=None):
+        """
+        Record a completed span
+
+        Args:
+            name (str): Span name, e.g. 'slic.iterate'
+            start_ns (int): time.perf_counter_ns() at the start
+            end_ns (int): time.perf_counter_ns() at the end
+            args (dict): Optional details shown with the span
+        """
+        thread = threading.current_thread()
+        event = {
+            'name': name,
+            'cat': name.split('.', 1)[0],
+            'ph': 'X',
+            'ts': start_ns / 1000,
+            'dur': (end_ns - start_ns) / 1000,
+            'pid': self._pid,
+            'tid': thread.ident,
+        }
+        if args:
+            event['args'] = args
+        with self._lock:
+            self.events.append(event)
+            self._threads.setdefault(thread.ident, thread.name)
+
+    def memory_summary(self):
+        """
+        Memory high-water marks per span name
+
+        Returns:
+            dict: Span name -> count and the largest py_peak_mib, py_delta_mib,
+                  rss_peak_mib and rss_delta_mib of its spans
+        """
+        with self._lock:
+            events = list(self.events)
+        summary = {}
+        for event in events:
+            args = event.get('args', {})
+            if event['ph'] != 'X' or 'rss_peak_mib' not in args:
+                continue
+            entry = summary.setdefault(event['name'], {'count': 0, 'py_peak_mib': 0.0, 'py_delta_mib': 0.0,
+                                                       'rss_peak_mib': 0.0, 'rss_delta_mib': 0.0})
+            entry['count'] += 1
+            for key in ('py_peak_mib', 'py_delta_mib', 'rss_peak_mib', 'rss_delta_mib'):
+                entry[key] = max(entry[key], args[key])
+        return summary
+
+    def export(self, path):
+        """
+        Write the spans recorded so far as Chrome trace JSON
+
+        The per span name memory summary, if any, goes under otherData.
+
+        Args:
+            path (str): Output path
+        """
+        with self._lock:
+            events = list(self.events)
+            threads = dict(self._threads)
+        metadata = [{'name': 'thread_name', 'ph': 'M', 'pid': self._pid, 'tid': tid,
+                     'args': {'name': thread_name}} for tid, thread_name in threads.items()]
+
+        trace = {'traceEvents': metadata + events, 'displayTimeUnit': 'ms'}
+        if self.memory is not None:
+            trace['otherData'] = {'memory': self.memory_summary()}
+
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(trace, f, default=str)
+        os.replace(tmp_path, path)
+        print(f"Saved trace of {len(events)} events to {path}")
+
+    def print_memory_summary(self):
+        """
+        Print the memory high-water marks per span name, largest RSS growth first
+        """
+        summary = self.memory_summary()
+        if not summary:
+            return
+        print(f"{'span':<28} {'count':>6} {'py peak':>9} {'py +':>8} {'RSS peak':>9} {'RSS +':>8}  (MiB)")
+        for name, entry in sorted(summary.items(), key=lambda item: -item[1]['rss_delta_mib']):
+            print(f"{name:<28} {entry['count']:>6} {entry['py_peak_mib']:>9.1f} {entry['py_delta_mib']:>8.1f} "
+                  f"{entry['rss_peak_mib']:>9.1f} {entry['rss_delta_mib']:>8.1f}")
+
+
+class _Span:
+    __slots__ = ('tracer', 'name', 'args', 'start', 'memory')
+
+    def __init__(self, tracer, name, args):
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        memory = self.tracer.memory
+        self.memory = memory.begin() if memory is not None else None
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter_ns()
+        if exc_type is not None:
+            self.args['error'] = exc_type.__name__
+        if self.memory is not None:
+            self.args.update(self.tracer.memory.end(self.memory))
+        self.tracer.add(self.name, self.start, end, self.args)
+        return False
+
+    def set(self, **args):
+        """Attach details known only once the span is running, e.g. a result size."""
+        self.args.update(args)
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **args):
+        pass
+
+
+# Shared by every span while tracing is off, so a disabled span allocates nothing
+_NULL_SPAN = _NullSpan()
+
+
+def span(name, **args):
+    """
+    Context manager timing a block of code
+
+    Usage:
+        with span('slic.iterate', iterations=20):
+            slic.iterate(20)
+
+    Args:
+        name (str): Span name; the part before the first dot is its category
+        **args: Details shown with the span
+
+    Returns:
+        Context manager, a shared no-op when tracing is disabled
+    """
+    if _tracer is None:
+        return _NULL_SPAN
+    return _Span(_tracer, name, args)
+
+
+def traced(name=None):
+    """
+    Decorator that records every call of a function as a span
+
+    Args:
+        name (str): Span name, the function's qualified name by default
+    """
+    def decorator(func):
+        span_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _tracer is None:
+                return func(*args, **kwargs)
+            with _Span(_tracer, span_name, {}):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def enable(path=None, memory=False):
+    """
+    Start recording spans
+
+    Args:
+        path (str): Optional file the trace is written to when the process exits
+        memory (bool): Also record memory high-water marks per span, see Tracer
+
+    Returns:
+        Tracer: The active tracer
+    """
+    global _tracer
+    if _tracer is None:
+        _tracer = Tracer()
+        if path:
+            atexit.register(_export_at_exit, _tracer, path)
+    if memory:
+        _tracer.track_memory()
+    return _tracer
+
+
+def disable():
+    """
+    Stop recording spans
+
+    Returns:
+        Tracer: The tracer that was active, or None
+    """
+    global _tracer
+    tracer, _tracer = _tracer, None
+    return tracer
+
+
+def is_enabled():
+    return _tracer is not None
+
+
+def _export_at_exit(tracer, path):
+    # Only the process that enabled tracing owns the file, not forked workers
+    if os.getpid() == tracer._pid:
+        tracer.export(path)
+        tracer.print_memory_summary()
+
+
+if os.environ.get(TRACE_ENV):
+    # Same off values as COLORWEB_CACHE, so COLORWEB_TRACE_MEMORY=0 means off
+    memory_setting = os.environ.get(TRACE_MEMORY_ENV, '').strip().lower()
+    enable(os.environ[TRACE_ENV], memory=memory_setting not in ('', 'off', '0', 'false', 'no'))
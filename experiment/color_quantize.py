@@ -0,0 +1,219 @@
+import numpy as np
+from sklearn.cluster import KMeans
+
+# Palette engines accepted by quantize()
+QUANTIZE_METHODS = ('kmeans', 'histogram', 'median_cut')
+
+
+def build_color_histogram(image, bits=5):
+    """
+    Collapse the pixels of an image into a coarse, weighted color histogram
+
+    Each channel keeps its top `bits` bits, so with the default of 5 there
+    are at most 32^3 bins. A bin is represented by the mean color of the
+    pixels that fell into it, not by its center.
+
+    Args:
+        image (numpy.ndarray): uint8 image with 3 channels
+        bits (int): Bits kept per channel
+
+    Returns:
+        numpy.ndarray: (H*W,) index of the occupied bin of every pixel
+        numpy.ndarray: (m, 3) mean color of each occupied bin
+        numpy.ndarray: (m,) number of pixels in each occupied bin
+    """
+    pixels = image.reshape(-1, 3)
+    shift = 8 - bits
+    coarse = (pixels >> shift).astype(np.int32)
+    bin_ids = (coarse[:, 0] << (2 * bits)) | (coarse[:, 1] << bits) | coarse[:, 2]
+
+    # Compact the occupied bins without sorting the pixels
+    n_bins = 1 << (3 * bits)
+    weights = np.bincount(bin_ids, minlength=n_bins)
+    occupied = np.flatnonzero(weights)
+    compact = np.full(n_bins, -1, dtype=np.int32)
+    compact[occupied] = np.arange(occupied.size, dtype=np.int32)
+    pixel_bins = compact[bin_ids]
+
+    counts = weights[occupied]
+    bin_colors = np.empty((occupied.size, 3), dtype=np.float64)
+    for c in range(3):
+        bin_colors[:, c] = np.bincount(pixel_bins, weights=pixels[:, c], minlength=occupied.size) / counts
+
+    return pixel_bins, bin_colors, counts
+
+
+def kmeans_palette(image, n_colors=10, random_state=42):
+    """
+    Exact palette: K-means over every pixel
+
+    Args:
+        image (numpy.ndarray): uint8 image with 3 channels
+        n_colors (int): Number of palette colors
+        random_state (int): K-means seed
+
+    Returns:
+        numpy.ndarray: (k, 3) palette
+        numpy.ndarray: (H*W,) palette index of every pixel
+    """
+    pixels = image.reshape(-1, 3)
+    kmeans = KMeans(n_clusters=n_colors, random_state=random_state)
+    labels = kmeans.fit_predict(pixels)
+    return kmeans.cluster_centers_, labels
+
+
+def histogram_kmeans_palette(image, n_colors=10, bits=5, random_state=42):
+    """
+    K-means over the weighted histogram bins instead of every pixel
+
+    Pixels are mapped back through a bin -> palette lookup table.
+
+    Args:
+        image (numpy.ndarray): uint8 image with 3 channels
+        n_colors (int): Number of palette colors
+        bits (int): Histogram bits per channel
+        random_state (int): K-means seed
+
+    Returns:
+        numpy.ndarray: (k, 3) palette
+        numpy.ndarray: (H*W,) palette index of every pixel
+    """
+    pixel_bins, bin_colors, counts = build_color_histogram(image, bits)
+    n_colors = min(n_colors, len(bin_colors))
+
+    # A few thousand weighted points, so several restarts are cheap
+    kmeans = KMeans(n_clusters=n_colors, n_init=4, random_state=random_state)
+    lut = kmeans.fit_predict(bin_colors, sample_weight=counts)
+    return kmeans.cluster_centers_, lut[pixel_bins]
+
+
+def median_cut_palette(image, n_colors=10, bits=5):
+    """
+    Median-cut palette over the weighted histogram bins
+
+    The box with the largest weighted spread is split at the weighted median
+    of its widest channel until there are n_colors boxes. Each box becomes
+    one palette color, the weighted mean of its bins.
+
+    Args:
+        image (numpy.ndarray): uint8 image with 3 channels
+        n_colors (int): Number of palette colors
+        bits (int): Histogram bits per channel
+
+    Returns:
+        numpy.ndarray: (k, 3) palette
+        numpy.ndarray: (H*W,) palette index of every pixel
+    """
+    pixel_bins, bin_colors, counts = build_color_histogram(image, bits)
+
+    def spread(box):
+        colors = bin_colors[box]
+        return (colors.max(axis=0) - colors.min(axis=0)).max() * counts[box].sum()
+
+    boxes = [np.arange(len(bin_colors))]
+    while len(boxes) < n_colors:
+        splittable = [idx for idx, box in enumerate(boxes) if len(box) > 1]
+        if not splittable:
+            break
+        box = boxes.pop(max(splittable, key=lambda idx: spread(boxes[idx])))
+
+        colors = bin_colors[box]
+        channel = int(np.argmax(colors.max(axis=0) - colors.min(axis=0)))
+        order = box[np.argsort(colors[:, channel], kind='stable')]
+        cumulative = np.cumsum(counts[order])
+        split = int(np.searchsorted(cumulative, cumulative[-1] / 2))
+        split = min(max(split, 1), len(order) - 1)
+        boxes.extend([order[:split], order[split:]])
+
+    palette = np.empty((len(boxes), 3), dtype=np.float64)
+    lut = np.empty(len(bin_colors), dtype=np.int32)
+    for idx, box in enumerate(boxes):
+        palette[idx] = np.average(bin_colors[box], axis=0, weights=counts[box])
+        lut[box] = idx
+    return palette, lut[pixel_bins]
+
+
+def quantize(image, n_colors=10, method='histogram', bits=5, random_state=42):
+    """
+    Reduce an image to a small palette
+
+    Args:
+        image (numpy.ndarray): uint8 image with 3 channels
+        n_colors (int): Number of palette colors
+        method (str): 'kmeans' (exact, every pixel), 'histogram' (K-means over
+                      weighted histogram bins) or 'median_cut'
+        bits (int): Histogram bits per channel for the histogram methods
+        random_state (int): K-means seed
+
+    Returns:
+        numpy.ndarray: (k, 3) int palette
+        numpy.ndarray: (H, W) uint8 palette index map (int32 if k > 256)
+    """
+    if method == 'kmeans':
+        palette, labels = kmeans_palette(image, n_colors, random_state)
+    elif method == 'histogram':
+        palette, labels = histogram_kmeans_palette(image, n_colors, bits, random_state)
+    elif method == 'median_cut':
+        palette, labels = median_cut_palette(image, n_colors, bits)
+    else:
+        raise ValueError(f"Unknown quantization method: {method} (expected one of {QUANTIZE_METHODS})")
+
+    index_dtype = np.uint8 if len(palette) <= 256 else np.int32
+    return palette.astype(int), labels.astype(index_dtype).reshape(image.shape[:2])
+
+
+def assign_palette(image, colors, tolerance=None, chunk_size=1 << 16):
+    """
+    Assign every pixel to its nearest palette color in a single pass
+
+    Squared channel differences come from three (256, k) lookup tables, one
+    per channel, so each pixel costs three table gathers instead of
+    arithmetic against every color. Entries outside the tolerance hold a
+    sentinel that no in-tolerance distance can reach. Pixels are processed
+    in chunks to keep memory bounded, and each is counted exactly once.
+
+    Args:
+        image (numpy.ndarray): uint8 image with 3 channels
+        colors (numpy.ndarray): (k, 3) palette
+        tolerance (int): If given, a pixel is only assigned to palette colors
+                         whose channels all lie within tolerance of it
+                         (nearest of those wins); others stay unassigned
+        chunk_size (int): Pixels per chunk
+
+    Returns:
+        numpy.ndarray: (k,) exact pixel count per palette color
+        numpy.ndarray: (H, W) palette index map, unassigned pixels hold k;
+                       uint8 for palettes of up to 255 colors
+    """
+    palette = np.asarray(colors, dtype=np.int32).reshape(-1, 3)
+    n_colors = len(palette)
+    pixels = image.reshape(-1, 3)
+
+    # Larger than any sum of three squared uint8 differences
+    outside = 1 << 20
+    values = np.arange(256, dtype=np.int32)[:, None]
+    luts = []
+    for c in range(3):
+        diff = values - palette[None, :, c]
+        lut = diff * diff
+        if tolerance is not None:
+            lut[np.abs(diff) > tolerance] = outside
+        luts.append(lut)
+
+    index_dtype = np.uint8 if n_colors < 256 else np.int32
+    index_map = np.empty(len(pixels), dtype=index_dtype)
+
+    for start in range(0, len(pixels), chunk_size):
+        chunk = pixels[start:start + chunk_size]
+        dist = luts[0][chunk[:, 0]]
+        dist += luts[1][chunk[:, 1]]
+        dist += luts[2][chunk[:, 2]]
+
+        nearest = dist.argmin(axis=1)
+        if tolerance is not None:
+            best = np.take_along_axis(dist, nearest[:, None], axis=1)[:, 0]
+            nearest[best >= outside] = n_colors
+        index_map[start:start + chunk_size] = nearest
+
+    counts = np.bincount(index_map, minlength=n_colors + 1)[:n_colors]
+    return counts, index_map.reshape(image.shape[:2])
@@ -0,0 +1,266 @@
+import numpy as np
+import cv2
+
+# Sheet renderers accepted by the pipe_1 plotting functions
+RENDERERS = ('opencv', 'matplotlib')
+
+BACKGROUND = (255, 255, 255)
+TEXT_COLOR = (0, 0, 0)
+FONT = cv2.FONT_HERSHEY_SIMPLEX
+
+
+def _text_style(panel_size):
+    """
+    Font scale and thickness that keep labels readable at a given panel width
+    """
+    scale = 0.8 * panel_size / 512
+    return scale, max(1, int(round(2 * scale)))
+
+
+def _band_height(panel_size):
+    """
+    Height of the title band above a panel
+    """
+    scale, thickness = _text_style(panel_size)
+    (_, text_h), baseline = cv2.getTextSize("Ag", FONT, scale, thickness)
+    return text_h + baseline + 2 * max(4, panel_size // 32)
+
+
+def draw_text(canvas, text, center_x, top, scale, thickness, max_width=None):
+    """
+    Draw a horizontally centered line of text, shrinking it to fit max_width
+
+    Args:
+        canvas (numpy.ndarray): RGB uint8 canvas, drawn on in place
+        text (str): Text to draw
+        center_x (int): Horizontal center of the text
+        top (int): Top of the text box
+        scale (float): Font scale
+        thickness (int): Stroke thickness
+        max_width (int): Optional width the text must fit in
+    """
+    (text_w, text_h), _ = cv2.getTextSize(text, FONT, scale, thickness)
+    if max_width is not None and text_w > max_width:
+        scale *= max_width / text_w
+        (text_w, text_h), _ = cv2.getTextSize(text, FONT, scale, thickness)
+    origin = (int(center_x - text_w / 2), int(top + text_h))
+    cv2.putText(canvas, text, origin, FONT, scale, TEXT_COLOR, thickness, cv2.LINE_AA)
+
+
+def fit_panel(image, panel_size):
+    """
+    Scale an image into a square panel, keeping its aspect ratio
+
+    Args:
+        image (numpy.ndarray): Grayscale or RGB uint8 image
+        panel_size (int): Side of the panel in pixels
+
+    Returns:
+        numpy.ndarray: (panel_size, panel_size, 3) RGB panel on a white background
+    """
+    if image.dtype != np.uint8:
+        image = np.clip(image, 0, 255).astype(np.uint8)
+    if image.ndim == 2:
+        image = cv2.cvtColor(image, cv2.COLOR_GRAY2RGB)
+
+    h, w = image.shape[:2]
+    ratio = panel_size / max(h, w)
+    new_w, new_h = max(1, int(round(w * ratio))), max(1, int(round(h * ratio)))
+    interpolation = cv2.INTER_AREA if ratio < 1 else cv2.INTER_LINEAR
+    resized = cv2.resize(image, (new_w, new_h), interpolation=interpolation)
+
+    panel = np.full((panel_size, panel_size, 3), BACKGROUND, dtype=np.uint8)
+    top, left = (panel_size - new_h) // 2, (panel_size - new_w) // 2
+    panel[top:top + new_h, left:left + new_w] = resized
+    return panel
+
+
+def titled_panel(image, title, panel_size):
+    """
+    Panel with a title band above it
+
+    Args:
+        image (numpy.ndarray): Grayscale or RGB uint8 image
+        title (str): Title text
+        panel_size (int): Side of the image panel in pixels
+
+    Returns:
+        numpy.ndarray: RGB panel, panel_size wide
+    """
+    band = _band_height(panel_size)
+    cell = np.full((band + panel_size, panel_size, 3), BACKGROUND, dtype=np.uint8)
+    scale, thickness = _text_style(panel_size)
+    draw_text(cell, title, panel_size / 2, band // 4, scale, thickness, max_width=panel_size - 8)
+    cell[band:] = fit_panel(image, panel_size)
+    return cell
+
+
+def swatch_panel(color, label, panel_size, swatch_height=None, label_above=True):
+    """
+    Solid color swatch with a label
+
+    Args:
+        color (tuple): RGB color
+        label (str): Label text, e.g. "#AE3963: 1234"
+        panel_size (int): Width of the panel in pixels
+        swatch_height (int): Height of the swatch, panel_size by default
+        label_above (bool): Put the label above the swatch instead of below
+
+    Returns:
+        numpy.ndarray: RGB panel, panel_size wide
+    """
+    swatch_height = swatch_height or panel_size
+    band = _band_height(panel_size)
+    cell = np.full((band + swatch_height, panel_size, 3), BACKGROUND, dtype=np.uint8)
+
+    # Leave a margin like matplotlib's bar width of 0.8
+    margin = panel_size // 10
+    swatch_top = band if label_above else 0
+    cell[swatch_top:swatch_top + swatch_height, margin:panel_size - margin] = \
+        np.clip(np.asarray(color), 0, 255).astype(np.uint8)
+
+    scale, thickness = _text_style(panel_size)
+    text_top = band // 4 if label_above else swatch_height + band // 4
+    draw_text(cell, label, panel_size / 2, text_top, scale, thickness, max_width=panel_size - 8)
+    return cell
+
+
+def stack_rows(rows, gap):
+    """
+    Stack rows of panels vertically, left aligned, with gap pixels between panels
+
+    Args:
+        rows (list): List of rows, each a list of RGB panels
+        gap (int): Gap in pixels
+
+    Returns:
+        numpy.ndarray: RGB canvas
+    """
+    row_images = []
+    for panels in rows:
+        height = max(panel.shape[0] for panel in panels)
+        width = sum(panel.shape[1] for panel in panels) + gap * (len(panels) - 1)
+        row = np.full((height, width, 3), BACKGROUND, dtype=np.uint8)
+        x = 0
+        for panel in panels:
+            row[:panel.shape[0], x:x + panel.shape[1]] = panel
+            x += panel.shape[1] + gap
+        row_images.append(row)
+
+    height = sum(row.shape[0] for row in row_images) + gap * (len(row_images) - 1)
+    width = max(row.shape[1] for row in row_images)
+    canvas = np.full((height + 2 * gap, width + 2 * gap, 3), BACKGROUND, dtype=np.uint8)
+    y = gap
+    for row in row_images:
+        canvas[y:y + row.shape[0], gap:gap + row.shape[1]] = row
+        y += row.shape[0] + gap
+    return canvas
+
+
+def add_title(canvas, title, panel_size):
+    """
+    Add a centered title band above a canvas
+
+    Args:
+        canvas (numpy.ndarray): RGB canvas
+        title (str): Title text
+        panel_size (int): Panel size the text style is derived from
+
+    Returns:
+        numpy.ndarray: RGB canvas with the title band
+    """
+    scale, thickness = _text_style(panel_size)
+    scale, thickness = scale * 1.5, thickness + 1
+    (_, text_h), baseline = cv2.getTextSize(title, FONT, scale, thickness)
+    band = text_h + baseline + 2 * max(4, panel_size // 32)
+
+    titled = np.full((band + canvas.shape[0], canvas.shape[1], 3), BACKGROUND, dtype=np.uint8)
+    draw_text(titled, title, canvas.shape[1] / 2, band // 4, scale, thickness,
+              max_width=canvas.shape[1] - 8)
+    titled[band:] = canvas
+    return titled
+
+
+def compose_edge_sheet(edge_images, original_image=None, panel_size=512):
+    """
+    One row of edge panels, optionally preceded by the original image
+
+    Args:
+        edge_images (dict): Method name -> edge image
+        original_image (numpy.ndarray): Optional RGB original shown first
+        panel_size (int): Side of each image panel in pixels
+
+    Returns:
+        numpy.ndarray: RGB sheet
+    """
+    panels = []
+    if original_image is not None:
+        panels.append(titled_panel(original_image, 'Original Image', panel_size))
+    panels.extend(titled_panel(edge_img, f'{name} Edges', panel_size)
+                  for name, edge_img in edge_images.items())
+    return stack_rows([panels], gap=max(4, panel_size // 32))
+
+
+def color_label(color, count):
+    """
+    "#RRGGBB: count" label of a palette color
+    """
+    r, g, b = color
+    return f'#{r:02x}{g:02x}{b:02x}: {count}'.upper()
+
+
+def compose_top_colors_sheet(top_colors, panel_size=512, title='Top 5 Colors by Pixel Count'):
+    """
+    Row of color bars labeled with their hex code and pixel count
+
+    Args:
+        top_colors (list): (RGB color, pixel count) pairs, most frequent first
+        panel_size (int): Width of each bar cell in pixels
+        title (str): Sheet title
+
+    Returns:
+        numpy.ndarray: RGB sheet
+    """
+    panels = [swatch_panel(color, color_label(color, count), panel_size,
+                           swatch_height=panel_size // 2, label_above=False)
+              for color, count in top_colors]
+    return add_title(stack_rows([panels], gap=0), title, panel_size)
+
+
+def compose_question_sheet(edge_images, top_colors, panel_size=512,
+                           title='Edge Detection Methods and Top Colors'):
+    """
+    Edge panels on the first row, top color swatches on the second
+
+    Args:
+        edge_images (dict): Method name -> edge image
+        top_colors (list): (RGB color, pixel count) pairs, most frequent first
+        panel_size (int): Side of each panel in pixels
+        title (str): Sheet title
+
+    Returns:
+        numpy.ndarray: RGB sheet
+    """
+    edge_row = [titled_panel(edge_img, f'{name} Edges', panel_size)
+                for name, edge_img in edge_images.items()]
+    color_row = [swatch_panel(color, color_label(color, count), panel_size)
+                 for color, count in top_colors]
+    canvas = stack_rows([edge_row, color_row], gap=max(4, panel_size // 32))
+    return add_title(canvas, title, panel_size)
+
+
+def save_sheet(sheet, save_path, writer=None):
+    """
+    Write an RGB sheet to disk
+
+    Args:
+        sheet (numpy.ndarray): RGB uint8 sheet
+        save_path (str): Output path, the extension picks the format
+        writer (AsyncImageWriter): Optional writer to queue the file on instead
+                                   of writing it right away
+    """
+    bgr = cv2.cvtColor(sheet, cv2.COLOR_RGB2BGR)
+    if writer is not None:
+        writer.write(save_path, bgr)
+    elif not cv2.imwrite(save_path, bgr):
+        raise ValueError(f"Failed to write image: {save_path}")
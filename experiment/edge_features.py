@@ -0,0 +1,100 @@
+import numpy as np
+import cv2
+from skimage.filters import sobel, prewitt, scharr
+
+
+def normalize_to_uint8(values):
+    """
+    Scale a non-negative response so its maximum maps to 255
+
+    Args:
+        values (numpy.ndarray): Filter response
+
+    Returns:
+        numpy.ndarray: uint8 image (all zeros for a flat response)
+    """
+    peak = values.max()
+    if peak <= 0:
+        return np.zeros(values.shape, dtype=np.uint8)
+    return (values / peak * 255).astype(np.uint8)
+
+
+class EdgeFeatureBank:
+    """
+    Grayscale image and derivative filters computed once and shared
+
+    Every feature is computed lazily on first use, in float32, and memoized,
+    so the edge detection modes of pipe_1 and the combined detector of pipe_2
+    can ask for the same gradients without recomputing them. Blurred copies
+    of the image get their own bank through blurred().
+    """
+
+    def __init__(self, image):
+        """
+        Args:
+            image (numpy.ndarray): RGB or grayscale uint8 image
+        """
+        if image.ndim == 3:
+            image = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+        self.gray = image
+        self._features = {}
+
+    def _memo(self, key, compute):
+        if key not in self._features:
+            self._features[key] = compute()
+        return self._features[key]
+
+    def gray_float(self):
+        """Grayscale image as float32 in [0, 1]."""
+        return self._memo('gray_float', lambda: self.gray.astype(np.float32) / 255)
+
+    def blurred(self, ksize):
+        """Bank of the Gaussian blurred grayscale image (ksize x ksize kernel)."""
+        return self._memo(('blurred', ksize),
+                          lambda: EdgeFeatureBank(cv2.GaussianBlur(self.gray, (ksize, ksize), 0)))
+
+    def sobel(self):
+        """skimage Sobel magnitude, normalized to uint8."""
+        return self._memo('sobel', lambda: normalize_to_uint8(sobel(self.gray_float())))
+
+    def prewitt(self):
+        """skimage Prewitt magnitude, normalized to uint8."""
+        return self._memo('prewitt', lambda: normalize_to_uint8(prewitt(self.gray_float())))
+
+    def scharr(self):
+        """skimage Scharr magnitude, normalized to uint8."""
+        return self._memo('scharr', lambda: normalize_to_uint8(scharr(self.gray_float())))
+
+    def laplacian(self):
+        """Absolute Laplacian as uint8."""
+        # The response of a uint8 image is integral, so int16 is exact
+        return self._memo('laplacian',
+                          lambda: np.absolute(cv2.Laplacian(self.gray, cv2.CV_16S)).astype(np.uint8))
+
+    def sobel_magnitude(self, ksize=3):
+        """OpenCV Sobel gradient magnitude, normalized to uint8."""
+        def compute():
+            sobel_x = cv2.Sobel(self.gray, cv2.CV_32F, 1, 0, ksize=ksize)
+            sobel_y = cv2.Sobel(self.gray, cv2.CV_32F, 0, 1, ksize=ksize)
+            return normalize_to_uint8(cv2.magnitude(sobel_x, sobel_y))
+        return self._memo(('sobel_magnitude', ksize), compute)
+
+    def canny(self, low, high):
+        """Canny edges for the given hysteresis thresholds."""
+        return self._memo(('canny', low, high), lambda: cv2.Canny(self.gray, low, high))
+
+    def threshold(self, feature, value):
+        """
+        Binary threshold of a uint8 feature
+
+        Args:
+            feature (str): Name of a feature method without arguments, e.g. 'sobel'
+            value (int): Threshold value
+
+        Returns:
+            numpy.ndarray: 255 where the feature is above value, else 0
+        """
+        def compute():
+            _, thresh = cv2.threshold(getattr(self, feature)(), value, 255, cv2.THRESH_BINARY)
+            return thresh
+        return self._memo(('threshold', feature, value), compute)
@@ -6,8 +6,88 @@ from skimage.filters import sobel, prewitt, roberts, scharr
 from sklearn.cluster import KMeans
 from collections import Counter
 import os
+import sys
+import time
+import argparse
 
-def plot_edge_images_withoutOri(edge_images, output_dir='.', base_filename='', id = 0):
+# Shared helpers live next to the data creation scripts
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'create_data'))
+import image_io
+from color_quantize import quantize, assign_palette
+from edge_features import EdgeFeatureBank
+from stage_cache import get_cache
+from image_store import load_decoded
+from async_writer import AsyncImageWriter, ensure_writer, save_figure
+from memory import MemoryBudget, parse_size
+import tracing
+from tracing import span, traced
+from compositor import (RENDERERS, compose_edge_sheet, compose_question_sheet,
+                        compose_top_colors_sheet, save_sheet)
+
+# Figures main can produce; pass a subset as outputs to skip the others
+PIPE_1_OUTPUTS = ('compared', 'edges', 'reduced', 'distribution', 'top_colors', 'question')
+
+# Set through set_headless(); figures are then saved but never shown
+HEADLESS = False
+
+def set_headless(headless=True):
+    """
+    Switch between showing figures and only saving them
+    
+    Args:
+        headless (bool): Use the non-GUI Agg backend and never block on plt.show()
+    """
+    global HEADLESS
+    HEADLESS = headless
+    if headless:
+        plt.switch_backend('Agg')
+
+def show_figure():
+    """
+    Show the current figure, or release it when running headless
+    """
+    if HEADLESS:
+        plt.close('all')
+    else:
+        plt.show()
+
+def show_sheet(sheet):
+    """
+    Show a composited sheet, unless running headless
+    """
+    if not HEADLESS:
+        plt.figure(figsize=(sheet.shape[1] / 200, sheet.shape[0] / 200))
+        plt.imshow(sheet)
+        plt.axis('off')
+        plt.show()
+
+def save_plot(save_path, writer=None):
+    """
+    Save the current figure at 300 dpi
+    
+    The figure is rendered on this thread and the file is written by writer.
+    
+    Args:
+        save_path (str): Output path
+        writer (AsyncImageWriter): Optional writer to queue the file on
+    """
+    with ensure_writer(writer) as writer:
+        save_figure(writer, save_path, plt.gcf(), bbox_inches='tight', dpi=300)
+
+def use_compositor(renderer):
+    """
+    Tell whether a sheet is drawn by the OpenCV compositor or by matplotlib
+    
+    Args:
+        renderer (str): 'opencv' (fast, straight into a uint8 canvas) or
+                        'matplotlib' (300 dpi figures for publication)
+    """
+    if renderer not in RENDERERS:
+        raise ValueError(f"Unknown renderer: {renderer} (expected one of {RENDERERS})")
+    return renderer == 'opencv'
+
+@traced('sheet.edges')
+def plot_edge_images_withoutOri(edge_images, output_dir='.', base_filename='', id = 0, renderer='opencv', writer=None):
     """
     Plot all edge detection results without the original image
     
@@ -15,7 +95,17 @@ def plot_edge_images_withoutOri(edge_images, output_dir='.', base_filename='', i
         edge_images (dict): Dictionary containing edge images from different methods
         output_dir (str): Directory to save output files
         base_filename (str): Base name for the output file
+        renderer (str): 'opencv' or 'matplotlib', see use_compositor
+        writer (AsyncImageWriter): Optional writer to queue the file on
     """
+    save_path = os.path.join(output_dir, f"{base_filename}_edge{id}.png")
+    if use_compositor(renderer):
+        sheet = compose_edge_sheet(edge_images)
+        save_sheet(sheet, save_path, writer)
+        print(f"Saved edge detection results to {save_path}")
+        show_sheet(sheet)
+        return
+    
     # Calculate the number of subplots needed
     n_methods = len(edge_images)
     
@@ -31,34 +121,30 @@ def plot_edge_images_withoutOri(edge_images, output_dir='.', base_filename='', i
     plt.tight_layout()
     
     # Save the figure
-    save_path = os.path.join(output_dir, f"{base_filename}_edge{id}.png")
-    plt.savefig(save_path, bbox_inches='tight', dpi=300)
+    save_plot(save_path, writer)
     print(f"Saved edge detection results to {save_path}")
     
-    plt.show()
+    show_figure()
 
-def load_image(image_path):
+def load_image(image_path, target_size=None):
     """
-    Load an image from the specified path
+    Load an image from the specified path as RGB
+    
+    Repeat runs get a copy-on-write mapping from the decoded-image store instead of
+    decoding the JPEG again.
     
     Args:
         image_path (str): Path to the image file
+        target_size (tuple): Optional (width, height) to resize with padding to,
+                             large JPEGs are then decoded at a reduced scale
         
     Returns:
         image (numpy.ndarray): The loaded image
     """
-    if not os.path.exists(image_path):
-        raise FileNotFoundError(f"Image file not found: {image_path}")
-    
-    image = cv2.imread(image_path)
-    if image is None:
-        raise ValueError(f"Failed to load image: {image_path}")
-    
-    # Convert from BGR to RGB (OpenCV loads images in BGR format)
-    image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-    return image
+    return load_decoded(image_path, target_size, variant='rgb')
 
-def edge_detection(image, mode='normal', blur_level=0, threshold_level=0, sketch_mode=False):
+@traced('edges.detect')
+def edge_detection(image, mode='normal', blur_level=0, threshold_level=0, sketch_mode=False, bank=None):
     """
     Apply different edge detection methods to the input image with custom parameters
     
@@ -68,47 +154,35 @@ def edge_detection(image, mode='normal', blur_level=0, threshold_level=0, sketch
         blur_level (int): Level of blur to apply (0-5, where 0 is none and 5 is maximum)
         threshold_level (int): Level of thresholding to apply (0-5, where 0 is none and 5 is maximum)
         sketch_mode (bool): Whether to apply sketch filter effect
+        bank (EdgeFeatureBank): Shared grayscale/gradient bank of image, so that
+                                several modes reuse the same derivatives
         
     Returns:
         dict: Dictionary containing the edge images from different methods
     """
-    # Convert to grayscale if it's a color image
-    if len(image.shape) == 3:
-        gray = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
-    else:
-        gray = image
+    # Grayscale conversion and gradients come from the shared feature bank
+    if bank is None:
+        bank = EdgeFeatureBank(image)
     
     # Apply initial blur based on blur_level
     if blur_level > 0:
         # Calculate kernel size based on blur level (must be odd)
         kernel_size = 2 * blur_level + 1
-        gray = cv2.GaussianBlur(gray, (kernel_size, kernel_size), 0)
+        bank = bank.blurred(kernel_size)
+    
+    gray = bank.gray
     
     # Initialize dictionary for edge images
     edge_images = {}
     
     if mode == 'normal':
         # Standard edge detection methods
-        canny_edges = cv2.Canny(gray, 100, 200)
-        
-        sobel_edges = sobel(gray)
-        sobel_edges = (sobel_edges / sobel_edges.max() * 255).astype(np.uint8)
-        
-        prewitt_edges = prewitt(gray)
-        prewitt_edges = (prewitt_edges / prewitt_edges.max() * 255).astype(np.uint8)
-        
-        laplacian_edges = cv2.Laplacian(gray, cv2.CV_64F)
-        laplacian_edges = np.uint8(np.absolute(laplacian_edges))
-        
-        scharr_edges = scharr(gray)
-        scharr_edges = (scharr_edges / scharr_edges.max() * 255).astype(np.uint8)
-        
         edge_images = {
-            'Canny': canny_edges,
-            'Sobel': sobel_edges,
-            'Prewitt': prewitt_edges,
-            'Laplacian': laplacian_edges,
-            'Scharr': scharr_edges
+            'Canny': bank.canny(100, 200),
+            'Sobel': bank.sobel(),
+            'Prewitt': bank.prewitt(),
+            'Laplacian': bank.laplacian(),
+            'Scharr': bank.scharr()
         }
         
     elif mode == 'abstract':
@@ -116,43 +190,21 @@ def edge_detection(image, mode='normal', blur_level=0, threshold_level=0, sketch
         # This will create more sparse, abstract edge representations
         
         # Canny with high thresholds for more sparse edges
-        canny_high = cv2.Canny(gray, 150, 250)
+        canny_high = bank.canny(150, 250)
         
         # Dilated edges for thicker, more abstract lines
         kernel = np.ones((3, 3), np.uint8)
         canny_dilated = cv2.dilate(canny_high, kernel, iterations=2)
         
-        # Sobel with higher threshold
-        sobel_abstract = sobel(gray)
-        # Apply threshold to make it more abstract
+        # Sobel, Laplacian and Scharr with a threshold to make them more abstract
         threshold_value = 50 + (20 * threshold_level)
-        _, sobel_abstract_thresh = cv2.threshold(
-            (sobel_abstract / sobel_abstract.max() * 255).astype(np.uint8), 
-            threshold_value, 255, cv2.THRESH_BINARY
-        )
-        
-        # Laplacian with custom post-processing
-        laplacian_abstract = cv2.Laplacian(gray, cv2.CV_64F)
-        laplacian_abstract = np.uint8(np.absolute(laplacian_abstract))
-        # Apply threshold
-        _, laplacian_abstract_thresh = cv2.threshold(
-            laplacian_abstract, threshold_value, 255, cv2.THRESH_BINARY
-        )
-        
-        # Scharr with custom post-processing
-        scharr_abstract = scharr(gray)
-        scharr_abstract = (scharr_abstract / scharr_abstract.max() * 255).astype(np.uint8)
-        # Apply threshold
-        _, scharr_abstract_thresh = cv2.threshold(
-            scharr_abstract, threshold_value, 255, cv2.THRESH_BINARY
-        )
         
         edge_images = {
             'Abstract_Canny': canny_high,
             'Dilated_Canny': canny_dilated,
-            'Abstract_Sobel': sobel_abstract_thresh,
-            'Abstract_Laplacian': laplacian_abstract_thresh,
-            'Abstract_Scharr': scharr_abstract_thresh
+            'Abstract_Sobel': bank.threshold('sobel', threshold_value),
+            'Abstract_Laplacian': bank.threshold('laplacian', threshold_value),
+            'Abstract_Scharr': bank.threshold('scharr', threshold_value)
         }
         
     elif mode == 'blur':
@@ -161,30 +213,14 @@ def edge_detection(image, mode='normal', blur_level=0, threshold_level=0, sketch
         # Apply additional blur to the edges
         blur_kernel = 2 * (blur_level + 2) + 1
         
-        # Canny with blur
-        canny_edges = cv2.Canny(gray, 100, 200)
-        canny_blur = cv2.GaussianBlur(canny_edges, (blur_kernel, blur_kernel), 0)
-        
-        # Sobel with blur
-        sobel_edges = sobel(gray)
-        sobel_edges = (sobel_edges / sobel_edges.max() * 255).astype(np.uint8)
-        sobel_blur = cv2.GaussianBlur(sobel_edges, (blur_kernel, blur_kernel), 0)
-        
-        # Laplacian with blur
-        laplacian_edges = cv2.Laplacian(gray, cv2.CV_64F)
-        laplacian_edges = np.uint8(np.absolute(laplacian_edges))
-        laplacian_blur = cv2.GaussianBlur(laplacian_edges, (blur_kernel, blur_kernel), 0)
-        
-        # Scharr with blur
-        scharr_edges = scharr(gray)
-        scharr_edges = (scharr_edges / scharr_edges.max() * 255).astype(np.uint8)
-        scharr_blur = cv2.GaussianBlur(scharr_edges, (blur_kernel, blur_kernel), 0)
+        def blur(edges):
+            return cv2.GaussianBlur(edges, (blur_kernel, blur_kernel), 0)
         
         edge_images = {
-            'Blurred_Canny': canny_blur,
-            'Blurred_Sobel': sobel_blur,
-            'Blurred_Laplacian': laplacian_blur,
-            'Blurred_Scharr': scharr_blur
+            'Blurred_Canny': blur(bank.canny(100, 200)),
+            'Blurred_Sobel': blur(bank.sobel()),
+            'Blurred_Laplacian': blur(bank.laplacian()),
+            'Blurred_Scharr': blur(bank.scharr())
         }
         
     elif mode == 'sketch':
@@ -199,22 +235,16 @@ def edge_detection(image, mode='normal', blur_level=0, threshold_level=0, sketch
         
         # Blend inverted and blurred images using color dodge
         sketch = cv2.divide(gray, 255 - blurred, scale=256)
-        
-        # Canny on sketch
-        canny_sketch = cv2.Canny(sketch, 50, 150)
-        
-        # Standard edges on sketch
-        sobel_sketch = sobel(sketch)
-        sobel_sketch = (sobel_sketch / sobel_sketch.max() * 255).astype(np.uint8)
+        sketch_bank = EdgeFeatureBank(sketch)
         
         # Create pencil sketch effect
-        pencil_sketch = cv2.divide(gray, cv2.GaussianBlur(gray, (blur_kernel, blur_kernel), 0) + 1, scale=256)
+        pencil_sketch = cv2.divide(gray, bank.blurred(blur_kernel).gray + 1, scale=256)
         
         edge_images = {
             'Pencil_Sketch': pencil_sketch,
             'Sketch_Base': sketch,
-            'Sketch_Canny': canny_sketch,
-            'Sketch_Sobel': sobel_sketch
+            'Sketch_Canny': sketch_bank.canny(50, 150),
+            'Sketch_Sobel': sketch_bank.sobel()
         }
     
     # Apply additional post-processing if threshold_level is set
@@ -233,7 +263,8 @@ def edge_detection(image, mode='normal', blur_level=0, threshold_level=0, sketch
     
     return edge_images
 
-def plot_edge_images(original_image, edge_images, output_dir='.', base_filename='', id = 0):
+@traced('sheet.compared')
+def plot_edge_images(original_image, edge_images, output_dir='.', base_filename='', id = 0, renderer='opencv', writer=None):
     """
     Plot the original image along with all edge detection results
     
@@ -242,7 +273,17 @@ def plot_edge_images(original_image, edge_images, output_dir='.', base_filename=
         edge_images (dict): Dictionary containing edge images from different methods
         output_dir (str): Directory to save output files
         base_filename (str): Base name for the output file
+        renderer (str): 'opencv' or 'matplotlib', see use_compositor
+        writer (AsyncImageWriter): Optional writer to queue the file on
     """
+    save_path = os.path.join(output_dir, f"{base_filename}_compared{id}.png")
+    if use_compositor(renderer):
+        sheet = compose_edge_sheet(edge_images, original_image)
+        save_sheet(sheet, save_path, writer)
+        print(f"Saved comparison to {save_path}")
+        show_sheet(sheet)
+        return
+    
     # Calculate the number of subplots needed
     n_methods = len(edge_images) + 1  # +1 for the original image
     
@@ -263,13 +304,13 @@ def plot_edge_images(original_image, edge_images, output_dir='.', base_filename=
     plt.tight_layout()
     
     # Save the figure
-    save_path = os.path.join(output_dir, f"{base_filename}_compared{id}.png")
-    plt.savefig(save_path, bbox_inches='tight', dpi=300)
+    save_plot(save_path, writer)
     print(f"Saved comparison to {save_path}")
     
-    plt.show()
+    show_figure()
 
-def question_generator(edge_images, color_counts, output_dir='.', base_filename='', n=5, id = 0):
+@traced('sheet.question')
+def question_generator(edge_images, color_counts, output_dir='.', base_filename='', n=5, id = 0, renderer='opencv', writer=None):
     """
     Combine edge detection results and top colors visualization into a single figure
     
@@ -279,12 +320,23 @@ def question_generator(edge_images, color_counts, output_dir='.', base_filename=
         output_dir (str): Directory to save output files
         base_filename (str): Base name for the output file
         n (int): Number of top colors to display
+        renderer (str): 'opencv' or 'matplotlib', see use_compositor
+        writer (AsyncImageWriter): Optional writer to queue the file on
     """
     # Sort colors by count (descending)
     sorted_colors = sorted(color_counts.items(), key=lambda x: x[1], reverse=True)
     
     # Get the top N colors and their counts
     top_n_colors = sorted_colors[:n]
+    
+    save_path = os.path.join(output_dir, f"{base_filename}_question{id}.png")
+    if use_compositor(renderer):
+        sheet = compose_question_sheet(edge_images, top_n_colors)
+        save_sheet(sheet, save_path, writer)
+        print(f"Saved question visualization to {save_path}")
+        show_sheet(sheet)
+        return
+    
     colors = [np.array(color) / 255 for color, _ in top_n_colors]
     counts = [count for _, count in top_n_colors]
     
@@ -323,37 +375,40 @@ def question_generator(edge_images, color_counts, output_dir='.', base_filename=
     plt.suptitle("Edge Detection Methods and Top Colors", fontsize=16, y=1.05)
     
     # Save the figure
-    save_path = os.path.join(output_dir, f"{base_filename}_question{id}.png")
-    plt.savefig(save_path, bbox_inches='tight', dpi=300)
+    save_plot(save_path, writer)
     print(f"Saved question visualization to {save_path}")
     
-    plt.show()
+    show_figure()
 
-def color_extract(image, n_colors=10):
+@traced('color.extract')
+def color_extract(image, n_colors=10, method='histogram'):
     """
-    Extract all colors used in the input image (using K-means clustering to reduce colors)
+    Extract all colors used in the input image (using color quantization to reduce colors)
     
     Args:
         image (numpy.ndarray): Input image
         n_colors (int): Number of dominant colors to extract
+        method (str): Palette engine - 'kmeans' (exact, every pixel), 'histogram'
+                      (K-means over a weighted color histogram) or 'median_cut'
         
     Returns:
         list: List of RGB colors found in the image
-        numpy.ndarray: Image with reduced colors
+        numpy.ndarray: Image with reduced colors (uint8)
     """
-    # Reshape the image to be a list of pixels
-    pixels = image.reshape(-1, 3)
+    def compute():
+        colors, index_map = quantize(image, n_colors, method=method, random_state=42)
+        return {'colors': colors, 'labels': index_map}
     
-    # Apply K-means clustering to find dominant colors
-    kmeans = KMeans(n_clusters=n_colors, random_state=42)
-    kmeans.fit(pixels)
+    # The palette is cached per image and parameters
+    cache = get_cache()
+    params = {'n_colors': n_colors, 'method': method, 'random_state': 42}
+    palette = cache.cached(image, 'palette', params, compute) if cache else compute()
     
     # Get the colors
-    colors = kmeans.cluster_centers_.astype(int)
+    colors = palette['colors']
     
-    # Recreate the image with only the n_colors
-    labels = kmeans.predict(pixels)
-    quantized_image = colors[labels].reshape(image.shape)
+    # Recreate the image with only the n_colors through the palette lookup table
+    quantized_image = colors.astype(np.uint8)[palette['labels']]
     
     return colors, quantized_image
 
@@ -379,27 +434,36 @@ def function_C(image, target_color, tolerance=10):
     
     return pixel_count, mask
 
-def get_color_distribution(image, colors):
+@traced('color.distribution')
+def get_color_distribution(image, colors, tolerance=10, return_index_map=False):
     """
     Get the distribution of number of pixels of all types of colors
     
+    Every pixel is assigned to at most one color in a single pass: the nearest
+    color among those within tolerance on every channel.
+    
     Args:
         image (numpy.ndarray): Input image
         colors (numpy.ndarray): Array of colors to analyze
+        tolerance (int): Tolerance for color matching (None assigns every pixel)
+        return_index_map (bool): Also return the per-pixel color index map
         
     Returns:
         dict: Dictionary mapping colors (as tuples) to pixel counts
+        numpy.ndarray: Color index map (len(colors) = unmatched), only with return_index_map
     """
-    color_counts = {}
+    counts, index_map = assign_palette(image, colors, tolerance)
     
-    for color in colors:
-        pixel_count, _ = function_C(image, color)
-        color_tuple = tuple(color)
-        color_counts[color_tuple] = pixel_count
+    color_counts = {}
+    for color, pixel_count in zip(colors, counts):
+        color_counts[tuple(color)] = int(pixel_count)
     
+    if return_index_map:
+        return color_counts, index_map
     return color_counts
 
-def plot_color_distribution(color_counts, output_dir='.', base_filename=''):
+@traced('sheet.distribution')
+def plot_color_distribution(color_counts, output_dir='.', base_filename='', writer=None):
     """
     Create a bar chart showing the distribution of each color type and its pixel count
     
@@ -407,6 +471,7 @@ def plot_color_distribution(color_counts, output_dir='.', base_filename=''):
         color_counts (dict): Dictionary mapping colors to pixel counts
         output_dir (str): Directory to save output files
         base_filename (str): Base name for the output file
+        writer (AsyncImageWriter): Optional writer to queue the file on
     """
     # Sort colors by count for better visualization
     sorted_colors = sorted(color_counts.items(), key=lambda x: x[1], reverse=True)
@@ -448,12 +513,13 @@ def plot_color_distribution(color_counts, output_dir='.', base_filename=''):
     
     # Save the figure
     save_path = os.path.join(output_dir, f"{base_filename}_color_distribution.png")
-    plt.savefig(save_path, bbox_inches='tight', dpi=300)
+    save_plot(save_path, writer)
     print(f"Saved color distribution to {save_path}")
     
-    plt.show()
+    show_figure()
 
-def plot_top_colors(color_counts, output_dir='.', base_filename='', n=5):
+@traced('sheet.top_colors')
+def plot_top_colors(color_counts, output_dir='.', base_filename='', n=5, renderer='opencv', writer=None):
     """
     Plot the top N colors as a color bar with hex color codes
     
@@ -462,12 +528,23 @@ def plot_top_colors(color_counts, output_dir='.', base_filename='', n=5):
         output_dir (str): Directory to save output files
         base_filename (str): Base name for the output file
         n (int): Number of top colors to display
+        renderer (str): 'opencv' or 'matplotlib', see use_compositor
+        writer (AsyncImageWriter): Optional writer to queue the file on
     """
     # Sort colors by count (descending)
     sorted_colors = sorted(color_counts.items(), key=lambda x: x[1], reverse=True)
     
     # Get the top N colors and their counts
     top_n_colors = sorted_colors[:n]
+    
+    save_path = os.path.join(output_dir, f"{base_filename}_top5_color.png")
+    if use_compositor(renderer):
+        sheet = compose_top_colors_sheet(top_n_colors)
+        save_sheet(sheet, save_path, writer)
+        print(f"Saved top colors to {save_path}")
+        show_sheet(sheet)
+        return
+    
     colors = [np.array(color) / 255 for color, _ in top_n_colors]
     counts = [count for _, count in top_n_colors]
     
@@ -490,13 +567,13 @@ def plot_top_colors(color_counts, output_dir='.', base_filename='', n=5):
     plt.tight_layout()
     
     # Save the figure
-    save_path = os.path.join(output_dir, f"{base_filename}_top5_color.png")
-    plt.savefig(save_path, bbox_inches='tight', dpi=300)
+    save_plot(save_path, writer)
     print(f"Saved top colors to {save_path}")
     
-    plt.show()
+    show_figure()
 
-def plot_reduced_image(original_image, quantized_image, output_dir='.', base_filename=''):
+@traced('sheet.reduced')
+def plot_reduced_image(original_image, quantized_image, output_dir='.', base_filename='', writer=None):
     """
     Plot the original image alongside the quantized (reduced color) image
     
@@ -505,6 +582,7 @@ def plot_reduced_image(original_image, quantized_image, output_dir='.', base_fil
         quantized_image (numpy.ndarray): The image with reduced colors
         output_dir (str): Directory to save output files
         base_filename (str): Base name for the output file
+        writer (AsyncImageWriter): Optional writer to queue the file on
     """
     plt.figure(figsize=(10, 6))
     plt.subplot(1, 2, 1)
@@ -520,19 +598,28 @@ def plot_reduced_image(original_image, quantized_image, output_dir='.', base_fil
     
     # Save the figure
     save_path = os.path.join(output_dir, f"{base_filename}_reduced_result.png")
-    plt.savefig(save_path, bbox_inches='tight', dpi=300)
+    save_plot(save_path, writer)
     print(f"Saved reduced color result to {save_path}")
     
-    plt.show()
+    show_figure()
 
-def main(image_path, output_dir='.'):
+def main(image_path, output_dir='.', outputs=PIPE_1_OUTPUTS, renderer='opencv', writer=None):
     """
     Main function to process the image and display results
     
     Args:
         image_path (str): Path to the input image
         output_dir (str): Directory to save output files
+        outputs (tuple): Figures to produce, a subset of PIPE_1_OUTPUTS;
+                         stages that no selected figure needs are skipped
+        renderer (str): 'opencv' compositor or 'matplotlib' for the edge, top color
+                        and question sheets
+        writer (AsyncImageWriter): Optional writer shared across images; by
+                                   default one is created and closed here
     """
+    own_writer = writer is None
+    if own_writer:
+        writer = AsyncImageWriter()
     try:
         # Create output directory if it doesn't exist
         os.makedirs(output_dir, exist_ok=True)
@@ -540,33 +627,43 @@ def main(image_path, output_dir='.'):
         # Get the base filename without extension for saving output files
         base_filename = os.path.splitext(os.path.basename(image_path))[0]
         
+        need_edges = any(name in outputs for name in ('compared', 'edges', 'question'))
+        need_colors = any(name in outputs for name in ('reduced', 'distribution', 'top_colors', 'question'))
+        
         # 1. Load the input image
         print(f"Loading image from {image_path}...")
         original_image = load_image(image_path)
         
         # 2. Apply edge detection methods
-        print("Applying edge detection methods...")
-        modes = ['normal', 'abstract', 'blur', 'sketch']
         edge_images = []
-        for mode in modes:
-            edge_image = edge_detection( original_image, mode = mode)
-            edge_images.append(edge_image)
+        if need_edges:
+            print("Applying edge detection methods...")
+            modes = ['normal', 'abstract', 'blur', 'sketch']
+            bank = EdgeFeatureBank(original_image)
+            for mode in modes:
+                edge_image = edge_detection( original_image, mode = mode, bank = bank)
+                edge_images.append(edge_image)
 
         
         # 3. Plot the original image and edge detection results
-        print("Plotting edge detection results with original image...")
-        id = 0
-        for edge_image in edge_images:
-            id+=1
-            plot_edge_images(original_image, edge_image, output_dir, base_filename, id = id)
+        if 'compared' in outputs:
+            print("Plotting edge detection results with original image...")
+            id = 0
+            for edge_image in edge_images:
+                id+=1
+                plot_edge_images(original_image, edge_image, output_dir, base_filename, id = id, renderer = renderer, writer = writer)
         
         # 4. Plot edge detection results without original image
-        print("Plotting edge detection results without original image...")
+        if 'edges' in outputs:
+            print("Plotting edge detection results without original image...")
+            
+            id = 0
+            for edge_image in edge_images:
+                id+=1
+                plot_edge_images_withoutOri(edge_image, output_dir, base_filename, id = id, renderer = renderer, writer = writer)
         
-        id = 0
-        for edge_image in edge_images:
-            id+=1
-            plot_edge_images_withoutOri(edge_image, output_dir, base_filename, id = id)
+        if not need_colors:
+            return
         
         # 5. Extract dominant colors
         print("Extracting dominant colors...")
@@ -577,23 +674,27 @@ def main(image_path, output_dir='.'):
         color_counts = get_color_distribution(original_image, colors)
         
         # 7. Plot the quantized image (with reduced colors)
-        print("Plotting reduced color result...")
-        plot_reduced_image(original_image, quantized_image, output_dir, base_filename)
+        if 'reduced' in outputs:
+            print("Plotting reduced color result...")
+            plot_reduced_image(original_image, quantized_image, output_dir, base_filename, writer = writer)
         
         # 8. Plot histogram of color distribution
-        print("Plotting histogram of color distribution...")
-        plot_color_distribution(color_counts, output_dir, base_filename)
+        if 'distribution' in outputs:
+            print("Plotting histogram of color distribution...")
+            plot_color_distribution(color_counts, output_dir, base_filename, writer = writer)
         
         # 9. Plot top 5 colors with hex codes
-        print("Plotting top 5 colors...")
-        plot_top_colors(color_counts, output_dir, base_filename)
+        if 'top_colors' in outputs:
+            print("Plotting top 5 colors...")
+            plot_top_colors(color_counts, output_dir, base_filename, renderer = renderer, writer = writer)
         
         # 10. Generate question visualization
-        print("Generating combined visualization...")
-        id = 0
-        for edge_image in edge_images:
-            id+=1
-            question_generator(edge_image, color_counts, output_dir, base_filename, id = id)
+        if 'question' in outputs:
+            print("Generating combined visualization...")
+            id = 0
+            for edge_image in edge_images:
+                id+=1
+                question_generator(edge_image, color_counts, output_dir, base_filename, id = id, renderer = renderer, writer = writer)
         
         # 11. Print color information with hex codes
         print("\nDominant Colors in the Image:")
@@ -604,10 +705,77 @@ def main(image_path, output_dir='.'):
         
     except Exception as e:
         print(f"Error: {e}")
+    finally:
+        if own_writer:
+            writer.close()
 
-if __name__ == "__main__":
-    image_path = "alan.jpg"
+def run_batch(input_dir, output_dir, outputs=PIPE_1_OUTPUTS, names=None, renderer='opencv', writer=None,
+              memory_budget=None):
+    """
+    Run the pipeline headless over every image below a directory
     
-    output_dir = "pipe_1"
+    The output tree mirrors the input tree, e.g. dataset_resized/<anime>/<anime>_n/3.jpg
+    is written to <output_dir>/<anime>/<anime>_n/3_*.png.
     
-    main(image_path, output_dir)
\ No newline at end of file
+    Args:
+        input_dir (str): Directory to walk, e.g. dataset_resized
+        output_dir (str): Root of the output tree
+        outputs (tuple): Figures to produce, a subset of PIPE_1_OUTPUTS
+        names (tuple): Only process files with these names, e.g. ('original.jpg',)
+        renderer (str): 'opencv' or 'matplotlib', see use_compositor
+        writer (AsyncImageWriter): Optional writer to queue the file on
+        memory_budget (int or str): RSS limit in bytes or e.g. '2G'; over it, the
+                                    queued outputs are written before the next image
+    
+    Returns:
+        int: Number of images processed
+    """
+    set_headless(True)
+    image_paths = image_io.find_image_files(input_dir, names)
+    
+    budget = MemoryBudget(memory_budget)
+    
+    start = time.perf_counter()
+    with ensure_writer(writer) as writer:
+        for idx, image_path in enumerate(image_paths, start=1):
+            budget.drain(writer.flush)
+            print(f"[{idx}/{len(image_paths)}] {image_path}")
+            relative_dir = os.path.relpath(os.path.dirname(image_path), input_dir)
+            with span('image', path=image_path):
+                main(image_path, os.path.join(output_dir, relative_dir), outputs, renderer, writer)
+        writer.flush()
+    
+    print(f"Processed {len(image_paths)} images in {time.perf_counter() - start:.2f}s")
+    writer.report()
+    budget.report()
+    return len(image_paths)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Edge and color figures for one image or a whole image tree")
+    parser.add_argument('image_path', nargs='?', default="alan.jpg", help="Image to process")
+    parser.add_argument('--output-dir', default="pipe_1", help="Directory to save output files")
+    parser.add_argument('--batch', metavar='DIR',
+                        help="Process every image below DIR headless instead, e.g. dataset_resized")
+    parser.add_argument('--names', nargs='+', help="With --batch, only process files with these names")
+    parser.add_argument('--outputs', nargs='+', choices=PIPE_1_OUTPUTS, default=list(PIPE_1_OUTPUTS),
+                        help="Figures to produce")
+    parser.add_argument('--headless', action='store_true', help="Save figures without showing them")
+    parser.add_argument('--renderer', choices=RENDERERS, default='opencv',
+                        help="Draw sheets with the fast OpenCV compositor or with 300 dpi matplotlib")
+    parser.add_argument('--memory-budget', type=parse_size, metavar='SIZE',
+                        help="With --batch, let queued outputs drain while the RSS is over SIZE, e.g. 2G")
+    parser.add_argument('--trace', metavar='PATH', help="Write a Chrome trace of the run to PATH")
+    parser.add_argument('--trace-memory', action='store_true',
+                        help="With --trace, also record tracemalloc and RSS high-water marks per span")
+    args = parser.parse_args()
+    
+    if args.trace:
+        tracing.enable(args.trace, memory=args.trace_memory)
+    
+    if args.batch:
+        run_batch(args.batch, args.output_dir, tuple(args.outputs), args.names, args.renderer,
+                  memory_budget=args.memory_budget)
+    else:
+        if args.headless:
+            set_headless(True)
+        main(args.image_path, args.output_dir, tuple(args.outputs), args.renderer)
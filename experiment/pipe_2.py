@@ -3,29 +3,47 @@ import cv2
 from sklearn.cluster import KMeans
 from collections import Counter
 import os
+import sys
+import time
+import argparse
 
-def load_image(image_path):
+# Shared helpers live next to the data creation scripts
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'create_data'))
+import image_io
+from superpixel_stats import render_mean_colors
+from stage_cache import get_cache
+from image_store import load_decoded
+from edge_features import EdgeFeatureBank
+from SLIC import DEFAULT_TOLERANCE, segment_slic
+from numpy_slic import SLICO
+from async_writer import AsyncImageWriter, ensure_writer
+from memory import MemoryBudget, parse_size
+from superpixel_tiles import tile_size_for_budget
+import tracing
+from tracing import span, traced
+
+# Images main can save; pass a subset as outputs to skip the others
+PIPE_2_OUTPUTS = ('combined_edges', 'improved_edges', 'slic')
+
+def load_image(image_path, target_size=None):
     """
     Load and convert from BGR to RGB 
     
     Args:
         image_path (str): Path to the image file
+        target_size (tuple): Optional (width, height) to resize with padding to,
+                             large JPEGs are then decoded at a reduced scale
         
     Returns:
         image (numpy.ndarray): The loaded image
     """
-    if not os.path.exists(image_path):
-        raise FileNotFoundError(f"Image file not found: {image_path}")
-    
-    image = cv2.imread(image_path)
-    if image is None:
-        raise ValueError(f"Failed to load image: {image_path}")
-    
     # Keep BGR for cv2.imshow
-    return image
+    return load_decoded(image_path, target_size)
 
+@traced('edges.combined')
 def combined_edge_detection(gray, canny_low=30, canny_high=100, 
-                          use_canny=True, use_sobel=True, use_laplacian=True):
+                          use_canny=True, use_sobel=True, use_laplacian=True, bank=None,
+                          show=True):
     """
     Combine multiple edge detection methods for better results
     
@@ -33,44 +51,57 @@ def combined_edge_detection(gray, canny_low=30, canny_high=100,
         gray: Grayscale image
         canny_low, canny_high: Canny edge detection thresholds
         use_canny, use_sobel, use_laplacian: Which methods to use
+        bank: Optional EdgeFeatureBank of gray to share gradients with other detectors
+        show: Display the edge maps and wait for a key press
     
     Returns:
         Combined edge map
     """
-    edges_combined = np.zeros_like(gray)
-    
-    # Apply Gaussian blur first
-    blurred = cv2.GaussianBlur(gray, (5, 5), 0)
-    
-    # Canny edge detection
-    if use_canny:
-        edges_canny = cv2.Canny(blurred, canny_low, canny_high)
-        edges_combined = cv2.bitwise_or(edges_combined, edges_canny)
-        cv2.imshow("Canny Edges", edges_canny)
-    
-    # Sobel edge detection
-    if use_sobel:
-        sobel_x = cv2.Sobel(blurred, cv2.CV_64F, 1, 0, ksize=3)
-        sobel_y = cv2.Sobel(blurred, cv2.CV_64F, 0, 1, ksize=3)
-        sobel_mag = np.sqrt(sobel_x**2 + sobel_y**2)
-        sobel_mag = np.uint8(sobel_mag / np.max(sobel_mag) * 255)
-        _, edges_sobel = cv2.threshold(sobel_mag, 100, 255, cv2.THRESH_BINARY)
-        edges_combined = cv2.bitwise_or(edges_combined, edges_sobel)
-        cv2.imshow("Sobel Edges", edges_sobel)
+    def compute():
+        edge_maps = {}
+        edges_combined = np.zeros_like(gray)
+        
+        # Apply Gaussian blur first
+        blurred = (bank or EdgeFeatureBank(gray)).blurred(5)
+        
+        # Canny edge detection
+        if use_canny:
+            edge_maps['canny'] = blurred.canny(canny_low, canny_high)
+            edges_combined = cv2.bitwise_or(edges_combined, edge_maps['canny'])
+        
+        # Sobel edge detection
+        if use_sobel:
+            edge_maps['sobel'] = blurred.threshold('sobel_magnitude', 100)
+            edges_combined = cv2.bitwise_or(edges_combined, edge_maps['sobel'])
+        
+        # Laplacian edge detection
+        if use_laplacian:
+            edge_maps['laplacian'] = blurred.threshold('laplacian', 30)
+            edges_combined = cv2.bitwise_or(edges_combined, edge_maps['laplacian'])
+        
+        edge_maps['combined'] = edges_combined
+        return edge_maps
     
-    # Laplacian edge detection
-    if use_laplacian:
-        laplacian = cv2.Laplacian(blurred, cv2.CV_64F)
-        laplacian = np.uint8(np.absolute(laplacian))
-        _, edges_laplacian = cv2.threshold(laplacian, 30, 255, cv2.THRESH_BINARY)
-        edges_combined = cv2.bitwise_or(edges_combined, edges_laplacian)
-        cv2.imshow("Laplacian Edges", edges_laplacian)
+    # Edge maps are cached per image and parameters
+    cache = get_cache()
+    params = {'canny_low': canny_low, 'canny_high': canny_high, 'use_canny': use_canny,
+              'use_sobel': use_sobel, 'use_laplacian': use_laplacian}
+    edge_maps = cache.cached(gray, 'combined_edges', params, compute) if cache else compute()
     
-    cv2.imshow("Combined Edges", edges_combined)
-    cv2.waitKey(0)
+    if show:
+        if 'canny' in edge_maps:
+            cv2.imshow("Canny Edges", edge_maps['canny'])
+        if 'sobel' in edge_maps:
+            cv2.imshow("Sobel Edges", edge_maps['sobel'])
+        if 'laplacian' in edge_maps:
+            cv2.imshow("Laplacian Edges", edge_maps['laplacian'])
+        
+        cv2.imshow("Combined Edges", edge_maps['combined'])
+        cv2.waitKey(0)
     
-    return edges_combined
+    return edge_maps['combined']
 
+@traced('edges.improve')
 def improve_edges(edges, morph_close_size=3, morph_close_iterations=2, 
                  morph_dilate_size=3, morph_dilate_iterations=1):
     """
@@ -131,7 +162,9 @@ def main(image_path, output_dir='.',
          min_contour_area=100,
          # SLIC parameters
          slic_region_size=30, slic_ruler=10.0, slic_iterations=10,
-         slic_algorithm=cv2.ximgproc.SLICO):
+         slic_algorithm=SLICO, slic_tolerance=None, slic_tile_size=None,
+         # Batch parameters
+         outputs=PIPE_2_OUTPUTS, show=True, writer=None):
     """
     Main function with tunable parameters
     
@@ -151,7 +184,21 @@ def main(image_path, output_dir='.',
         slic_ruler: Smoothness factor (larger = smoother boundaries)
         slic_iterations: Number of iterations
         slic_algorithm: SLIC variant (SLIC, SLICO, or MSLIC)
+        slic_tolerance: Stop iterating once fewer than this fraction of pixels
+                        change label, slic_iterations is then the maximum
+        slic_tile_size: Segment in overlapping tiles of about this many pixels
+                        a side, so SLIC's memory no longer grows with the image
+        
+        Batch parameters:
+        outputs: Images to save, a subset of PIPE_2_OUTPUTS; stages that no
+                 selected output needs are skipped
+        show: Display every stage and wait for a key press; False never opens a window
+        writer: Optional AsyncImageWriter shared across images; by default one
+                is created and closed here
     """
+    own_writer = writer is None
+    if own_writer:
+        writer = AsyncImageWriter()
     try:
         # Ensure output directory exists
         if not os.path.exists(output_dir):
@@ -163,77 +210,67 @@ def main(image_path, output_dir='.',
         # 1. Load the input image
         print(f"Loading image from {image_path}...")
         img = load_image(image_path)
-        cv2.imshow("Original Image", img)
-        cv2.waitKey(0)
-        
-        # Create grayscale version
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        
-        # 2. Enhanced Contour-Based Segmentation
-        print("Applying Enhanced Contour-Based Segmentation...")
-        
-        # Combined edge detection
-        edges = combined_edge_detection(gray, canny_low, canny_high, 
-                                      use_canny, use_sobel, use_laplacian)
-        
-        # Improve edges
-        improved_edges = improve_edges(edges, morph_close_size, morph_close_iterations,
-                                     morph_dilate_size, morph_dilate_iterations)
-        
-        cv2.imshow("Improved Edges", improved_edges)
-        cv2.waitKey(0)
-        
-       
-        
-        # 3. Superpixel Segmentation (SLIC) with tunable parameters
-        print("\nApplying Superpixel Segmentation with custom parameters...")
-        print(f"SLIC parameters: region_size={slic_region_size}, ruler={slic_ruler}, iterations={slic_iterations}")
+        if show:
+            cv2.imshow("Original Image", img)
+            cv2.waitKey(0)
         
-        try:
-            # Create SLIC with custom parameters
-            slic = cv2.ximgproc.createSuperpixelSLIC(img, algorithm=slic_algorithm, 
-                                                    region_size=slic_region_size, 
-                                                    ruler=slic_ruler)
-            slic.iterate(slic_iterations)
+        if 'combined_edges' in outputs or 'improved_edges' in outputs:
+            # Grayscale version, from the image store when COLORWEB_IMAGE_STORE=on
+            gray = load_decoded(image_path, variant='gray')
             
-            # Get the labels and number of superpixels
-            labels = slic.getLabels()
-            n_segments = slic.getNumberOfSuperpixels()
+            # 2. Enhanced Contour-Based Segmentation
+            print("Applying Enhanced Contour-Based Segmentation...")
             
-            print(f"Number of superpixels: {n_segments}")
+            # Combined edge detection
+            edges = combined_edge_detection(gray, canny_low, canny_high, 
+                                          use_canny, use_sobel, use_laplacian, show=show)
             
-            # Create mask showing superpixel boundaries
-            mask_slic = slic.getLabelContourMask()
+            # Improve edges
+            improved_edges = improve_edges(edges, morph_close_size, morph_close_iterations,
+                                         morph_dilate_size, morph_dilate_iterations)
             
-            # Color the superpixels with their average color
-            superpixel_result = img.copy()
-            for i in range(n_segments):
-                mask = labels == i
-                superpixel_result[mask] = np.mean(img[mask], axis=0)
+            if show:
+                cv2.imshow("Improved Edges", improved_edges)
+                cv2.waitKey(0)
+        
+        # 3. Superpixel Segmentation (SLIC) with tunable parameters
+        if 'slic' in outputs:
+            print("\nApplying Superpixel Segmentation with custom parameters...")
+            print(f"SLIC parameters: region_size={slic_region_size}, ruler={slic_ruler}, iterations={slic_iterations}")
             
-            # Add boundaries
-            superpixel_result[mask_slic == 255] = [0, 255, 0]
+            # Labels, superpixel count and boundary mask, cached per image and parameters
+            labels, n_segments, mask_slic, info = segment_slic(img, slic_region_size, slic_ruler,
+                                                               slic_iterations, slic_algorithm,
+                                                               with_contours=True, tolerance=slic_tolerance,
+                                                               return_info=True, tile_size=slic_tile_size)
             
-            cv2.imshow("SLIC Superpixel Result", superpixel_result)
-            cv2.waitKey(0)
+            print(f"Number of superpixels: {n_segments} after {info['iterations']} iterations")
+            
+            # Color the superpixels with their average color and add boundaries
+            with span('slic.render', segments=n_segments):
+                superpixel_result = render_mean_colors(img, labels, boundary_mask=mask_slic,
+                                                       boundary_color=(0, 255, 0))
+            
+            if show:
+                cv2.imshow("SLIC Superpixel Result", superpixel_result)
+                cv2.waitKey(0)
             
             # Save SLIC result
             output_path = os.path.join(output_dir, f"{base_filename}_slic.jpg")
-            cv2.imwrite(output_path, superpixel_result)
-            
-        except AttributeError:
-            print("SLIC not available in your OpenCV installation")
-            print("To use SLIC, install opencv-contrib-python: pip install opencv-contrib-python")
+            writer.write(output_path, superpixel_result)
         
         # Close all windows
-        cv2.destroyAllWindows()
+        if show:
+            cv2.destroyAllWindows()
         
         # Save results
-        output_path = os.path.join(output_dir, f"{base_filename}_combined_edges.jpg")
-        cv2.imwrite(output_path, edges)
+        if 'combined_edges' in outputs:
+            output_path = os.path.join(output_dir, f"{base_filename}_combined_edges.jpg")
+            writer.write(output_path, edges)
         
-        output_path = os.path.join(output_dir, f"{base_filename}_improved_edges.jpg")
-        cv2.imwrite(output_path, improved_edges)
+        if 'improved_edges' in outputs:
+            output_path = os.path.join(output_dir, f"{base_filename}_improved_edges.jpg")
+            writer.write(output_path, improved_edges)
         
         print(f"\nResults saved to {output_dir}")
         
@@ -241,16 +278,81 @@ def main(image_path, output_dir='.',
         print(f"Error: {e}")
         import traceback
         traceback.print_exc()
+    finally:
+        if own_writer:
+            writer.close()
+
+def run_batch(input_dir, output_dir, outputs=PIPE_2_OUTPUTS, names=None, writer=None, memory_budget=None,
+              **params):
+    """
+    Run the pipeline over every image below a directory without opening any window
+    
+    The output tree mirrors the input tree, e.g. dataset_resized/<anime>/<anime>_n/3.jpg
+    is written to <output_dir>/<anime>/<anime>_n/3_*.jpg.
+    
+    Args:
+        input_dir (str): Directory to walk, e.g. dataset_resized
+        output_dir (str): Root of the output tree
+        outputs (tuple): Images to save, a subset of PIPE_2_OUTPUTS
+        names (tuple): Only process files with these names, e.g. ('original.jpg',)
+        writer (AsyncImageWriter): Optional writer; by default one is shared by all images
+        memory_budget (int or str): RSS limit in bytes or e.g. '2G'; over it, the
+                                    queued outputs are written before the next image
+        **params: Contour and SLIC parameters passed on to main
+    
+    Returns:
+        int: Number of images processed
+    """
+    image_paths = image_io.find_image_files(input_dir, names)
+    
+    budget = MemoryBudget(memory_budget)
+    
+    start = time.perf_counter()
+    with ensure_writer(writer) as writer:
+        for idx, image_path in enumerate(image_paths, start=1):
+            budget.drain(writer.flush)
+            print(f"[{idx}/{len(image_paths)}] {image_path}")
+            relative_dir = os.path.relpath(os.path.dirname(image_path), input_dir)
+            with span('image', path=image_path):
+                main(image_path, os.path.join(output_dir, relative_dir), outputs=outputs, show=False,
+                     writer=writer, **params)
+        writer.flush()
+    
+    print(f"Processed {len(image_paths)} images in {time.perf_counter() - start:.2f}s")
+    writer.report()
+    budget.report()
+    return len(image_paths)
 
 if __name__ == "__main__":
-    # Replace with your image path
-    image_path = "alan.jpg"
+    parser = argparse.ArgumentParser(description="Contour and superpixel segmentation for one image "
+                                                 "or a whole image tree")
+    parser.add_argument('image_path', nargs='?', default="alan.jpg", help="Image to process")
+    parser.add_argument('--output-dir', default="pipe_2", help="Directory to save output files")
+    parser.add_argument('--batch', metavar='DIR',
+                        help="Process every image below DIR without windows instead, e.g. dataset_resized")
+    parser.add_argument('--names', nargs='+', help="With --batch, only process files with these names")
+    parser.add_argument('--outputs', nargs='+', choices=PIPE_2_OUTPUTS, default=list(PIPE_2_OUTPUTS),
+                        help="Images to save")
+    parser.add_argument('--no-show', action='store_true', help="Save results without opening windows")
+    parser.add_argument('--slic-tolerance', type=float, nargs='?', const=DEFAULT_TOLERANCE,
+                        help="Stop SLIC early once fewer than this fraction of pixels change label "
+                             f"(default {DEFAULT_TOLERANCE} when given without a value)")
+    parser.add_argument('--slic-tile-size', type=int, metavar='PIXELS',
+                        help="Segment large images in tiles of about PIXELS a side to bound SLIC's memory")
+    parser.add_argument('--slic-memory', type=parse_size, metavar='SIZE',
+                        help="Pick the SLIC tile size so one tile fits in SIZE, e.g. 256M")
+    parser.add_argument('--memory-budget', type=parse_size, metavar='SIZE',
+                        help="With --batch, let queued outputs drain while the RSS is over SIZE, e.g. 2G")
+    parser.add_argument('--trace', metavar='PATH', help="Write a Chrome trace of the run to PATH")
+    parser.add_argument('--trace-memory', action='store_true',
+                        help="With --trace, also record tracemalloc and RSS high-water marks per span")
+    args = parser.parse_args()
     
-    # Specify output directory for saved figures
-    output_dir = "pipe_2"
+    if args.trace:
+        tracing.enable(args.trace, memory=args.trace_memory)
     
-    # Call main with custom parameters
-    main(image_path, output_dir,
+    # Custom parameters
+    params = dict(
          # Contour parameters - tune these for better results
          canny_low=30,           # Lower value = more edges detected
          canny_high=100,         # Higher value = fewer edges detected  
@@ -267,5 +369,16 @@ if __name__ == "__main__":
          slic_region_size=30,    # Larger = fewer superpixels (try 30-100)
          slic_ruler=10.0,        # Higher = smoother boundaries (try 5-20)
          slic_iterations=30,     # More iterations = better convergence
-         slic_algorithm=cv2.ximgproc.SLICO  # SLIC variant (SLIC, SLICO, or MSLIC)
-    )
\ No newline at end of file
+         slic_algorithm=SLICO, # SLIC variant (SLIC, SLICO, or MSLIC)
+         slic_tolerance=args.slic_tolerance, # Stop early once the labels settle (try 0.06)
+         slic_tile_size=args.slic_tile_size  # Tile very large originals (try 1024)
+    )
+    
+    if args.slic_memory and not args.slic_tile_size:
+        params['slic_tile_size'] = tile_size_for_budget(args.slic_memory, params['slic_region_size'])
+    
+    if args.batch:
+        run_batch(args.batch, args.output_dir, tuple(args.outputs), args.names,
+                  memory_budget=args.memory_budget, **params)
+    else:
+        main(args.image_path, args.output_dir, outputs=tuple(args.outputs), show=not args.no_show, **params)
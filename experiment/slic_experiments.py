@@ -1,27 +1,51 @@
 import numpy as np
 import cv2
 import os
+import sys
+import json
+import hashlib
+import math
 import itertools
+import multiprocessing
+import multiprocessing.util
 from datetime import datetime
 
-def load_image(image_path):
+# Shared helpers live next to the data creation scripts
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'create_data'))
+from superpixel_stats import render_mean_colors
+from SLIC import segment_slic, slic_engine, solve_region_sizes
+from numpy_slic import ALGORITHMS
+from async_writer import AsyncImageWriter, ensure_writer
+from memory import MemoryBudget
+from image_store import load_decoded
+from tracing import span, traced
+
+# Manifest that records finished combinations of a resumable experiment
+MANIFEST_FILENAME = 'manifest.json'
+MANIFEST_VERSION = 1
+
+# Smallest region size a scored successive-halving run is shrunk to
+HALVING_MIN_REGION = 4
+
+# Grid of the best combination per region size in halving mode, apart from
+# the fixed-parameter grids a grid sweep writes to the same directory
+HALVING_GRID_FILENAME = 'grid_halving_best.jpg'
+
+def load_image(image_path, target_size=None):
     """
     Load image
     
     Args:
         image_path (str): Path to the image file
+        target_size (tuple): Optional (width, height) to resize with padding to,
+                             large JPEGs are then decoded at a reduced scale
         
     Returns:
         image (numpy.ndarray): The loaded image
     """
-    if not os.path.exists(image_path):
-        raise FileNotFoundError(f"Image file not found: {image_path}")
-    
-    image = cv2.imread(image_path)
-    if image is None:
-        raise ValueError(f"Failed to load image: {image_path}")
-    
-    return image
+    # Sweeps read the same image again and again, so they use the decoded-image
+    # store and repeat runs get a copy-on-write mapping from it
+    return load_decoded(image_path, target_size, use_store=True)
 
 def apply_slic(img, region_size, ruler, iterations, algorithm):
     """
@@ -37,34 +61,16 @@ def apply_slic(img, region_size, ruler, iterations, algorithm):
     Returns:
         tuple: (result image, number of superpixels)
     """
-    try:
-        # Create SLIC with custom parameters
-        slic = cv2.ximgproc.createSuperpixelSLIC(img, algorithm=algorithm, 
-                                                region_size=region_size, 
-                                                ruler=ruler)
-        slic.iterate(iterations)
-        
-        # Get the labels and number of superpixels
-        labels = slic.getLabels()
-        n_segments = slic.getNumberOfSuperpixels()
-        
-        # Create mask showing superpixel boundaries
-        mask_slic = slic.getLabelContourMask()
-        
-        # Color the superpixels with their average color
-        superpixel_result = img.copy()
-        for i in range(n_segments):
-            mask = labels == i
-            superpixel_result[mask] = np.mean(img[mask], axis=0)
-        
-        # Add boundaries in green
-        superpixel_result[mask_slic == 255] = [0, 255, 0]
-        
-        return superpixel_result, n_segments
-        
-    except AttributeError:
-        print("SLIC not available in your OpenCV installation")
-        return None, 0
+    # Labels, superpixel count and boundary mask, cached per image and parameters
+    labels, n_segments, mask_slic = segment_slic(img, region_size, ruler, iterations,
+                                                 algorithm, with_contours=True)
+    
+    # Color the superpixels with their average color and add boundaries in green
+    with span('slic.render', segments=n_segments):
+        superpixel_result = render_mean_colors(img, labels, boundary_mask=mask_slic,
+                                               boundary_color=(0, 255, 0))
+    
+    return superpixel_result, n_segments
 
 def add_text_to_image(img, text_lines, position=(10, 30)):
     """
@@ -103,129 +109,430 @@ def add_text_to_image(img, text_lines, position=(10, 30)):
     
     return result
 
-def run_slic_experiments(image_path, output_dir='slic_experiments'):
+# Image loaded once per worker process by _init_worker, and the writer a
+# pool worker encodes and writes its own results with
+_worker_image = None
+_worker_writer = None
+
+def _init_worker(image_path):
+    """
+    Load the input image once in each worker process and start its writer
+    
+    The writer is closed, so everything queued is written, when the pool
+    shuts the worker down.
+    
+    Args:
+        image_path: Path to input image
+    """
+    global _worker_image, _worker_writer
+    _worker_image = load_image(image_path)
+    _worker_writer = AsyncImageWriter()
+    multiprocessing.util.Finalize(_worker_writer, _worker_writer.close, exitpriority=10)
+
+def run_and_write_experiment(task):
+    """
+    Run one parameter combination in a pool worker and write its image there
+    
+    Only the path and parameters go back to the parent, so encoding is spread
+    over the workers and no image crosses the process boundary.
+    
+    Args:
+        task: See run_single_experiment
+    
+    Returns:
+        dict: run_single_experiment's result without the image
+    """
+    result = run_single_experiment(task)
+    _worker_writer.write(result['path'], result.pop('image'))
+    return result
+
+def run_single_experiment(task):
+    """
+    Run one parameter combination and annotate its result
+    
+    Args:
+        task: Tuple of (region_size, ruler, iterations, algorithm, alg_name, experiment_dir)
+    
+    Returns:
+        dict: Annotated image, the path to write it to and parameters
+    """
+    region_size, ruler, iteration, algorithm, alg_name, experiment_dir = task
+    
+    # Apply SLIC
+    result, n_segments = apply_slic(_worker_image, region_size, ruler, iteration, algorithm)
+    
+    # Add parameter information to the image
+    text_lines = [
+        f"Algorithm: {alg_name}",
+        f"Region Size: {region_size}",
+        f"Ruler: {ruler}",
+        f"Iterations: {iteration}",
+        f"Segments: {n_segments}"
+    ]
+    result_with_text = add_text_to_image(result, text_lines)
+    
+    # The caller queues the image on its writer, only the path is kept for the comparison grids
+    filename = f"{alg_name}_r{region_size}_ruler{ruler}_iter{iteration}.jpg"
+    
+    return {
+        'image': result_with_text,
+        'path': os.path.join(experiment_dir, filename),
+        'params': {
+            'algorithm': alg_name,
+            'region_size': region_size,
+            'ruler': ruler,
+            'iterations': iteration,
+            'segments': n_segments
+        }
+    }
+
+def score_segmentation(lab, labels):
+    """
+    Mean Lab distance between an image and its superpixel mean-color rendering
+    
+    The mean-color rendering is what a level shows, so a lower score is a
+    better segmentation at the same region size.
+    
+    Args:
+        lab: Image in float32 Lab
+        labels: Label map of the image
+    
+    Returns:
+        float: Mean per-pixel Lab distance
+    """
+    return float(np.linalg.norm(render_mean_colors(lab, labels) - lab, axis=2).mean())
+
+def successive_halving(img, combos, rungs=2, keep_fraction=1 / 3):
+    """
+    Prune parameter combinations on cheap runs before running them in full
+    
+    Every rung segments the surviving combinations on a copy of the image
+    shrunk by 2 ** (rungs - rung), at a matching region size and their full
+    iteration count, scores them with score_segmentation and
+    keeps the best keep_fraction per region size. Region sizes are ranked
+    separately because smaller superpixels always render closer to the
+    image; every region size keeps at least one combination. Each rung gets
+    twice the resolution of the previous one, so most candidates only cost a
+    small run.
+    
+    Args:
+        img: Input image
+        combos: (region_size, ruler, iterations, (algorithm, alg_name)) tuples
+        rungs: Scored rounds before the survivors run at full resolution
+        keep_fraction: Fraction of each region size's combinations kept per rung
+    
+    Returns:
+        list: Surviving combos grouped by region size, best first within each
+    """
+    scores = {}
+    height, width = img.shape[:2]
+    for rung in range(rungs):
+        scale = 0.5 ** (rungs - rung)
+        small = cv2.resize(img, (max(1, round(width * scale)), max(1, round(height * scale))),
+                           interpolation=cv2.INTER_AREA)
+        lab = cv2.cvtColor(small, cv2.COLOR_BGR2Lab).astype(np.float32)
+        with span('halving.rung', rung=rung, candidates=len(combos)):
+            for combo in combos:
+                region_size, ruler, iteration, (algorithm, _) = combo
+                # Scaled iteration counts would collapse, e.g. 5 and 10 both to 2 at
+                # 1/4 scale, and tie on the score; the small image keeps them cheap.
+                # The throwaway runs would only evict useful stage cache entries
+                labels, _ = segment_slic(small, max(HALVING_MIN_REGION, round(region_size * scale)), ruler,
+                                         iteration, algorithm, use_cache=False)
+                scores[combo] = score_segmentation(lab, labels)
+        
+        survivors = []
+        for region_size in sorted({combo[0] for combo in combos}):
+            group = sorted((combo for combo in combos if combo[0] == region_size), key=scores.get)
+            survivors.extend(group[:max(1, math.ceil(len(group) * keep_fraction))])
+        print(f"Rung {rung + 1}/{rungs} at 1/{round(1 / scale)} scale: "
+              f"kept {len(survivors)} of {len(combos)} combinations")
+        combos = survivors
+    return combos
+
+def hash_file(path):
+    """
+    Compute the SHA-256 hash of a file's content
+    
+    Args:
+        path: Path to the file
+    
+    Returns:
+        str: Hex digest
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def experiment_key(alg_name, region_size, ruler, iteration):
+    """
+    Manifest key for one parameter combination
+    
+    Returns:
+        str: Key that is also the stem of the result filename
+    """
+    return f"{alg_name}_r{region_size}_ruler{ruler}_iter{iteration}"
+
+def load_manifest(experiment_dir, image_hash):
+    """
+    Load the manifest of an experiment directory
+    
+    Entries written by a different manifest version or for a different image
+    are dropped, so their combinations run again.
+    
+    Args:
+        experiment_dir: Experiment directory
+        image_hash: Content hash of the input image
+    
+    Returns:
+        dict: Manifest with an 'entries' dict keyed by experiment_key
+    """
+    manifest_path = os.path.join(experiment_dir, MANIFEST_FILENAME)
+    manifest = None
+    if os.path.exists(manifest_path):
+        try:
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Warning: Ignoring unreadable manifest {manifest_path}: {e}")
+    
+    if (manifest is None or manifest.get('version') != MANIFEST_VERSION
+            or manifest.get('image_hash') != image_hash):
+        manifest = {'version': MANIFEST_VERSION, 'image_hash': image_hash, 'entries': {}}
+    
+    return manifest
+
+def save_manifest(experiment_dir, manifest):
+    """
+    Atomically write the manifest of an experiment directory
+    
+    Args:
+        experiment_dir: Experiment directory
+        manifest: Manifest dictionary
+    """
+    manifest_path = os.path.join(experiment_dir, MANIFEST_FILENAME)
+    tmp_path = manifest_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, manifest_path)
+
+def run_slic_experiments(image_path, output_dir='slic_experiments', workers=1, resume=True,
+                         region_sizes=(10, 30, 60, 100, 150), rulers=(5.0, 10.0, 20.0, 40.0),
+                         iterations=(5, 10, 20), algorithms=('SLIC', 'SLICO', 'MSLIC'), memory_budget=None,
+                         segment_counts=None, search='grid', halving_rungs=2, keep_fraction=1 / 3):
     """
     Run SLIC experiments with different parameter combinations
     
+    Every result is handed to an AsyncImageWriter as soon as it finishes and
+    only its path and parameters are kept, so memory stays flat regardless of
+    sweep size while encoding overlaps the next experiments. Pool workers
+    write their results with a writer of their own and only send back the
+    path and parameters. With a memory budget, no new experiment is started
+    while the RSS of this process and its pool workers is over it, until an
+    experiment in flight comes back from a worker, or without workers, until
+    its result is written.
+    
+    With resume enabled the experiment directory is tied to the content hash
+    of the image and a manifest records every finished combination. A rerun
+    only executes combinations that are missing from the manifest or whose
+    file is gone, and the grids are rebuilt from the merged result set.
+    
     Args:
         image_path: Path to input image
         output_dir: Directory to save results
+        workers: Number of worker processes (None = one per CPU core, 1 = run in this process)
+        resume: Reuse the manifest-backed directory of this image instead of a fresh timestamped one
+        region_sizes, rulers, iterations: Parameter ranges to sweep
+        algorithms: Names of the SLIC variants to sweep (SLIC, SLICO, MSLIC)
+        memory_budget: Limit on the summed RSS of this process and the pool
+                       workers, in bytes or e.g. '2G', None for no limit
+        segment_counts: Target numbers of superpixels; replaces region_sizes
+                        with the region sizes solved for them on thumbnails,
+                        see SLIC.solve_region_sizes, so only those are run at
+                        full resolution
+        search: 'grid' runs every combination; 'halving' prunes them on
+                shrunk, shorter runs first, see successive_halving, and only
+                renders the survivors and a grid of the best per region size
+        halving_rungs: Scored rounds of the halving search
+        keep_fraction: Fraction of each region size's combinations a round keeps
     """
+    if search not in ('grid', 'halving'):
+        raise ValueError(f"Unknown search mode: {search}, expected grid or halving")
+    image_hash = hash_file(image_path)
+    
     # Create output directory
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    experiment_dir = os.path.join(output_dir, f"experiment_{timestamp}")
+    if resume:
+        experiment_dir = os.path.join(output_dir, f"experiment_{image_hash[:12]}")
+    else:
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        experiment_dir = os.path.join(output_dir, f"experiment_{timestamp}")
     os.makedirs(experiment_dir, exist_ok=True)
+    manifest = load_manifest(experiment_dir, image_hash)
+    manifest['image_path'] = image_path
     
     # Load image
     print(f"Loading image from {image_path}...")
     img = load_image(image_path)
-    height, width = img.shape[:2]
     
-    # Save original image
-    cv2.imwrite(os.path.join(experiment_dir, "original.jpg"), img)
-    
-    # Define parameter ranges
-    region_sizes = [10, 30, 60, 100, 150]
-    rulers = [5.0, 10.0, 20.0, 40.0]
-    iterations = [5, 10, 20]
-    algorithms = [
-        (cv2.ximgproc.SLIC, "SLIC"),
-        (cv2.ximgproc.SLICO, "SLICO"),
-        (cv2.ximgproc.MSLIC, "MSLIC")
-    ]
+    # Results are encoded and written in the background
+    writer = AsyncImageWriter()
     
-    # Create a summary image
-    results = []
-    experiment_count = 0
+    # Save original image
+    if not os.path.exists(os.path.join(experiment_dir, "original.jpg")):
+        writer.write(os.path.join(experiment_dir, "original.jpg"), img)
+    
+    # Region sizes for the target counts; SLICO adapts its compactness,
+    # so one solve serves every ruler
+    if segment_counts is not None:
+        solved = solve_region_sizes(img, segment_counts)
+        region_sizes = sorted({level['region_size'] for level in solved})
+        print("Region sizes for " + ", ".join(f"{level['target']}->{level['region_size']}" for level in solved)
+              + " superpixels")
+    
+    # Define parameter ranges; the NumPy engine has no MSLIC
+    if slic_engine() == 'numpy' and 'MSLIC' in algorithms:
+        print("Skipping MSLIC, it needs opencv-contrib (cv2.ximgproc)")
+        algorithms = [alg_name for alg_name in algorithms if alg_name != 'MSLIC']
+    algorithms = [(ALGORITHMS[alg_name], alg_name) for alg_name in algorithms]
+    
+    combos = list(itertools.product(region_sizes, rulers, iterations, algorithms))
+    if search == 'halving':
+        combos = successive_halving(img, combos, halving_rungs, keep_fraction)
+    
+    entries = manifest['entries']
+    tasks = []
+    for region_size, ruler, iteration, (algorithm, alg_name) in combos:
+        entry = entries.get(experiment_key(alg_name, region_size, ruler, iteration))
+        if entry is not None and os.path.exists(os.path.join(experiment_dir, entry['filename'])):
+            continue
+        tasks.append((region_size, ruler, iteration, algorithm, alg_name, experiment_dir))
+    
+    if workers is None:
+        workers = os.cpu_count() or 1
     
     # Run experiments
-    print("Running SLIC experiments...")
-    for region_size, ruler, iteration, (algorithm, alg_name) in itertools.product(
-            region_sizes, rulers, iterations, algorithms):
-        
-        experiment_count += 1
-        print(f"Experiment {experiment_count}: region_size={region_size}, ruler={ruler}, "
-              f"iterations={iteration}, algorithm={alg_name}")
-        
-        # Apply SLIC
-        result, n_segments = apply_slic(img, region_size, ruler, iteration, algorithm)
-        
-        if result is not None:
-            # Add parameter information to the image
-            text_lines = [
-                f"Algorithm: {alg_name}",
-                f"Region Size: {region_size}",
-                f"Ruler: {ruler}",
-                f"Iterations: {iteration}",
-                f"Segments: {n_segments}"
-            ]
-            result_with_text = add_text_to_image(result, text_lines)
+    print(f"Running {len(tasks)} SLIC experiments on {workers} worker(s), "
+          f"{len(entries)} already in the manifest...")
+    budget = MemoryBudget(memory_budget, children=workers > 1)
+    if not tasks:
+        completed = []
+        pool = None
+    elif workers == 1:
+        global _worker_image
+        _worker_image = img
+        completed = map(run_single_experiment, budget.throttle(tasks))
+        pool = None
+    else:
+        del img
+        pool = multiprocessing.Pool(workers, initializer=_init_worker, initargs=(image_path,))
+        completed = pool.imap_unordered(run_and_write_experiment, budget.throttle(tasks))
+    
+    experiment_count = 0
+    try:
+        for result in completed:
+            experiment_count += 1
+            params = result['params']
+            print(f"Experiment {experiment_count}/{len(tasks)}: region_size={params['region_size']}, "
+                  f"ruler={params['ruler']}, iterations={params['iterations']}, "
+                  f"algorithm={params['algorithm']}")
             
-            # Save individual result
-            filename = f"{alg_name}_r{region_size}_ruler{ruler}_iter{iteration}.jpg"
-            cv2.imwrite(os.path.join(experiment_dir, filename), result_with_text)
+            if 'image' in result:
+                writer.write(result['path'], result.pop('image'), callback=budget.release)
+            else:
+                # Written by the worker
+                budget.release()
             
-            # Store for comparison grid
-            results.append({
-                'image': result_with_text,
-                'params': {
-                    'algorithm': alg_name,
-                    'region_size': region_size,
-                    'ruler': ruler,
-                    'iterations': iteration,
-                    'segments': n_segments
-                }
-            })
-    
-    # Create comparison grids for specific parameter variations
-    create_comparison_grids(results, img, experiment_dir)
+            # Record progress right away so an interrupted run can resume;
+            # entries whose file never made it to disk are rerun on resume
+            key = experiment_key(params['algorithm'], params['region_size'],
+                                 params['ruler'], params['iterations'])
+            entries[key] = {'filename': os.path.basename(result['path']), 'params': params}
+            save_manifest(experiment_dir, manifest)
+    finally:
+        budget.cancel()
+        if pool is not None:
+            pool.close()
+            pool.join()
+        failed = {os.path.basename(path) for path in writer.flush()}
+        if pool is not None:
+            # Workers report write errors in their own output only, check the files
+            failed |= {entry['filename'] for entry in entries.values()
+                       if not os.path.exists(os.path.join(experiment_dir, entry['filename']))}
+    
+    # The grids read the results back, so drop the ones that failed to write
+    for key in [key for key, entry in entries.items() if entry['filename'] in failed]:
+        del entries[key]
+    save_manifest(experiment_dir, manifest)
+    
+    # Create comparison grids from every result recorded in the manifest
+    results = [{'path': os.path.join(experiment_dir, entry['filename']), 'params': entry['params']}
+               for entry in entries.values()]
+    if search == 'halving':
+        # The fixed-parameter grids would mostly be empty, compare the winners instead
+        best = {}
+        for combo in combos:
+            best.setdefault(combo[0], experiment_key(combo[3][1], *combo[:3]))
+        results = [{'path': os.path.join(experiment_dir, entries[key]['filename']), 'params': entries[key]['params']}
+                   for key in best.values() if key in entries]
+        create_grid_by_parameter(results, experiment_dir, 'region_size', fixed_params={},
+                                 grid_title="Best per Region Size (successive halving)", writer=writer,
+                                 filename=HALVING_GRID_FILENAME)
+    else:
+        create_comparison_grids(results, experiment_dir, writer)
+    writer.close()
+    writer.report()
+    budget.report()
     
     print(f"\nExperiment complete! Results saved to: {experiment_dir}")
-    print(f"Total experiments: {experiment_count}")
+    print(f"Total experiments: {experiment_count} run, {len(entries)} in the manifest")
     
     return experiment_dir
 
-def create_comparison_grids(results, original_img, output_dir):
+def create_comparison_grids(results, output_dir, writer=None):
     """
     Create comparison grids for different parameter variations
     
     Args:
-        results: List of experiment results
-        original_img: Original input image
+        results: List of experiment results (paths and parameters)
         output_dir: Directory to save grids
+        writer: Optional AsyncImageWriter to queue the grids on
     """
-    height, width = original_img.shape[:2]
-    
     # 1. Grid comparing region sizes (fixed algorithm=SLICO, ruler=10, iterations=10)
     create_grid_by_parameter(results, output_dir, 'region_size', 
                            fixed_params={'algorithm': 'SLICO', 'ruler': 10.0, 'iterations': 10},
-                           grid_title="Region Size Comparison (SLICO, ruler=10, iter=10)")
+                           grid_title="Region Size Comparison (SLICO, ruler=10, iter=10)", writer=writer)
     
     # 2. Grid comparing rulers (fixed algorithm=SLICO, region_size=60, iterations=10)
     create_grid_by_parameter(results, output_dir, 'ruler',
                            fixed_params={'algorithm': 'SLICO', 'region_size': 60, 'iterations': 10},
-                           grid_title="Ruler Comparison (SLICO, region=60, iter=10)")
+                           grid_title="Ruler Comparison (SLICO, region=60, iter=10)", writer=writer)
     
     # 3. Grid comparing algorithms (fixed region_size=60, ruler=10, iterations=10)
     create_grid_by_parameter(results, output_dir, 'algorithm',
                            fixed_params={'region_size': 60, 'ruler': 10.0, 'iterations': 10},
-                           grid_title="Algorithm Comparison (region=60, ruler=10, iter=10)")
+                           grid_title="Algorithm Comparison (region=60, ruler=10, iter=10)", writer=writer)
     
     # 4. Grid comparing iterations (fixed algorithm=SLICO, region_size=60, ruler=10)
     create_grid_by_parameter(results, output_dir, 'iterations',
                            fixed_params={'algorithm': 'SLICO', 'region_size': 60, 'ruler': 10.0},
-                           grid_title="Iterations Comparison (SLICO, region=60, ruler=10)")
+                           grid_title="Iterations Comparison (SLICO, region=60, ruler=10)", writer=writer)
 
-def create_grid_by_parameter(results, output_dir, varying_param, fixed_params, grid_title):
+@traced('grid.by_parameter')
+def create_grid_by_parameter(results, output_dir, varying_param, fixed_params, grid_title, writer=None,
+                             filename=None):
     """
     Create a grid comparing results with one varying parameter
     
     Args:
-        results: List of all results
+        results: List of all results, images are read back from result['path']
         output_dir: Output directory
         varying_param: Parameter that varies
         fixed_params: Dictionary of fixed parameters
         grid_title: Title for the grid
+        writer: Optional AsyncImageWriter to queue the grid on
+        filename: Grid file name, grid_<varying_param>_comparison.jpg by default
     """
     # Filter results based on fixed parameters
     filtered_results = []
@@ -255,7 +562,9 @@ def create_grid_by_parameter(results, output_dir, varying_param, fixed_params, g
     rows = (n_images + cols - 1) // cols
     
     # Get image dimensions
-    img_height, img_width = filtered_results[0]['image'].shape[:2]
+    first_image = cv2.imread(filtered_results[0]['path'])
+    img_height, img_width = first_image.shape[:2]
+    del first_image
     
     # Create grid image
     grid_width = img_width * cols
@@ -276,11 +585,13 @@ def create_grid_by_parameter(results, output_dir, varying_param, fixed_params, g
         x_start = col * img_width
         x_end = x_start + img_width
         
-        grid[y_start:y_end, x_start:x_end] = result['image']
+        grid[y_start:y_end, x_start:x_end] = cv2.imread(result['path'])
     
     # Save grid
-    filename = f"grid_{varying_param}_comparison.jpg"
-    cv2.imwrite(os.path.join(output_dir, filename), grid)
+    if filename is None:
+        filename = f"grid_{varying_param}_comparison.jpg"
+    with ensure_writer(writer) as grid_writer:
+        grid_writer.write(os.path.join(output_dir, filename), grid)
 
 def main():
     """
@@ -289,8 +600,8 @@ def main():
     # Replace with your image path
     image_path = "alan.jpg"
     
-    # Run experiments
-    output_dir = run_slic_experiments(image_path)
+    # Run experiments on every CPU core
+    output_dir = run_slic_experiments(image_path, workers=None)
     
     # Create a simple viewer to browse results
     create_html_viewer(output_dir)
@@ -342,7 +653,7 @@ def create_html_viewer(output_dir):
     """
     
     # Add comparison grids
-    grid_files = ['grid_region_size_comparison.jpg', 'grid_ruler_comparison.jpg', 
+    grid_files = [HALVING_GRID_FILENAME, 'grid_region_size_comparison.jpg', 'grid_ruler_comparison.jpg',
                   'grid_algorithm_comparison.jpg', 'grid_iterations_comparison.jpg']
     
     for grid_file in grid_files:
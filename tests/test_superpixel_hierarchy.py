@@ -0,0 +1,21 @@
+import os
+import sys
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'create_data'))
+from superpixel_hierarchy import merge_ladder
+
+
+def test_merge_ladder_ignores_empty_labels():
+    # An 8x8 grid of 8 px blocks with every other label id left unused,
+    # as SLIC leaves clusters without pixels
+    rng = np.random.default_rng(0)
+    blocks = np.arange(64).reshape(8, 8) * 2
+    labels = np.kron(blocks, np.ones((8, 8), dtype=np.int64))
+    img = rng.integers(0, 256, (64, 64, 3), dtype=np.uint8)
+
+    ladder = merge_ladder(img, labels, 128, [40, 16, 4])
+    for target, mapping in ladder.items():
+        level = mapping[labels]
+        n_merged = int(level.max()) + 1
+        assert len(np.unique(level)) == n_merged == target